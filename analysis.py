@@ -2,10 +2,17 @@ import matplotlib.pyplot as plt
 import collections
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import lobpcg
+from scipy.stats import binom
+import warnings
+from multiprocessing import Pool
 from tqdm import tqdm
 from itertools import takewhile
 from typing import Callable, Counter, Dict, Iterable, List, Sequence, Set, Optional, Tuple, Union
 from customtypes import Layout, Number, CircularList
+from network_stats import calc_network_stats
 RAND = np.random.default_rng()
 
 
@@ -16,14 +23,93 @@ COLORS = CircularList(['blue', 'green', 'lightcoral', 'chocolate', 'darkred',
 
 
 def get_giant_component_size(graph: nx.Graph, p, num_percolations=1):
-    sizes = []
-    for _ in range(num_percolations):
-        g = graph.copy()
-        for u, v in g.edges():
-            if np.random.rand() < p:
-                g.remove_edge(u, v)
-        sizes.append(len(max(nx.connected_components(g), key=len)))
-    return sum(sizes) / len(sizes)
+    """
+    Return the expected size of the largest component after each edge is removed
+    with probability p.
+
+    num_percolations: The number of random edge orderings to average over.
+    """
+    node_to_index = {node: i for i, node in enumerate(graph.nodes)}
+    edges = np.array([(node_to_index[u], node_to_index[v]) for u, v in graph.edges],
+                     dtype=np.int64).reshape(-1, 2)
+    curve = calc_percolation_curve(len(graph), edges, num_percolations)
+    return float(calc_giant_component_sizes(curve, (1-p,))[0])
+
+
+def calc_percolation_curve(N: int, edges: np.ndarray, num_orderings: int = 1,
+                           num_processes: int = 1, seed=None) -> np.ndarray:
+    """
+    Return the average size of the largest component when the first m edges of a random
+    ordering are present, for every m from 0 to E.
+
+    This is the Newman-Ziff algorithm: the edges are added one at a time and components
+    are merged with a union-find structure, so one pass gives the whole curve.
+
+    N: The number of nodes.
+    edges: (E, 2) array where each row is an edge.
+    num_orderings: The number of random orderings to average over.
+    num_processes: The number of processes to run orderings on.
+    seed: Used to create an independent random stream for each ordering.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(num_orderings)
+    tasks = [(N, edges, ordering_seed) for ordering_seed in seeds]
+    if num_processes > 1 and num_orderings > 1:
+        with Pool(num_processes) as pool:
+            curves = pool.map(_percolate_wrapper, tasks)
+    else:
+        curves = list(map(_percolate_wrapper, tasks))
+    return np.mean(curves, axis=0)
+
+
+def _percolate_wrapper(args) -> np.ndarray:
+    N, edges, seed = args
+    rng = np.random.default_rng(seed)
+    return percolate(N, edges[rng.permutation(len(edges))])
+
+
+def percolate(N: int, edges: np.ndarray) -> np.ndarray:
+    """
+    Return an array where element m is the size of the largest component when only
+    the first m edges are present.
+    """
+    parent = list(range(N))
+    size = [1]*N
+    largest = 1 if N > 0 else 0
+    curve = np.empty(len(edges)+1, dtype=np.int64)
+    curve[0] = largest
+    for m, (u, v) in enumerate(edges.tolist(), start=1):
+        # find the roots with path halving
+        while parent[u] != u:
+            parent[u] = parent[parent[u]]
+            u = parent[u]
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        if u != v:
+            # union by size
+            if size[u] < size[v]:
+                u, v = v, u
+            parent[v] = u
+            size[u] += size[v]
+            if size[u] > largest:
+                largest = size[u]
+        curve[m] = largest
+    return curve
+
+
+def calc_giant_component_sizes(curve: np.ndarray,
+                               occupation_probs: Iterable[float]) -> np.ndarray:
+    """
+    Return the expected size of the largest component when each edge is present
+    with each of the occupation probabilities.
+
+    curve: The output of calc_percolation_curve.
+    occupation_probs: The probabilities of an edge being present.
+    """
+    E = len(curve) - 1
+    edge_counts = np.arange(E+1)
+    # the number of present edges follows a binomial distribution
+    return np.array([np.dot(binom.pmf(edge_counts, E, p), curve) for p in occupation_probs])
 
 
 def show_deg_dist_from_matrix(M: np.ndarray, title, *, color='b', display=False, save=False):
@@ -37,11 +123,25 @@ def show_deg_dist_from_matrix(M: np.ndarray, title, *, color='b', display=False,
     :param save: Whether or not to save it.
     :return: None
     """
+    show_degree_histogram(np.bincount(make_node_to_degree(M), minlength=1), title,
+                          color=color, display=display, save=save)
+
 
-    G: nx.Graph = nx.from_numpy_matrix(M)  # type: ignore
-    degree_sequence = sorted([d for n, d in G.degree], reverse=True)  # type: ignore
-    degreeCount = collections.Counter(degree_sequence)
-    deg, cnt = zip(*degreeCount.items())
+def show_degree_histogram(degree_histogram: np.ndarray, title, *, color='b',
+                          display=False, save=False):
+    """
+    This shows a degree distribution from a histogram such as NetworkStats.degree_histogram.
+
+    :param degree_histogram: Element d is the number of nodes with degree d.
+    :param title: The title.
+    :param color: The color of the degree distribution.
+    :param display: Whether or not to display it.
+    :param save: Whether or not to save it.
+    :return: None
+    """
+    # only show the degrees that some node has, largest first
+    deg = tuple(np.flatnonzero(degree_histogram)[::-1].tolist())
+    cnt = tuple(degree_histogram[list(deg)].tolist())
 
     _, ax = plt.subplots()
     plt.bar(deg, cnt, width=0.80, color=color)
@@ -64,12 +164,7 @@ def show_deg_dist_from_matrix(M: np.ndarray, title, *, color='b', display=False,
 
 
 def make_node_to_degree(M) -> List[int]:
-    node_to_degree = [0 for _ in range(M.shape[0])]
-    for i in range(M.shape[0]):
-        for j in range(M.shape[1]):
-            if M[i][j] > 0:
-                node_to_degree[i] += 1
-    return node_to_degree
+    return np.count_nonzero(np.asarray(M) > 0, axis=1).tolist()
 
 
 def show_clustering_coefficent_dist(node_to_coefficient: Dict[int, float],
@@ -95,11 +190,7 @@ def show_clustering_coefficent_dist(node_to_coefficient: Dict[int, float],
 
 
 def calc_edge_density(M) -> float:
-    num_edges = 0
-    for i in range(M.shape[0]):
-        for j in range(i+1, M.shape[1]):
-            if M[i][j] > 0:
-                num_edges += 1
+    num_edges = np.count_nonzero(np.triu(np.asarray(M) > 0, k=1))
     density = num_edges / (M.shape[0]*(M.shape[0]-1)/2)
     return density
 
@@ -112,29 +203,110 @@ def get_components(graph) -> Tuple[Set, ...]:
     return tuple(nx.connected_components(graph))
 
 
+def make_edge_array(G: nx.Graph) -> np.ndarray:
+    """Return the edges of G as an (E, 2) integer array. G's nodes must be 0 to N-1."""
+    return np.array(tuple(G.edges), dtype=np.int64).reshape(-1, 2)
+
+
+def make_csr(N: int, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the compressed sparse row adjacency structure of an undirected network.
+
+    N: The number of nodes.
+    edges: (E, 2) array where each row is an edge. Each edge should appear only once.
+    return: (indptr, indices). The neighbors of node u are indices[indptr[u]:indptr[u+1]].
+    """
+    us = np.concatenate((edges[:, 0], edges[:, 1]))
+    vs = np.concatenate((edges[:, 1], edges[:, 0]))
+    indices = vs[np.argsort(us, kind='stable')]
+    indptr = np.zeros(N+1, dtype=np.int64)
+    np.cumsum(np.bincount(us, minlength=N), out=indptr[1:])
+    return indptr, indices
+
+
+def calc_edge_betweenness(N: int, edges: np.ndarray, sources: Optional[np.ndarray] = None,
+                          max_block_size: int = 2**22) -> np.ndarray:
+    """
+    Return the unnormalized edge betweenness centrality of every edge (the same values as
+    nx.edge_betweenness_centrality(G, normalized=False)).
+
+    Brandes' algorithm is run from a block of sources at a time. The breadth first
+    searches advance one level at a time for the whole block using sparse matrix
+    products, and dependencies are accumulated level by level in the same way.
+
+    N: The number of nodes.
+    edges: (E, 2) array of edges.
+    sources: If provided, only paths starting at these nodes are counted and the result
+             is scaled up by N / len(sources) to estimate the true value.
+    max_block_size: Limits the number of elements in the (sources, 2E) intermediate arrays.
+    """
+    n_edges = len(edges)
+    # every edge is traversed in both directions
+    tails = np.concatenate((edges[:, 0], edges[:, 1]))
+    heads = np.concatenate((edges[:, 1], edges[:, 0]))
+    A = sp.csr_matrix((np.ones(2*n_edges), (tails, heads)), shape=(N, N))
+    arc_to_tail = sp.csr_matrix((np.ones(2*n_edges), (np.arange(2*n_edges), tails)),
+                                shape=(2*n_edges, N))
+    all_sources = np.arange(N) if sources is None else np.asarray(sources)
+    block_size = max(1, max_block_size // max(1, 2*n_edges, N))
+
+    betweenness = np.zeros(2*n_edges)
+    for start in range(0, len(all_sources), block_size):
+        block = all_sources[start:start+block_size]
+        rows = np.arange(len(block))
+        dist = np.full((len(block), N), -1, dtype=np.int64)
+        sigma = np.zeros((len(block), N))
+        dist[rows, block] = 0
+        sigma[rows, block] = 1
+        # breadth first search from every source in the block at once
+        frontier = sigma.copy()
+        level = 0
+        while frontier.any():
+            reachable = (A @ frontier.T).T
+            reached = (reachable > 0) & (dist == -1)
+            level += 1
+            dist[reached] = level
+            sigma[reached] = reachable[reached]
+            frontier = np.where(reached, reachable, 0)
+
+        # arcs on a shortest path go from one level to the next
+        arc_levels = dist[:, tails]
+        on_path = (arc_levels > -1) & (dist[:, heads] == arc_levels + 1)
+        path_ratio = np.divide(sigma[:, tails], sigma[:, heads],
+                               out=np.zeros(on_path.shape), where=on_path)
+        delta = np.zeros((len(block), N))
+        for arc_level in range(level-2, -1, -1):
+            at_level = on_path & (arc_levels == arc_level)
+            contributions = np.where(at_level, path_ratio * (1 + delta[:, heads]), 0)
+            delta += (arc_to_tail.T @ contributions.T).T
+            betweenness += np.sum(contributions, axis=0)
+
+    # each pair of nodes was counted from both ends
+    betweenness = (betweenness[:n_edges] + betweenness[n_edges:]) / 2
+    if sources is not None:
+        betweenness *= N / len(all_sources)
+    return betweenness
+
+
 # shows degree distribution, degree assortativity coefficient, clustering coefficient,
 # edge density
 def analyze_network(G: nx.Graph, name) -> None:
-    M = nx.to_numpy_array(G)
-    dac = nx.degree_assortativity_coefficient(G)
-    clustering_coefficients = nx.clustering(G)
-    node_to_degree = make_node_to_degree(M)
-
-    edge_density = calc_edge_density(M)
-    print(f'Edge density: {edge_density}')
-    if nx.is_connected(G):
-        diameter = nx.diameter(G)
+    node_to_index = {node: i for i, node in enumerate(G.nodes)}
+    edges = np.array([(node_to_index[u], node_to_index[v]) for u, v in G.edges],
+                     dtype=np.int64).reshape(-1, 2)
+    stats = calc_network_stats(len(G), edges)
+
+    print(f'Edge density: {stats.edge_density}')
+    if stats.is_diameter_exact:
+        print(f'Diameter: {stats.diameter}')
     else:
-        largest_component = max(nx.connected_components(G), key=len)
-        largest_subgraph = G.subgraph(largest_component)
-        diameter = nx.diameter(largest_subgraph)
-    print(f'Diameter: {diameter}')
-    print(f'Degree assortativity coefficient: {dac}')
-    show_clustering_coefficent_dist(clustering_coefficients,  # type: ignore
-                                    dict(enumerate(node_to_degree)))
+        print(f'Diameter: between {stats.diameter} and {stats.diameter_upper_bound}')
+    print(f'Degree assortativity coefficient: {stats.assortativity}')
+    show_clustering_coefficent_dist(dict(enumerate(stats.clustering.tolist())),
+                                    dict(enumerate(stats.degrees.tolist())))
     # components = get_components(G)
     # print(f'size of components: {[len(comp) for comp in components]}')
-    show_deg_dist_from_matrix(M, name, display=False, save=False)
+    show_degree_histogram(stats.degree_histogram, name, display=False, save=False)
 
 
 def all_same(G: nx.Graph) -> List[float]:
@@ -163,8 +335,12 @@ def common_neigh(G: nx.Graph) -> List[float]:
 
 def rw_centrality(G: nx.Graph) -> List[float]:
     # This doesn't do a good job of distinguishing between edges
-    centralities = random_walk_centrality(G, 10000)
-    width = [1500 * centrality for centrality in centralities.values()]
+    node_to_index = {node: i for i, node in enumerate(G.nodes)}
+    edges = np.array([(node_to_index[u], node_to_index[v]) for u, v in G.edges],
+                     dtype=np.int64).reshape(-1, 2)
+    centralities = calc_random_walk_centrality(len(G), edges, 10000,
+                                               seed=RAND.integers(2**63))
+    width = (1500 * centralities).tolist()
     plt.hist(width, bins=None)
     plt.show(block=False)
     plt.figure()
@@ -202,13 +378,16 @@ def visualize_eigen_communities(G: nx.Graph, layout: Optional[Layout] = None, na
     different values to act as cutoffs when determining how to partition the network and the
     resulting partitions are plotted.
     """
-    L = nx.linalg.laplacian_matrix(G).toarray()  # type: ignore
-    eigvs, eigenvectors = np.linalg.eigh(L)
-    plt.title('Eigenvalues')
-    plt.plot(eigvs)
+    node_to_index = {node: i for i, node in enumerate(G.nodes)}
+    edges = np.array([(node_to_index[u], node_to_index[v]) for u, v in G.edges],
+                     dtype=np.int64).reshape(-1, 2)
+    # only the smallest eigenvalues are interesting, so don't compute the rest
+    eigvs, eigenvectors = calc_laplacian_eigenpairs(len(G), edges, min(20, len(G)-1), RAND)
+    plt.title('Smallest Eigenvalues')
+    plt.plot(np.concatenate(([0], eigvs)))
     plt.show(block=False)
     plt.figure()
-    partitioning_vector = eigenvectors[:, 1]
+    partitioning_vector = eigenvectors[:, 0]
     plt.title('Partitioning Vector')
     plt.plot(sorted(partitioning_vector))
     plt.show(block=False)
@@ -226,6 +405,59 @@ def visualize_eigen_communities(G: nx.Graph, layout: Optional[Layout] = None, na
         plt.show(block=False)
 
 
+def make_laplacian(N: int, edges: np.ndarray) -> sp.csr_matrix:
+    """Return the sparse Laplacian matrix D - A of an undirected network."""
+    us = np.concatenate((edges[:, 0], edges[:, 1]))
+    vs = np.concatenate((edges[:, 1], edges[:, 0]))
+    A = sp.csr_matrix((np.ones(len(us)), (us, vs)), shape=(N, N))
+    degrees = np.asarray(A.sum(axis=1)).ravel()
+    return (sp.diags(degrees) - A).tocsr()
+
+
+def calc_laplacian_eigenpairs(N: int, edges: np.ndarray, k: int, rng,
+                              tol: float = 1e-6, max_iter: int = 500)\
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the k smallest eigenvalues of the Laplacian after the trivial 0 that belongs
+    to the constant vector, and their eigenvectors as columns.
+
+    Small networks use a dense solver. Larger ones use LOBPCG on the sparse Laplacian,
+    kept orthogonal to the constant vector and preconditioned by the inverse degrees.
+
+    N: The number of nodes.
+    edges: (E, 2) array of edges.
+    k: The number of eigenpairs. Must be less than N.
+    rng: Used to create the starting vectors.
+    tol, max_iter: Passed to LOBPCG. If any residual is still above tol after max_iter
+                   iterations, a UserWarning is issued and the estimate is returned anyway.
+    """
+    L = make_laplacian(N, edges)
+    if N < max(200, 5*k+5):
+        values, vectors = np.linalg.eigh(L.toarray())
+        return values[1:k+1], vectors[:, 1:k+1]
+
+    degrees = L.diagonal()
+    preconditioner = sp.diags(1 / np.maximum(degrees, 1))
+    with warnings.catch_warnings():
+        # LOBPCG can warn several times per call, so its warnings are replaced by
+        # the single check of the residuals below
+        warnings.simplefilter('ignore', UserWarning)
+        values, vectors = lobpcg(L, rng.standard_normal((N, k)), M=preconditioner,
+                                 Y=np.ones((N, 1)), largest=False, tol=tol, maxiter=max_iter)
+    residuals = np.linalg.norm(L @ vectors - vectors * values, axis=0)
+    if np.max(residuals) > tol:
+        warnings.warn(f'LOBPCG did not converge in {max_iter} iterations: the largest '
+                      f'residual is {np.max(residuals):.2e}, but tol is {tol:.2e}.')
+    order = np.argsort(values)
+    return values[order], vectors[:, order]
+
+
+def calc_fiedler_vector(N: int, edges: np.ndarray, rng,
+                        tol: float = 1e-6, max_iter: int = 500) -> np.ndarray:
+    """Return the eigenvector of the second smallest eigenvalue of the Laplacian."""
+    return calc_laplacian_eigenpairs(N, edges, 1, rng, tol, max_iter)[1][:, 0]
+
+
 def visualize_girvan_newman_communities(G: nx.Graph, layout: Optional[Layout] = None,
                                         name='', max_communities=10) -> None:
     """
@@ -312,20 +544,142 @@ def calc_prop_common_neighbors(G: nx.Graph, u: int, v: int) -> float:
 def random_walk_centrality(G: nx.Graph, num_paths: int) -> Dict[Tuple[int, int], float]:
     """
     Sample num_paths paths to calculate the random walk centrality of the edges in G.
+    The keys are (from, to), so each edge can appear once for each direction it was crossed.
+    """
+    nodes = list(G.nodes)
+    node_to_index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(node_to_index[u], node_to_index[v]) for u, v in G.edges],
+                     dtype=np.int64).reshape(-1, 2)
+    arc_crossings = calc_random_walk_arc_crossings(len(nodes), edges, num_paths,
+                                                   seed=RAND.integers(2**63))
+    edges_crossed = int(np.sum(arc_crossings))
+    arcs = np.concatenate((edges, edges[:, ::-1]))
+    return {(nodes[u], nodes[v]): frequency/edges_crossed
+            for (u, v), frequency in zip(arcs.tolist(), arc_crossings.tolist())
+            if frequency > 0}
+
+
+def calc_random_walk_centrality(N: int, edges: np.ndarray, num_paths: int,
+                                tol: Optional[float] = None, batch_size: int = 1024,
+                                num_processes: int = 1, seed=None) -> np.ndarray:
     """
-    rand = RAND
-    edge_to_times_crossed = collections.defaultdict(lambda: 0)
-    edges_crossed = 0
-    for _ in tqdm(range(num_paths)):
-        s, t = rand.choice(G), rand.choice(G)
-        current = s
-        while current != t:
-            next = rand.choice(G[current])
-            edge_to_times_crossed[(current, next)] += 1
-            edges_crossed += 1
-            current = next
+    Return the fraction of all random walk steps that crossed each edge in either direction.
 
-    return {edge: frequency/edges_crossed for edge, frequency in edge_to_times_crossed.items()}
+    See calc_random_walk_arc_crossings for the meaning of the parameters.
+    """
+    arc_crossings = calc_random_walk_arc_crossings(N, edges, num_paths, tol, batch_size,
+                                                   num_processes, seed)
+    crossings = arc_crossings[:len(edges)] + arc_crossings[len(edges):]
+    total = np.sum(crossings)
+    return crossings / total if total > 0 else crossings.astype(float)
+
+
+def calc_random_walk_arc_crossings(N: int, edges: np.ndarray, num_paths: int,
+                                   tol: Optional[float] = None, batch_size: int = 1024,
+                                   num_processes: int = 1, seed=None) -> np.ndarray:
+    """
+    Walk randomly from a random node until a random target is reached and count how many
+    times each edge is crossed in each direction.
+
+    Paths are walked batch_size at a time, with every walker in a batch taking a step at
+    once. Targets are chosen from the start's component so every walk ends.
+
+    N: The number of nodes.
+    edges: (E, 2) array of edges.
+    num_paths: The most paths to walk.
+    tol: If provided, stop early once a round of batches changes the fraction of steps
+         that crossed each edge by less than tol in total (L1 distance).
+    batch_size: The number of paths walked at once by a process.
+    num_processes: Each round walks one batch per process.
+    seed: Used to create an independent random stream for each batch.
+    return: An array of length 2E. Element i is the number of times edges[i] was crossed
+            from edges[i, 0] to edges[i, 1] and element E+i in the other direction.
+    """
+    indptr, indices = make_csr(N, edges)
+    # the arc each position in indices came from, in the same order make_csr uses
+    tails = np.concatenate((edges[:, 0], edges[:, 1]))
+    slot_to_arc = np.argsort(tails, kind='stable')
+    n_components, labels = connected_components(
+        sp.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(N, N)), directed=False)
+    component_sizes = np.bincount(labels, minlength=n_components)
+    component_starts = np.concatenate(([0], np.cumsum(component_sizes)[:-1]))
+    nodes_by_component = np.argsort(labels, kind='stable')
+    graph = (indptr, indices, labels, component_sizes, component_starts, nodes_by_component)
+
+    seed_seq = np.random.SeedSequence(seed)
+    slot_crossings = np.zeros(len(indices), dtype=np.int64)
+    pool = Pool(num_processes) if num_processes > 1 else None
+    try:
+        paths_walked = 0
+        estimate = None
+        while paths_walked < num_paths:
+            sizes = [min(batch_size, num_paths - paths_walked - i*batch_size)
+                     for i in range(max(1, num_processes))]
+            tasks = [(graph, size, batch_seed)
+                     for size, batch_seed in zip(sizes, seed_seq.spawn(len(sizes))) if size > 0]
+            paths_walked += sum(size for _, size, _ in tasks)
+            results = pool.map(_walk_batch_wrapper, tasks) if pool is not None\
+                else list(map(_walk_batch_wrapper, tasks))
+            for result in results:
+                slot_crossings += result
+            if tol is not None:
+                total = np.sum(slot_crossings)
+                new_estimate = slot_crossings / total if total > 0 else slot_crossings
+                if estimate is not None and np.sum(np.abs(new_estimate - estimate)) < tol:
+                    break
+                estimate = new_estimate
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    arc_crossings = np.zeros(len(indices), dtype=np.int64)
+    arc_crossings[slot_to_arc] = slot_crossings
+    return arc_crossings
+
+
+def _walk_batch_wrapper(args) -> np.ndarray:
+    graph, num_paths, seed = args
+    return walk_random_paths(*graph, num_paths, np.random.default_rng(seed))
+
+
+def walk_random_paths(indptr: np.ndarray, indices: np.ndarray, labels: np.ndarray,
+                      component_sizes: np.ndarray, component_starts: np.ndarray,
+                      nodes_by_component: np.ndarray, num_paths: int, rng) -> np.ndarray:
+    """
+    Walk num_paths random paths at once and return how many times each position in
+    indices was used as a step.
+    """
+    N = len(indptr) - 1
+    slot_crossings = np.zeros(len(indices), dtype=np.int64)
+    if N == 0:
+        return slot_crossings
+    current = rng.integers(N, size=num_paths)
+    comps = labels[current]
+    offsets = np.floor(rng.random(num_paths) * component_sizes[comps]).astype(np.int64)
+    targets = nodes_by_component[component_starts[comps] + offsets]
+    active = current != targets
+    current, targets = current[active], targets[active]
+    # counting every step would cost O(E), so steps are saved up and counted together
+    steps: List[np.ndarray] = []
+    n_steps = 0
+    while len(current) > 0:
+        starts = indptr[current]
+        degrees = indptr[current+1] - starts
+        slots = starts + np.floor(rng.random(len(current)) * degrees).astype(np.int64)
+        steps.append(slots)
+        n_steps += len(slots)
+        if n_steps >= len(indices):
+            slot_crossings += np.bincount(np.concatenate(steps), minlength=len(indices))
+            steps = []
+            n_steps = 0
+        current = indices[slots]
+        # walkers that reached their target are done
+        active = current != targets
+        current, targets = current[active], targets[active]
+    if len(steps) > 0:
+        slot_crossings += np.bincount(np.concatenate(steps), minlength=len(indices))
+    return slot_crossings
 
 
 def make_meta_community_network(edges_removed: Tuple[Tuple[int, int], ...],
@@ -344,31 +698,87 @@ def make_meta_community_network(edges_removed: Tuple[Tuple[int, int], ...],
 
     Returns the meta community network, suggested node_size, suggested edge_width
     """
-    communities = dict(enumerate(nx.connected_components(partitioned_G)))
-    node_to_community = {}
-
-    def find_community(node):
-        if node in node_to_community:
-            return node_to_community[node]
-        for community_id, nodes in communities.items():
-            if node in nodes:
-                node_to_community[node] = community_id
-                return community_id
-        raise Exception(f'Cannot find {node}')
-
-    community_network: nx.Graph = nx.empty_graph(len(communities))  # type: ignore
-    edge_to_weight = Counter((find_community(u), find_community(v)) for u, v in edges_removed)
-    community_network.add_edges_from(edge_to_weight.keys())
+    nodes = tuple(partitioned_G)
+    node_to_index = {node: i for i, node in enumerate(nodes)}
+    partitioned_edges = np.array([(node_to_index[u], node_to_index[v])
+                                  for u, v in partitioned_G.edges], dtype=np.int64).reshape(-1, 2)
+    A = sp.coo_matrix((np.ones(len(partitioned_edges), dtype=np.int8),
+                       (partitioned_edges[:, 0], partitioned_edges[:, 1])),
+                      shape=(len(nodes), len(nodes)))
+    _, node_to_community = connected_components(A, directed=False)
+    edges_removed_array = np.array([(node_to_index[u], node_to_index[v])
+                                    for u, v in edges_removed], dtype=np.int64).reshape(-1, 2)
+    edge_counts, community_sizes, _ = build_meta_community_network(node_to_community,
+                                                                   edges_removed_array)
+
+    community_network: nx.Graph = nx.empty_graph(len(community_sizes))  # type: ignore
+    between = sp.triu(edge_counts, k=1).tocoo()
+    community_network.add_weighted_edges_from(zip(between.row.tolist(), between.col.tolist(),
+                                                  between.data.tolist()))
+    node_order = np.argsort(node_to_community, kind='stable')
+    community_members = np.split(np.array(nodes, dtype=object)[node_order],
+                                 np.cumsum(community_sizes)[:-1])
+    communities = {community_id: set(members)
+                   for community_id, members in enumerate(community_members)}
     nx.set_node_attributes(community_network, communities, 'communities')
-    nx.set_edge_attributes(community_network, edge_to_weight, 'weight')
 
-    node_size = np.array([len(community) for community in communities.values()])
-    node_size = node_size / np.sum(node_size) * 1000
-    edge_width = np.array(tuple(edge_to_weight.values()))
+    node_size = community_sizes / np.sum(community_sizes) * 1000
+    edge_width = np.array([weight for _, _, weight in community_network.edges.data('weight')])
     edge_width = edge_width / np.sum(edge_width) * 20
     return community_network, node_size, edge_width
 
 
+def build_meta_community_network(node_to_community: np.ndarray, edges: np.ndarray,
+                                 layout: Optional[np.ndarray] = None)\
+        -> Tuple[sp.csr_matrix, np.ndarray, Optional[np.ndarray]]:
+    """
+    Build the network of communities from arrays in a few vectorised passes.
+
+    node_to_community: The community of each node numbered from 0.
+    edges: (E, 2) array of edges.
+    layout: Optional (N, 2) array of node positions.
+    return: (edge_counts, community_sizes, centroids). edge_counts is the symmetric sparse
+            matrix from calc_community_edge_counts, community_sizes is the number of nodes
+            in each community, and centroids is the average position of each community's
+            nodes (None if layout wasn't provided).
+    """
+    community_sizes = np.bincount(node_to_community)
+    edge_counts = calc_community_edge_counts(node_to_community, edges, len(community_sizes))
+    centroids = None
+    if layout is not None:
+        centroids = calc_community_centroids(node_to_community, layout, community_sizes)
+    return edge_counts, community_sizes, centroids
+
+
+def calc_community_edge_counts(node_to_community: np.ndarray, edges: np.ndarray,
+                               n_communities: Optional[int] = None) -> sp.csr_matrix:
+    """
+    Return a symmetric sparse matrix where entry (a, b) is the number of edges between
+    communities a and b. The diagonal holds the number of edges inside each community.
+    """
+    if n_communities is None:
+        n_communities = np.max(node_to_community) + 1
+    us = node_to_community[edges[:, 0]]
+    vs = node_to_community[edges[:, 1]]
+    between = us != vs
+    rows = np.concatenate((us, vs[between]))
+    cols = np.concatenate((vs, us[between]))
+    return sp.coo_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                         shape=(n_communities, n_communities)).tocsr()
+
+
+def calc_community_centroids(node_to_community: np.ndarray, layout: np.ndarray,
+                             community_sizes: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return a (C, 2) array of the average position of the nodes in each community."""
+    if community_sizes is None:
+        community_sizes = np.bincount(node_to_community)
+    n_communities = len(community_sizes)
+    sums = np.stack([np.bincount(node_to_community, weights=layout[:, dim],
+                                 minlength=n_communities)
+                     for dim in range(layout.shape[1])], axis=1)
+    return sums / np.maximum(community_sizes, 1)[:, None]
+
+
 def degree_distributions(components: Iterable[Sequence[int]],
                          G: nx.Graph) -> Sequence[Sequence[int]]:
     """Return the degree distributions for each of the components in G."""
@@ -382,6 +792,10 @@ def degree_distributions(components: Iterable[Sequence[int]],
 def make_meta_community_layout(meta_G: nx.Graph, original_layout: Layout) -> Layout:
     """Make a layout for a meta community network based on the original network's layout."""
     communities = nx.get_node_attributes(meta_G, 'communities')
-    layout = {node: np.average([original_layout[n] for n in communities[node]], axis=0)
-              for node in meta_G}
-    return layout
+    meta_nodes = tuple(meta_G)
+    node_to_community = {node: i for i, meta_node in enumerate(meta_nodes)
+                         for node in communities[meta_node]}
+    nodes = tuple(node_to_community.keys())
+    centroids = calc_community_centroids(np.array(tuple(node_to_community.values())),
+                                         np.array([original_layout[node] for node in nodes]))
+    return {meta_node: centroid for meta_node, centroid in zip(meta_nodes, centroids)}
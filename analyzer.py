@@ -7,6 +7,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import time
 import socialgood
+from communicability import calc_communicability_scores
+from network_comparison import BipartiteEditDistance, DegreeSequenceDistance
 
 
 def analyze_network_entry_point():
@@ -20,8 +22,7 @@ def analyze_network_entry_point():
     name = fio.get_network_name(sys.argv[1])
     analyze_network(G, name)
     visualize_network(G, net.layout, name, edge_width_func=all_same, block=False)
-    intercommunity_edges = tuple((u, v) for u, v in G.edges
-                                 if net.communities[u] != net.communities[v])
+    intercommunity_edges = net.intercommunity_edges
     G.remove_edges_from(intercommunity_edges)
     visualize_network(G, net.layout, 'Partitioned '+name, edge_width_func=all_same, block=False)
     meta_G, meta_ns, meta_ew = make_meta_community_network(intercommunity_edges, G)
@@ -38,8 +39,7 @@ def visualize_communicability():
 
     net = fio.read_network(sys.argv[1])
     name = fio.get_network_name(sys.argv[1])
-    communicability = nx.communicability_exp(net.G)
-    scores = np.array([sum(communicability[u].values()) for u in communicability.keys()])
+    scores = calc_communicability_scores(net.N, net.edge_array)
     plt.title(f'{name}\nCommunicability')
     plt.hist(scores)  # type: ignore
     plt.show(block=False)
@@ -57,10 +57,13 @@ def show_edit_distance():
     start_time = time.time()
     net0 = fio.read_network(sys.argv[1])
     net1 = fio.read_network(sys.argv[2])
-    distance = nx.graph_edit_distance(net0.G, net1.G)
+    # the exact edit distance is exponential, so give bounds on it instead
+    lower = DegreeSequenceDistance()(net0.N, net0.edge_array, net1.N, net1.edge_array)
+    upper = BipartiteEditDistance()(net0.N, net0.edge_array, net1.N, net1.edge_array)
     name0 = fio.get_network_name(sys.argv[1])
     name1 = fio.get_network_name(sys.argv[2])
-    print(f'Distance between {name0} and {name1}: {distance} ({time.time()-start_time} s)')
+    print(f'Distance between {name0} and {name1}: between {lower} and {upper} '
+          f'({time.time()-start_time} s)')
 
 
 def show_social_good():
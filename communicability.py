@@ -0,0 +1,53 @@
+from typing import Sequence
+from multiprocessing import Pool
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import expm_multiply
+from network import Network
+
+
+def calc_communicability_scores(N: int, edges: np.ndarray) -> np.ndarray:
+    """
+    Return the communicability score of each node: the sum of its row of exp(A), the
+    same as summing a row of nx.communicability_exp.
+
+    exp(A) is never formed. Its action on the vector of ones is computed directly from
+    the sparse adjacency matrix, so this takes time and memory roughly proportional to
+    the number of edges.
+
+    N: The number of nodes.
+    edges: (E, 2) array where each row is an edge.
+    """
+    if N == 0:
+        return np.zeros(0)
+    us = np.concatenate((edges[:, 0], edges[:, 1]))
+    vs = np.concatenate((edges[:, 1], edges[:, 0]))
+    A = sp.csr_matrix((np.ones(len(us)), (us, vs)), shape=(N, N))
+    return expm_multiply(A, np.ones(N))
+
+
+def calc_total_communicability(N: int, edges: np.ndarray) -> float:
+    """Return the sum of all the values of nx.communicability_exp."""
+    return float(np.sum(calc_communicability_scores(N, edges)))
+
+
+def calc_network_communicabilities(nets: Sequence[Network],
+                                   num_processes: int = 1) -> np.ndarray:
+    """
+    Return the total communicability of each network.
+
+    nets: The networks, for example every instance of a network class.
+    num_processes: The number of processes to split the networks between.
+    """
+    tasks = [(net.N, net.edge_array) for net in nets]
+    if num_processes > 1 and len(tasks) > 1:
+        with Pool(num_processes) as pool:
+            totals = pool.map(_total_communicability_wrapper, tasks,
+                              chunksize=max(1, len(tasks) // (4*num_processes)))
+    else:
+        totals = list(map(_total_communicability_wrapper, tasks))
+    return np.array(totals)
+
+
+def _total_communicability_wrapper(args) -> float:
+    return calc_total_communicability(*args)
@@ -2,7 +2,10 @@ from customtypes import Number
 from network import Network
 import numpy as np
 import networkx as nx
-from typing import Sequence, Tuple
+from multiprocessing import Pool
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Sequence, Tuple
+NextGenFunc = Callable[[Sequence[Tuple[Number, np.ndarray]]], Sequence[np.ndarray]]
 
 
 def degree_sequence_to_network(degrees: Sequence[int],
@@ -38,28 +41,15 @@ def degree_sequence_to_network(degrees: Sequence[int],
 def edge_set_to_network(edge_set: np.ndarray) -> Network:
     E = edge_set.shape[0]
     N = int(np.sqrt(2*E+.25)+.5)
-    current_edge = 0
-    M = np.zeros((N, N), dtype=np.int64)
-
-    for i in range(M.shape[0]):
-        for j in range(i+1, M.shape[1]):
-            M[i, j] = edge_set[current_edge]
-            M[j, i] = edge_set[current_edge]
-            current_edge += 1
-
-    return Network(M)
+    # the edge set lists the upper triangle of the adjacency matrix row by row
+    us, vs = np.triu_indices(N, k=1)
+    present = edge_set > 0
+    return Network.from_edges(N, np.stack((us[present], vs[present]), axis=1),
+                              edge_set[present])
 
 
 def network_to_edge_set(M: np.ndarray) -> np.ndarray:
-    N = M.shape[0]
-    E = (N**2 - N) // 2
-    edge_set = np.zeros(E, dtype=np.int64)
-    edge_ind = 0
-    for i in range(M.shape[0]):
-        for j in range(i+1, M.shape[1]):
-            edge_set[edge_ind] = M[i, j]
-            edge_ind += 1
-    return edge_set
+    return M[np.triu_indices(M.shape[0], k=1)].astype(np.int64)
 
 
 def edge_list_to_network(edge_list: np.ndarray) -> nx.Graph:
@@ -81,22 +71,25 @@ def calc_edge_set_population_diversity(rated_population: Sequence[Tuple[Number,
     """
     I think my approach is flawed because the diversity is always so low, even
     when the population is randomly generated.
+
+    The number of times an index is the same across all pairs of genotypes is
+    found by sorting each column and counting runs of equal values, which avoids
+    comparing every pair of genotypes.
     """
-    diversity = 0
-    genotype_len = len(rated_population[0][1])
-    pop_size = len(rated_population)
+    genotypes = np.array([genotype for _, genotype in rated_population])
+    pop_size, genotype_len = genotypes.shape
     n_unique_pairings = (pop_size**2 - pop_size) // 2
     normalization_quantity = n_unique_pairings * genotype_len
+    # one row per index, sorted so that equal values are next to each other
+    columns = np.sort(genotypes.T, axis=1)
+    run_starts = np.ones(columns.shape, dtype=bool)
+    run_starts[:, 1:] = columns[:, 1:] != columns[:, :-1]
+    run_start_indices = np.flatnonzero(run_starts)
+    run_lengths = np.diff(np.append(run_start_indices, columns.size))
     # first set diversity equal to how undiverse the population is
-    for i in range(len(rated_population)):
-        for j in range(i+1, len(rated_population)):
-            # add 1 for each time an index is the same
-            diversity += np.sum(rated_population[i][1] == rated_population[j][1])
-    # normalize
-    diversity /= normalization_quantity
+    diversity = np.sum(run_lengths * (run_lengths - 1) // 2) / normalization_quantity
     # subtract from 1 to change from uniformity to diversity
-    diversity = 1 - diversity
-    return diversity
+    return 1 - diversity
 
 
 def calc_generic_population_diversity(rated_population: Sequence[Tuple[Number, np.ndarray]])\
@@ -106,18 +99,324 @@ def calc_generic_population_diversity(rated_population: Sequence[Tuple[Number, n
 
     Find the number of unique genotypes and divide this by the number of genotypes.
     """
-    n_unique = len(set(cost_to_genotype[1].tobytes() for cost_to_genotype in rated_population))
-    return n_unique / len(rated_population)
+    genotypes = np.array([genotype for _, genotype in rated_population])
+    return len(np.unique(genotypes.reshape(len(genotypes), -1), axis=0)) / len(genotypes)
 
 
-def calc_float_pop_diversity(rated_population: Sequence[Tuple[Number, np.ndarray]]) -> float:
+def calc_streaming_edge_set_diversity(genotype_chunks: Iterable[np.ndarray]) -> float:
     """
-    Return the percentage of array comparisons that are approximately equal
+    Compute the same value as calc_edge_set_population_diversity for 0/1 genotypes
+    without holding the whole population in memory.
+
+    genotype_chunks: 2D arrays with one genotype per row. Only the number of ones
+                     at each index needs to be kept between chunks.
     """
+    ones_per_index = None
+    pop_size = 0
+    for chunk in genotype_chunks:
+        chunk = np.asarray(chunk)
+        chunk_ones = np.count_nonzero(chunk, axis=0)
+        ones_per_index = chunk_ones if ones_per_index is None else ones_per_index + chunk_ones
+        pop_size += len(chunk)
+    if ones_per_index is None or pop_size < 2:
+        raise ValueError('At least two genotypes are needed to calculate diversity.')
+    n_unique_pairings = (pop_size**2 - pop_size) // 2
+    # a pair differs at an index when one genotype has a 1 there and the other a 0
+    n_different = np.sum(ones_per_index * (pop_size - ones_per_index))
+    return n_different / (n_unique_pairings * len(ones_per_index))
+
+
+def calc_float_pop_diversity(rated_population: Sequence[Tuple[Number, np.ndarray]],
+                             max_block_size: int = 2**22) -> float:
+    """
+    Return the percentage of array comparisons that are not approximately equal
+    (using the same tolerances as np.allclose).
+
+    Blocks of genotypes are compared against the whole population by broadcasting.
+    max_block_size limits the number of elements in the intermediate arrays.
+    """
+    genotypes = np.array([genotype for _, genotype in rated_population], dtype=float)
+    pop_size, genotype_len = genotypes.shape
+    rtol, atol = 1e-05, 1e-08
+    tolerances = atol + rtol*np.abs(genotypes)
+    block_size = max(1, max_block_size // max(1, pop_size*genotype_len))
     num_same = 0
-    for i, genotype0 in enumerate(g[1] for g in rated_population):
-        for genotype1 in (g[1] for g in rated_population[i:]):
-            if np.allclose(genotype0, genotype1):
-                num_same += 1
-    possible_comparisons = (len(rated_population)**2 - len(rated_population)) // 2
+    for start in range(0, pop_size, block_size):
+        block = genotypes[start:start+block_size]
+        close = np.all(np.abs(block[:, None, :] - genotypes[None, :, :]) <= tolerances[None, :, :],
+                       axis=2)
+        # only count each pair once and don't compare a genotype to itself
+        num_same += np.count_nonzero(np.triu(close, k=start+1))
+    possible_comparisons = (pop_size**2 - pop_size) // 2
     return 1 - num_same / possible_comparisons
+
+
+def bit_flip_mutation(children: Sequence[np.ndarray], prob: float, rng) -> np.ndarray:
+    """
+    Stack the children into a 2D array and flip each 0/1 gene with probability prob.
+    All the random numbers needed are drawn at once.
+    """
+    children = np.array(children)
+    mask = rng.random(children.shape) < prob
+    children[mask] = 1 - children[mask]
+    return children
+
+
+def categorical_mutation(children: Sequence[np.ndarray], prob: float,
+                         choices: Sequence, rng) -> np.ndarray:
+    """
+    Stack the children into a 2D array and resample each gene from choices with
+    probability prob.
+    """
+    children = np.array(children)
+    mask = rng.random(children.shape) < prob
+    children[mask] = rng.choice(choices, size=np.count_nonzero(mask))
+    return children
+
+
+def neighbor_mutation(children: Sequence[np.ndarray], prob: float,
+                      indptr: np.ndarray, indices: np.ndarray, rng) -> np.ndarray:
+    """
+    Stack the children into a 2D array and resample each gene with probability prob.
+
+    Gene j can only take the values indices[indptr[j]:indptr[j+1]], which is the layout of a
+    CSR adjacency matrix. This is used for encodings where gene j names a neighbor of node j.
+    Every gene must have at least one choice.
+    """
+    children = np.array(children)
+    rows, cols = np.nonzero(rng.random(children.shape) < prob)
+    n_choices = indptr[cols+1] - indptr[cols]
+    offsets = (rng.random(len(cols)) * n_choices).astype(np.int64)
+    children[rows, cols] = indices[indptr[cols] + offsets]
+    return children
+
+
+def step_mutation(children: Sequence[np.ndarray], prob: float, step: Number, rng) -> np.ndarray:
+    """
+    Stack the children into a 2D array and move each gene up or down by step with
+    probability prob.
+    """
+    children = np.array(children)
+    mask = rng.random(children.shape) < prob
+    children[mask] += step * rng.choice((-1, 1), size=np.count_nonzero(mask))
+    return children
+
+
+def gaussian_mutation(children: Sequence[np.ndarray], prob: float, scale: float,
+                      rng) -> np.ndarray:
+    """
+    Stack the children into a 2D array and add normally distributed noise with standard
+    deviation scale to each gene with probability prob.
+    """
+    children = np.array(children, dtype=np.float64)
+    mask = rng.random(children.shape) < prob
+    children[mask] += rng.normal(0, scale, size=np.count_nonzero(mask))
+    return children
+
+
+class PopulationGAOptimizer:
+    def __init__(self, objective,
+                 next_gen_fn: NextGenFunc,
+                 starting_population: Sequence[np.ndarray],
+                 num_processes: int = 1,
+                 cache: Optional['FitnessCache'] = None) -> None:
+        """
+        A drop in replacement for krug's GAOptimizer that rates the whole population at once.
+
+        If objective has a rate_population method, it is given a 2D array of encodings
+        (one per row) and must return an array of costs. Otherwise, objective is called on
+        each encoding. When num_processes > 1, the population is split into that many chunks
+        and the chunks are rated in a process pool that lives as long as the optimizer.
+        Call close when finished to shut the pool down.
+
+        cache: If provided, costs are looked up in the cache before the objective is used, and
+               only the unique encodings that miss get rated. The lookups happen in this
+               process, so the cache keeps working when num_processes > 1.
+        """
+        self._objective = objective
+        self._next_gen_fn = next_gen_fn
+        self._population = starting_population
+        self._num_processes = num_processes
+        self._pool = Pool(num_processes) if num_processes > 1 else None
+        self._cache = cache
+
+    def step(self) -> Sequence[Tuple[Number, np.ndarray]]:
+        population = np.array(self._population)
+        if self._cache is None:
+            costs = self._rate(population)
+        else:
+            costs = _rate_with_cache(self._cache, population, self._rate)
+        cost_to_encoding = tuple(zip(costs, population))
+        self._population = self._next_gen_fn(cost_to_encoding)
+        return cost_to_encoding
+
+    def _rate(self, population: np.ndarray) -> np.ndarray:
+        if self._pool is None:
+            return rate_population(self._objective, population)
+        chunks = np.array_split(population, self._num_processes)
+        return np.concatenate(self._pool.map(_rate_chunk,
+                                             ((self._objective, chunk) for chunk in chunks
+                                              if len(chunk) > 0)))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def rate_population(objective, population: np.ndarray) -> np.ndarray:
+    """Use objective's rate_population method if it has one. Otherwise, rate one at a time."""
+    if hasattr(objective, 'rate_population'):
+        return np.asarray(objective.rate_population(population))
+    return np.array([objective(encoding) for encoding in population])
+
+
+def _rate_chunk(args) -> np.ndarray:
+    objective, chunk = args
+    return rate_population(objective, chunk)
+
+
+def _rate_with_cache(cache: 'FitnessCache', population: Sequence[np.ndarray],
+                     rate: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+    """
+    Return the cost of each encoding in population, looking each distinct genotype up
+    in cache once and rating the ones that miss together with rate.
+    """
+    keys = [genotype_key(encoding) for encoding in population]
+    key_to_encoding = dict(zip(keys, population))
+    key_to_cost = {key: cache.get(key) for key in key_to_encoding}
+    misses = [key for key, cost in key_to_cost.items() if cost is None]
+    if len(misses) > 0:
+        miss_costs = rate(np.array([key_to_encoding[key] for key in misses]))
+        for key, cost in zip(misses, miss_costs):
+            cache.put(key, cost)
+            key_to_cost[key] = cost
+    return np.array([key_to_cost[key] for key in keys])
+
+
+def genotype_key(genotype: np.ndarray) -> bytes:
+    """Return a hashable key that is equal for genotypes with the same dtype and values."""
+    genotype = np.ascontiguousarray(genotype)
+    return genotype.dtype.str.encode() + genotype.tobytes()
+
+
+class FitnessCache:
+    def __init__(self, max_size: int = 100_000) -> None:
+        """
+        A least recently used cache of fitness values.
+
+        Once max_size entries are stored, adding another evicts the one that was used
+        least recently. The number of hits and misses is recorded for reporting.
+        """
+        self._max_size = max_size
+        self._key_to_value: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the value stored for key or None if it isn't in the cache."""
+        if key in self._key_to_value:
+            self._key_to_value.move_to_end(key)
+            self.hits += 1
+            return self._key_to_value[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._key_to_value[key] = value
+        self._key_to_value.move_to_end(key)
+        if len(self._key_to_value) > self._max_size:
+            self._key_to_value.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def __len__(self) -> int:
+        return len(self._key_to_value)
+
+    def __str__(self) -> str:
+        return f'FitnessCache(size={len(self)}, hits={self.hits}, misses={self.misses}, '\
+               f'hit_rate={self.hit_rate:.3f})'
+
+
+class CachedObjective:
+    def __init__(self, objective, max_size: int = 100_000) -> None:
+        """
+        Wrap a deterministic objective so that repeated genotypes aren't rated again.
+        Both __call__ and rate_population go through the cache.
+        """
+        self._objective = objective
+        self.cache = FitnessCache(max_size)
+
+    def __call__(self, encoding: np.ndarray) -> Number:
+        key = genotype_key(encoding)
+        cost = self.cache.get(key)
+        if cost is None:
+            cost = self._objective(encoding)
+            self.cache.put(key, cost)
+        return cost
+
+    def rate_population(self, population: Sequence[np.ndarray]) -> np.ndarray:
+        return _rate_with_cache(self.cache, population,
+                                lambda misses: rate_population(self._objective, misses))
+
+class CachedNoisyObjective:
+    def __init__(self, sample: Callable[[np.ndarray, int], Any],
+                 combine: Callable[[Sequence[Any]], Number],
+                 seeds: Sequence[int],
+                 max_size: int = 100_000,
+                 num_processes: int = 1) -> None:
+        """
+        Cache an objective that is the combination of several random trials.
+
+        sample: Run one trial of the encoding using the seed and return its measurement.
+                It must be deterministic given the encoding and the seed.
+        combine: Turn the measurements from every seed into a cost.
+        seeds: The seeds to run a trial with for each encoding.
+
+        Each (genotype, seed) measurement is cached separately, so the cache stays valid
+        when the seeds change. Missing measurements for a population are computed in a
+        process pool when num_processes > 1. Call close when finished to shut it down.
+        """
+        self._sample = sample
+        self._combine = combine
+        self.seeds = tuple(seeds)
+        self.cache = FitnessCache(max_size)
+        self._pool = Pool(num_processes) if num_processes > 1 else None
+
+    def __call__(self, encoding: np.ndarray) -> Number:
+        return self.rate_population((encoding,))[0]
+
+    def rate_population(self, population: Sequence[np.ndarray]) -> np.ndarray:
+        keys = [genotype_key(encoding) for encoding in population]
+        key_to_encoding = dict(zip(keys, population))
+        key_to_measurement = {(key, seed): self.cache.get((key, seed))
+                              for key in key_to_encoding for seed in self.seeds}
+        key_to_miss = {(key, seed): encoding
+                       for key, encoding in key_to_encoding.items()
+                       for seed in self.seeds
+                       if key_to_measurement[(key, seed)] is None}
+        args = [(self._sample, encoding, seed) for (_, seed), encoding in key_to_miss.items()]
+        if self._pool is None:
+            measurements = list(map(_call_sample, args))
+        else:
+            measurements = self._pool.map(_call_sample, args)
+        for key, measurement in zip(key_to_miss.keys(), measurements):
+            self.cache.put(key, measurement)
+            key_to_measurement[key] = measurement
+        return np.array([self._combine([key_to_measurement[(key, seed)] for seed in self.seeds])
+                         for key in keys])
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def _call_sample(args) -> Any:
+    sample, encoding, seed = args
+    return sample(encoding, seed)
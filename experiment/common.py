@@ -19,6 +19,7 @@ from networkgen import make_connected_community_network
 from pathlib import Path
 import copy
 import fileio as fio
+from network_layout import LayoutCache, get_default_layout_cache
 from scipy.stats import entropy
 import itertools as it
 T = TypeVar('T')
@@ -56,6 +57,14 @@ class MakeNetwork(ABC):
         pass
 
 
+def _seeded_layout_cache(seed: Optional[int]) -> Optional[LayoutCache]:
+    """
+    Networks made with a seed are the same every run, so their layouts are worth saving.
+    Unseeded ones are never seen again, so they would only fill up the cache.
+    """
+    return None if seed is None else get_default_layout_cache()
+
+
 class MakeConnectedCommunity(MakeNetwork):
     def __init__(self, community_size: int, inner_bounds: Tuple[int, int],
                  num_comms: int, outer_bounds: Tuple[int, int], seed: Optional[int] = None):
@@ -108,7 +117,8 @@ class MakeBarabasiAlbert(MakeNetwork):
         return self._seed
 
     def __call__(self) -> Network:
-        return Network(nx.barabasi_albert_graph(self._N, self._m, self._seed))
+        return Network(nx.barabasi_albert_graph(self._N, self._m, self._seed),
+                       layout_cache=_seeded_layout_cache(self._seed))
 
 
 class MakeWattsStrogatz(MakeNetwork):
@@ -128,7 +138,8 @@ class MakeWattsStrogatz(MakeNetwork):
         return self._seed
 
     def __call__(self) -> Network:
-        return Network(nx.watts_strogatz_graph(self._N, self._k, self._p, self._seed))
+        return Network(nx.watts_strogatz_graph(self._N, self._k, self._p, self._seed),
+                       layout_cache=_seeded_layout_cache(self._seed))
 
 
 class MakeErdosRenyi(MakeNetwork):
@@ -147,7 +158,8 @@ class MakeErdosRenyi(MakeNetwork):
         return self._seed
 
     def __call__(self) -> Network:
-        return Network(nx.erdos_renyi_graph(self._N, self._p, self._seed))
+        return Network(nx.erdos_renyi_graph(self._N, self._p, self._seed),
+                       layout_cache=_seeded_layout_cache(self._seed))
 
 
 class MakeGrid(MakeNetwork):
@@ -168,7 +180,8 @@ class MakeGrid(MakeNetwork):
 
     def __call__(self) -> Network:
         if self._net is None:
-            self._net = Network(nx.grid_2d_graph(self._m, self._n))
+            self._net = Network(nx.grid_2d_graph(self._m, self._n),
+                                layout_cache=get_default_layout_cache())
         # Make a copy so that if someone really wants to mutate the Network, it
         # won't screw up future return values.
         return copy.deepcopy(self._net)
@@ -147,7 +147,7 @@ def run_connected_community_trial(args: Tuple[ConnectedCommunityConfiguration, D
     # If a network couldn't be successfully generated, return None to signal the failure
     if net is None:
         return None
-    to_flicker = {(u, v) for u, v in net.edges if net.communities[u] != net.communities[v]}
+    to_flicker = set(net.intercommunity_edges)
     proportion_flickering = len(to_flicker) / net.E
     social_good = rate_social_good(net)
 
@@ -62,7 +62,7 @@ def sensitivity_to_initial_configuration():
     for seed in tqdm(range(num_seeds)):
         configuration = make_random_spatial_configuration((500, 500), 500,
                                                           np.random.default_rng(seed))
-        make_network = MakeLazySpatialNetwork(configuration)
+        make_network = MakeLazySpatialNetwork(configuration, max_reach=np.max(reaches))
         networks = [make_network(reach) for reach in reaches]
         num_comps = [nx.number_connected_components(network.G) for network in networks]
         all_num_comps.append(num_comps)
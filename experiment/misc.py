@@ -13,6 +13,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import networkx as nx
 import fileio as fio
+from communicability import calc_network_communicabilities
 import csv
 
 
@@ -173,10 +174,7 @@ def save_communicabilities():
     rows = []
     for class_name in tqdm(network_classes):
         nets = fio.read_network_class(class_name)
-        communicabilties = (sum(c
-                                for inner_values in nx.communicability_exp(net.G).values()
-                                for c in inner_values.values())
-                            for net in tqdm(nets))
+        communicabilties = calc_network_communicabilities(nets, 4)
         rows.append([class_name])
         rows.append(list(map(str, communicabilties)))
 
@@ -6,6 +6,7 @@ import sys
 sys.path.append('')
 from typing import List, Tuple, Union
 import fileio as fio
+from communicability import calc_network_communicabilities
 import numpy as np
 import matplotlib.pyplot as plt
 import sim_dynamic as sd
@@ -173,10 +174,7 @@ def infection_entropy_vs_communicability():
     for class_ in classes:
         rng = np.random.default_rng(777)
         nets = fio.read_network_class(class_)
-        communicabilities: List[int] = [sum(cell
-                                            for row in nx.communicability_exp(net.G).values()
-                                            for cell in row.values())
-                                        for net in tqdm(nets, desc='Communicability')]
+        communicabilities: List[float] = calc_network_communicabilities(nets, 4).tolist()
         entropies = [calc_entropy(run_sim_batch(net, 500, sd.Disease(4, .3),
                                                 sd.SimplePressureBehavior(net, rng, 2, .25), rng),
                                   n_bins)
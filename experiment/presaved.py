@@ -30,8 +30,7 @@ def main():
 
     for net_name, path in zip(names, paths):
         net = fio.read_network(path)
-        to_flicker = tuple((u, v) for u, v in net.edges
-                           if net.communities[u] != net.communities[v])
+        to_flicker = net.intercommunity_edges
         proportion_flickering = len(to_flicker) / net.E
         social_good = rate_social_good(net)
         trial_to_pf = tuple(proportion_flickering for _ in range(n_trials))
@@ -116,8 +115,7 @@ def run_experiments(args: Tuple[str, int, int, Disease, Sequence[FlickerConfig],
     """
     network_path, num_sims, sim_len, disease, flicker_configs, baseline_flicker_name = args
     net = fio.read_network(network_path)
-    intercommunity_edges = {(u, v) for u, v in net.edges
-                            if net.communities[u] != net.communities[v]}
+    intercommunity_edges = set(net.intercommunity_edges)
 
     behavior_to_results: Dict[str, Sequence[float]] = {}
     for config in flicker_configs:
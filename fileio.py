@@ -15,6 +15,8 @@ import re
 import matplotlib.pyplot as plt
 import pickle
 from sim_dynamic import SimResults
+from sim_animation import save_sir_animation
+from network_layout import LayoutCache, get_default_layout_cache, make_layout
 NETWORK_DIR = 'networks'
 
 
@@ -35,8 +37,20 @@ def write_network(G: nx.Graph,
 
 
 def read_network(file_name: str,
-                 remove_self_loops: bool = True)\
+                 remove_self_loops: bool = True,
+                 layout_cache: Optional[LayoutCache] = None,
+                 cache_layout: bool = True)\
         -> Network:
+    """
+    Read a network saved by write_network.
+
+    layout_cache: If the file has no layout, the layout that is made is looked up in
+                  and saved to this cache. If None, network_layout.get_default_layout_cache
+                  is used.
+    cache_layout: If False, a missing layout is always computed and never saved.
+    """
+    if layout_cache is None and cache_layout:
+        layout_cache = get_default_layout_cache()
     G: nx.Graph = nx.read_gml(file_name, None)  # type: ignore
 
     layout = nx.get_node_attributes(G, 'layout')
@@ -54,7 +68,7 @@ def read_network(file_name: str,
 
     if layout is not None:
         return Network(G, communities=node_to_community, layout=layout)
-    return Network(G, communities=node_to_community)
+    return Network(G, communities=node_to_community, layout_cache=layout_cache)
 
 
 # TODO: Instead of the cut off being for the longest stretch of time that two people
@@ -144,8 +158,14 @@ def old_output_network(G: nx.Graph, network_name: str,
         # It writes out where each of the nodes should be drawn.
         f.write('\n')
         if layout_algorithm is None:
-            layout_algorithm = nx.kamada_kawai_layout
-        if callable(layout_algorithm):
+            # isolated nodes haven't been given an ID yet
+            for node in G.nodes:
+                get_id_of_node(node)
+            edges = np.array([(node_to_id[n0], node_to_id[n1]) for n0, n1 in G.edges],
+                             dtype=np.int64).reshape(-1, 2)
+            positions = make_layout(len(G), edges)
+            layout = {node: positions[id_] for node, id_ in node_to_id.items()}
+        elif callable(layout_algorithm):
             layout = layout_algorithm(G)
         else:
             layout = layout_algorithm
@@ -236,9 +256,16 @@ def write_network_class(class_name: str, nets: Sequence[Network]) -> None:
             tar.add(path_to_net+'.txt', tmp_name+'.txt')
 
 
-def save_animation(net: Network, sirs: List[np.ndarray], output_name: str) -> None:
-    """Save an animation of the the sirs on the network."""
-    pass
+def save_animation(net: Network, sirs: List[np.ndarray], output_name: str, fps: int = 10,
+                   num_processes: int = 1) -> None:
+    """
+    Save an animation of the the sirs on the network.
+
+    output_name: A .gif or video file, or a directory to save a PNG of each frame in.
+    num_processes: The number of processes to render PNGs with.
+    """
+    save_sir_animation(net.layout_array, net.edge_array, sirs, output_name, fps,
+                       num_processes=num_processes)
 
 
 def save_sim_results(name: str, results: SimResults):
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 
-from analysis import visualize_network
+from analysis import make_csr, make_edge_array, visualize_network
 from krug import ga
 import networkx as nx
 import numpy as np
@@ -12,6 +12,7 @@ import partitioning
 from tqdm.std import tqdm
 from customtypes import Number
 from fileio import old_read_network_file
+import encoding_lib as lib
 
 
 def main():
@@ -34,10 +35,10 @@ def main():
     n_comps = int(sys.argv[2])
     n_labels = n_comps
     print(f'Searching for {n_comps} components.')
-    optimizer = ga.GAOptimizer(LabelObjective(G, n_comps),
-                               NextLabelGen(n_labels, rand),
-                               new_label_pop(rand, len(G), 50, n_labels),
-                               True, 2)
+    optimizer = lib.PopulationGAOptimizer(LabelObjective(G, n_comps),
+                                          NextLabelGen(n_labels, rand),
+                                          new_label_pop(rand, len(G), 50, n_labels),
+                                          2, lib.FitnessCache())
 
     n_steps = 200
     pbar = tqdm(range(n_steps))
@@ -52,6 +53,7 @@ def main():
         costs[step] = local_best[0]
         diversities[step] = len({tuple(ce[1]) for ce in cost_to_encoding}) / len(cost_to_encoding)
         pbar.set_description('Cost: {:.3f}'.format(local_best[0]))
+    optimizer.close()
 
     # partitioned = objective.partition(global_best[1])
     # partitioned = chakraborty_sato_partition(G, global_best[1])
@@ -74,6 +76,8 @@ class PartitioningObjective:
         self._ind_to_edge = dict(enumerate(G.edges))
         self._partition_weight = len(self._ind_to_edge)*2
         self._M = nx.to_numpy_array(G)
+        self._N = len(G)
+        self._edges = np.array(tuple(self._ind_to_edge.values()), dtype=np.int64).reshape(-1, 2)
 
     def _encoding_to_adj_matrix(self, encoding: np.ndarray) -> np.ndarray:
         enc_M = np.zeros(self._M.shape, dtype=self._M.dtype)
@@ -90,32 +94,36 @@ class PartitioningObjective:
         return complement
 
     def __call__(self, encoding: np.ndarray) -> int:
-        G = nx.Graph(self.partition(encoding))
-        comps = tuple(nx.connected_components(G))
-        if len(comps) == 1:
-            return len(encoding)-np.sum(encoding)
-        # largest_comp = len(max(comps, key=len))
-        smallest_comp = len(min(comps, key=len))
+        return self.rate_population((encoding,))[0]
+
+    def rate_population(self, population: Sequence[np.ndarray]) -> np.ndarray:
+        """Rate every encoding in the population at once."""
+        encodings = np.array(population)
+        pop_size = len(encodings)
+        genotype_ids, edge_inds = np.nonzero(encodings == 0)
+        labels, n_comps = partitioning.batch_connected_components(self._N, pop_size, genotype_ids,
+                                                                  self._edges[edge_inds, 0],
+                                                                  self._edges[edge_inds, 1])
+        comp_sizes = np.bincount(labels.ravel())
+        smallest_comp = np.minimum.reduceat(comp_sizes, labels[:, 0])
+        n_removed = np.sum(encodings, axis=1)
         # think about a way to discourage little pieces from getting detached
         # perhaps adding k*|singletons|?
-        cost = -len(comps)*self._partition_weight + np.sum(encoding) - smallest_comp
-        return cost
+        costs = np.where(n_comps == 1,
+                         encodings.shape[1] - n_removed,
+                         -n_comps*self._partition_weight + n_removed - smallest_comp)
+        return costs
 
 
 class NextEdgesToRm:
     def __init__(self, rand) -> None:
         self._rand = rand
 
-    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> Tuple[np.ndarray, ...]:
+    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> np.ndarray:
         couples = ga.roulette_wheel_cost_selection(rated_pop)
         offspring = (ga.single_point_crossover(*couple) for couple in couples)
         children = tuple(child for pair in offspring for child in pair)
-
-        for i, j in it.product(range(len(children)), range(len(children[0]))):
-            if self._rand.random() < .0001:
-                children[i][j] = 1 - children[i][j]
-
-        return children
+        return lib.bit_flip_mutation(children, .0001, self._rand)
 
 
 def new_to_rm_pop(edges: int, size: int, rand) -> Tuple[np.ndarray, ...]:
@@ -127,9 +135,9 @@ class ChakrabortySatoObjective:
     def __init__(self, G: nx.Graph) -> None:
         """The objective function for community detection as described by Chakraborty and Sato."""
         self._E = len(G.edges)
-        self._M = nx.to_numpy_array(G)
-        self._nodes = tuple(G.nodes)
-        self._k: Dict = nx.degree(G)  # type: ignore
+        self._N = len(G)
+        self._edges = np.array(tuple(G.edges), dtype=np.int64).reshape(-1, 2)
+        self._k = np.array([d for _, d in sorted(nx.degree(G))], dtype=np.float64)
 
     def __call__(self, encoding: np.ndarray) -> float:
         """
@@ -138,41 +146,42 @@ class ChakrabortySatoObjective:
         Encodings encode a list of N edges. One end of the edge is the location in the array.
         The other is the value.
         """
-        cluster_forest = nx.Graph(tuple((u, v) for u, v in enumerate(encoding)))
-        clusters = tuple(nx.connected_components(cluster_forest))
-        # import pdb; pdb.set_trace()
-
-        def lookup_cluster(node):
-            for cluster in clusters:
-                if node in cluster:
-                    return cluster
-            raise Exception(f'Could not find cluster for {node}.')
-        node_to_cluster = {node: lookup_cluster(node) for node in self._nodes}
+        return self.rate_population((encoding,))[0]
 
-        return -(1/(2*self._E)) * np.sum(tuple((self._M[i, j] - (self._k[i]*self._k[j])/(2*self._E))
-                                         * self._delta(node_to_cluster[i], node_to_cluster[j])
-                                               for i, j in it.product(self._nodes, self._nodes)))
+    def rate_population(self, population: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        Rate every encoding in the population at once.
 
-    @staticmethod
-    def _delta(cluster_i, cluster_j) -> int:
-        return cluster_i == cluster_j
+        The cost is the negative modularity of the clusters formed by the encoding's forest.
+        Summing (A_ij - k_i*k_j/2E) over every pair in the same cluster is the same as twice
+        the number of edges inside clusters minus the sum of each cluster's squared degree
+        total divided by 2E, so no pairwise loop is needed.
+        """
+        encodings = np.array(population, dtype=np.int64)
+        pop_size = len(encodings)
+        genotype_ids = np.repeat(np.arange(pop_size), self._N)
+        us = np.tile(np.arange(self._N), pop_size)
+        labels, _ = partitioning.batch_connected_components(self._N, pop_size, genotype_ids,
+                                                            us, encodings.ravel())
+        n_internal = np.sum(labels[:, self._edges[:, 0]] == labels[:, self._edges[:, 1]], axis=1)
+        cluster_degrees = np.bincount(labels.ravel(), weights=np.tile(self._k, pop_size))
+        squared_degrees = np.add.reduceat(cluster_degrees**2, labels[:, 0])
+        return -(1/(2*self._E)) * (2*n_internal - squared_degrees/(2*self._E))
 
 
 class NextChakrabortySatoGen:
     def __init__(self, rand, G: nx.Graph) -> None:
         self._rand = rand
-        self._neighbors = {node: np.array(tuple(nx.neighbors(G, node))) for node in G}
+        # neighbors of node j are self._indices[self._indptr[j]:self._indptr[j+1]]
+        neighbors = [tuple(nx.neighbors(G, node)) for node in range(len(G))]
+        self._indptr = np.cumsum([0] + [len(n) for n in neighbors])
+        self._indices = np.array(tuple(it.chain(*neighbors)), dtype=np.int64)
 
-    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> Tuple[np.ndarray, ...]:
+    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> np.ndarray:
         couples = ga.tournament_selection(rated_pop)
         offspring = (ga.single_point_crossover(*couple) for couple in couples)
         children = tuple(child for pair in offspring for child in pair)
-
-        for i, j in it.product(range(len(children)), range(len(children[0]))):
-            if self._rand.random() < .001:
-                children[i][j] = self._rand.choice(self._neighbors[j])
-
-        return children
+        return lib.neighbor_mutation(children, .001, self._indptr, self._indices, self._rand)
 
 
 def new_chakraborty_sato_pop(rand, G: nx.Graph, size: int) -> Tuple[np.ndarray, ...]:
@@ -216,15 +225,30 @@ class LabelObjective:
         """
         self._G = G
         self._num_communities = num_communities
+        self._edges = make_edge_array(G)
+        self._indptr, self._indices = make_csr(len(G), self._edges)
 
     def __call__(self, encoding: np.ndarray) -> Number:
-        edges_to_remove = partitioning.label_partition(self._G, encoding)
-        partitioned = nx.Graph(self._G)
-        partitioned.remove_edges_from(edges_to_remove)
-        communities = tuple(nx.connected_components(partitioned))
-
-        cost = self._num_communities*2*np.abs(len(communities) - self._num_communities)\
-            + len(max(communities, key=len)) - len(min(communities, key=len))
+        return self.rate_population((encoding,))[0]
+
+    def rate_population(self, population: Sequence[np.ndarray]) -> np.ndarray:
+        """Rate every encoding in the population at once."""
+        pop_size = len(population)
+        N = len(self._G)
+        labels = partitioning.propagate_labels_csr(self._indptr, self._indices,
+                                                   np.array(population))
+        # only edges between nodes with the same label survive the partitioning
+        genotype_ids, edge_inds = np.nonzero(labels[:, self._edges[:, 0]]
+                                             == labels[:, self._edges[:, 1]])
+        comp_labels, n_comps = partitioning.batch_connected_components(N, pop_size, genotype_ids,
+                                                                       self._edges[edge_inds, 0],
+                                                                       self._edges[edge_inds, 1])
+        comp_sizes = np.bincount(comp_labels.ravel())
+        largest_comp = np.maximum.reduceat(comp_sizes, comp_labels[:, 0])
+        smallest_comp = np.minimum.reduceat(comp_sizes, comp_labels[:, 0])
+
+        cost = self._num_communities*2*np.abs(n_comps - self._num_communities)\
+            + largest_comp - smallest_comp
 
         return cost
 
@@ -234,16 +258,11 @@ class NextLabelGen:
         self._labels = tuple(range(num_labels))
         self._rand = rand
 
-    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> Tuple[np.ndarray, ...]:
+    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> np.ndarray:
         couples = ga.roulette_wheel_cost_selection(rated_pop)
         offspring = (ga.single_point_crossover(*couple) for couple in couples)
         children = tuple(it.chain(*offspring))
-
-        for i, j in it.product(range(len(children)), range(len(children[0]))):
-            if self._rand.random() < .01:
-                children[i][j] = self._rand.choice(self._labels)
-
-        return children
+        return lib.categorical_mutation(children, .01, self._labels, self._rand)
 
 
 def new_label_pop(rand, N: int, pop_size: int, n_labels: int) -> Tuple[np.ndarray, ...]:
@@ -3,8 +3,8 @@ import krug.ga as ga
 import krug.sa as sa
 from tqdm import tqdm
 import numpy as np
-import itertools as it
 import matplotlib.pyplot as plt
+import encoding_lib as lib
 from genfuncs import identity, make_scaler, make_right_shift, differentiation, summation
 NUM_TO_TRANSFORMATION = dict(enumerate((identity, make_scaler(2), make_right_shift(1),
                                         differentiation, summation)))
@@ -55,23 +55,19 @@ def with_ga():
     report_on_ga(costs, diversities)
 
 
-def next_transformation_gen(transforms: Tuple[Tuple[int, np.ndarray], ...])\
-        -> Tuple[np.ndarray, ...]:
+def next_transformation_gen(transforms: Tuple[Tuple[int, np.ndarray], ...]) -> np.ndarray:
     # couples = ga.roulette_wheel_rank_selection(transforms)
     couples = ga.roulette_wheel_cost_selection(transforms)
     # couples = ga.tournament_selection(transforms, 2)
     # couples = ga.uniform_random_pairing_selection(transforms)
     offspring = (ga.single_point_crossover(*couple) for couple in couples)
     children = tuple(child for pair in offspring for child in pair)
-    mutate(children, .1)
-    return children
+    return mutate(children, .1)
 
 
-def mutate(encodings: Tuple[np.ndarray, ...], prob: float):
-    for i, j in it.product(range(len(encodings)), range(len(encodings[0]))):
-        if RAND.random() < prob:
-            # encodings[i][j] += np.random.choice((-1, 1))
-            encodings[i][j] = RAND.integers(len(NUM_TO_TRANSFORMATION))
+def mutate(encodings: Tuple[np.ndarray, ...], prob: float) -> np.ndarray:
+    # return lib.step_mutation(encodings, prob, 1, RAND)
+    return lib.categorical_mutation(encodings, prob, np.arange(len(NUM_TO_TRANSFORMATION)), RAND)
 
 
 def with_sa():
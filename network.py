@@ -3,58 +3,147 @@ from customtypes import Communities, Layout
 import networkx as nx
 import retworkx as rx
 import numpy as np
-from partitioning import fluidc_partition, intercommunity_edges_to_communities
+import scipy.sparse as sp
+from scipy.sparse.csgraph import shortest_path
+from analysis import calc_community_edge_counts
+from partitioning import (fluidc_partition, find_intercommunity_edges,
+                          intercommunity_edges_to_communities)
+from network_layout import LayoutCache, array_to_layout, layout_to_array, make_layout
 
 
 class Network:
-    def __init__(self, data: Union[nx.Graph, np.ndarray],
+    def __init__(self, data: Union[nx.Graph, np.ndarray, sp.spmatrix],
                  intercommunity_edges: Optional[Collection[Tuple[int, int]]] = None,
-                 communities: Optional[Communities] = None,
+                 communities: Optional[Union[Communities, np.ndarray]] = None,
                  community_size: int = 25,
-                 layout: Union[Layout, Callable[[nx.Graph], Layout]] = nx.kamada_kawai_layout):
+                 layout: Union[Layout, np.ndarray, Callable[[nx.Graph], Layout], None] = None,
+                 layout_cache: Optional[LayoutCache] = None):
         """
-        Holds both the NetworkX and NumPy representation of a network. It starts
-        off with just one and lazily creates the other representation.
+        A network stored as an immutable CSR adjacency matrix and array of edges. The
+        dense matrix (M), NetworkX graph (G) and retworkx graph (R) are built from them
+        the first time they are used. Whichever of them data is stays as that view.
+
+        data: A NetworkX graph, or a dense or sparse symmetric adjacency matrix. Use
+              Network.from_edges to make a network from an array of edges.
+        communities: Either a dictionary of node to community ID or an array where
+                     element i is the community of node i.
+        layout: A layout, an (N, 2) array of positions, or a function to make a layout
+                from the graph. If None, network_layout.make_layout is used.
+        layout_cache: Where make_layout should look for and save the layout, so that it
+                      is only computed the first time the network is seen. If None,
+                      nothing is written to disk.
 
         Caveats:
-        Do not mutate; changes in one data structure are not reflected in the other.
+        Do not mutate the views; changes in one are not reflected in the others.
         Does not support selfloops or multiedges.
         """
+        self._G: Optional[nx.Graph] = None
+        self._M: Optional[np.ndarray] = None
         if isinstance(data, nx.Graph):
-            # make sure that nodes are identified by integers
-            if not isinstance(next(iter(data.nodes)), int):
+            # make sure that nodes are identified by the integers 0 to N-1
+            N = len(data)
+            if not all(isinstance(node, int) and 0 <= node < N for node in data.nodes):
                 data = nx.relabel_nodes(data, {old: new for new, old in enumerate(data.nodes)})
-            self._G: nx.Graph = data  # type: ignore
-            self._M = None  # type: ignore
+            self._G = data
+            edges_and_weights = tuple(data.edges(data='weight', default=1))
+            edges = np.array([edge[:2] for edge in edges_and_weights],
+                             dtype=np.int64).reshape(-1, 2)
+            weights = np.array([edge[2] for edge in edges_and_weights], dtype=float)
+        elif sp.issparse(data):
+            N = data.shape[0]
+            upper = sp.triu(data, k=1, format='csr')
+            upper.sum_duplicates()
+            edges = np.stack((np.repeat(np.arange(N), np.diff(upper.indptr)),
+                              upper.indices), axis=1).astype(np.int64)
+            weights = upper.data.astype(float)
         else:
-            self._G = None  # type: ignore
-            self._M: np.ndarray = data
+            self._M = data
+            N = len(data)
+            us, vs = np.nonzero(np.triu(data, k=1))
+            edges = np.stack((us, vs), axis=1).astype(np.int64)
+            weights = data[us, vs].astype(float)
+        self._init_core(N, edges, weights)
         self._intercommunity_edges = intercommunity_edges
-        self._communities = communities
+        if isinstance(communities, np.ndarray):
+            self._community_array: Optional[np.ndarray] = communities
+            self._communities = None
+        else:
+            self._community_array = None
+            self._communities = communities
         self._community_size = community_size
         self._layout = layout
+        self._layout_array: Optional[np.ndarray] = None
+        self._layout_cache = layout_cache
         self._edge_density = None
         self._R = None
         self._dm = None
         self._edm = None  # Edge distance matrix (distance to attached edges is 1)
+        self._intercommunity_edge_array: Optional[np.ndarray] = None
+        self._community_sizes: Optional[np.ndarray] = None
+        self._community_edge_counts: Optional[sp.csr_matrix] = None
+
+    @staticmethod
+    def from_edges(N: int, edges: np.ndarray, weights: Optional[np.ndarray] = None,
+                   **kwargs) -> 'Network':
+        """
+        Make a network from an array of edges without using NetworkX.
+
+        N: The number of nodes.
+        edges: (E, 2) array where each row is an edge. Each edge should appear only once.
+               They are stored as (u, v) with u < v in sorted order, which is the order
+               that G.edges will have.
+        weights: The weight of each edge. Defaults to 1.
+        kwargs: The rest of the arguments to Network.
+        """
+        edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+        weights = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=float)
+        # only the upper triangle is read, and putting it in CSR form sorts the edges
+        upper = sp.csr_matrix((weights, (edges[:, 0], edges[:, 1])), shape=(N, N))
+        return Network(upper, **kwargs)
+
+    def _init_core(self, N: int, edges: np.ndarray, weights: np.ndarray) -> None:
+        self._A = _make_adjacency_matrix(N, edges, weights)
+        self._edge_array = edges
+        self._edge_weights = weights
+        for array in (self._A.data, self._A.indices, self._A.indptr,
+                      self._edge_array, self._edge_weights):
+            array.flags.writeable = False
+
+    @property
+    def A(self) -> sp.csr_matrix:
+        """The symmetric sparse adjacency matrix. It is read only."""
+        return self._A
 
     @property
     def G(self) -> nx.Graph:
         if self._G is None:
-            self._G = nx.Graph(self._M)
+            G = nx.Graph()
+            G.add_nodes_from(range(self.N))
+            if np.all(self._edge_weights == 1):
+                G.add_edges_from(self._edge_array.tolist())
+            else:
+                G.add_weighted_edges_from(zip(self._edge_array[:, 0].tolist(),
+                                              self._edge_array[:, 1].tolist(),
+                                              self._edge_weights.tolist()))
+            self._G = G
         return self._G
 
     @property
     def M(self) -> np.ndarray:
         if self._M is None:
-            self._M = nx.to_numpy_array(self._G)
+            self._M = self._A.toarray()
         return self._M
 
     @property
     def R(self):
-        """Return a retworkx PyGraph"""
+        """Return a retworkx PyGraph. Each edge's payload is its weight."""
         if self._R is None:
-            self._R = rx.networkx_converter(self.G)
+            R = rx.PyGraph()
+            R.add_nodes_from(range(self.N))
+            R.add_edges_from(list(zip(self._edge_array[:, 0].tolist(),
+                                      self._edge_array[:, 1].tolist(),
+                                      self._edge_weights.tolist())))
+            self._R = R
         return self._R
 
     @property
@@ -63,9 +152,7 @@ class Network:
 
     @property
     def E(self) -> int:
-        if self._G is not None:
-            return len(self._G.edges)
-        return np.sum(self._M > 0) // 2
+        return len(self._edge_array)
 
     @property
     def edge_density(self) -> float:
@@ -77,37 +164,100 @@ class Network:
     def edges(self) -> Iterable[Tuple[int, int]]:
         return self.G.edges
 
+    @property
+    def edge_array(self) -> np.ndarray:
+        """An (E, 2) array of the edges in the same order as edges. It is read only."""
+        return self._edge_array
+
+    @property
+    def edge_weights(self) -> np.ndarray:
+        """The weight of each edge in edge_array. It is read only."""
+        return self._edge_weights
+
     @property
     def intercommunity_edges(self):
         if self._intercommunity_edges is None:
-            if self._communities is None:
+            if self._communities is None and self._community_array is None:
                 self._intercommunity_edges = fluidc_partition(self.G, self.N//self._community_size)
             else:
-                self._intercommunity_edges = tuple((u, v) for u, v in self.edges
-                                                   if self._communities[u] != self._communities[v])
+                self._intercommunity_edges = tuple(map(tuple,
+                                                       self.intercommunity_edge_array.tolist()))
         return self._intercommunity_edges
 
     @property
-    def communities(self):
+    def intercommunity_edge_array(self) -> np.ndarray:
+        """A (K, 2) array of the edges between communities."""
+        if self._intercommunity_edge_array is None:
+            if self._communities is None and self._community_array is None:
+                self._intercommunity_edge_array = np.array(self.intercommunity_edges,
+                                                           dtype=np.int64).reshape(-1, 2)
+            else:
+                self._intercommunity_edge_array = self.edge_array[
+                    find_intercommunity_edges(self.edge_array, self.community_array)]
+        return self._intercommunity_edge_array
+
+    @property
+    def communities(self) -> Communities:
         if self._communities is None:
-            self._communities = intercommunity_edges_to_communities(self.G,
-                                                                    self.intercommunity_edges)
+            if self._community_array is not None:
+                self._communities = dict(enumerate(self._community_array.tolist()))
+            else:
+                self._communities = intercommunity_edges_to_communities(self.G,
+                                                                        self.intercommunity_edges)
         return self._communities
 
+    @property
+    def community_array(self) -> np.ndarray:
+        """The community of each node as an array."""
+        if self._community_array is None:
+            communities = self.communities
+            self._community_array = np.array([communities[node] for node in range(self.N)],
+                                             dtype=np.int64)
+        return self._community_array
+
+    @property
+    def community_sizes(self) -> np.ndarray:
+        """The number of nodes in each community."""
+        if self._community_sizes is None:
+            self._community_sizes = np.bincount(self.community_array)
+        return self._community_sizes
+
+    @property
+    def community_edge_counts(self) -> sp.csr_matrix:
+        """
+        A symmetric sparse matrix where entry (a, b) is the number of edges between
+        communities a and b. The diagonal holds the number of edges inside each community.
+        """
+        if self._community_edge_counts is None:
+            self._community_edge_counts = calc_community_edge_counts(
+                self.community_array, self.edge_array, len(self.community_sizes))
+        return self._community_edge_counts
+
     @property
     def layout(self) -> Layout:
-        if callable(self._layout):
-            self._layout = self._layout(self.G)
+        if self._layout is None or callable(self._layout) \
+                or isinstance(self._layout, np.ndarray):
+            self._layout = array_to_layout(self.layout_array)
         return self._layout
 
+    @property
+    def layout_array(self) -> np.ndarray:
+        """The position of each node as an (N, 2) array."""
+        if self._layout_array is None:
+            if self._layout is None:
+                self._layout_array = make_layout(self.N, self.edge_array,
+                                                 cache=self._layout_cache)
+            elif callable(self._layout):
+                self._layout_array = layout_to_array(self._layout(self.G), self.N)
+            else:
+                self._layout_array = layout_to_array(self._layout, self.N)
+        return self._layout_array
+
     @property
     def dm(self):
         if self._dm is None:
-            m: np.ndarray = rx.distance_matrix(self.R).copy()  # type: ignore
-            m[m == 0] = np.inf
-            for u in range(len(m)):
-                m[u, u] = 0
-            self._dm = m
+            # unreachable nodes are already inf
+            self._dm = shortest_path(self._A, unweighted=True)
         return self._dm
 
     @property
@@ -127,6 +277,11 @@ class Network:
         return self._edm
 
     def __len__(self) -> int:
-        if self._M is not None:
-            return len(self._M)
-        return len(self._G)  # type: ignore
+        return self._A.shape[0]
+
+
+def _make_adjacency_matrix(N: int, edges: np.ndarray, weights: np.ndarray) -> sp.csr_matrix:
+    """Return the symmetric CSR adjacency matrix of an undirected network."""
+    us = np.concatenate((edges[:, 0], edges[:, 1]))
+    vs = np.concatenate((edges[:, 1], edges[:, 0]))
+    return sp.csr_matrix((np.concatenate((weights, weights)), (us, vs)), shape=(N, N))
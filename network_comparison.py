@@ -0,0 +1,199 @@
+from typing import Any, Optional, Sequence, Tuple, Union
+from abc import ABC, abstractmethod
+from multiprocessing import Pool
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse.linalg import eigsh
+from network import Network
+
+# a network as the number of nodes and an (E, 2) array of edges
+Graph = Tuple[int, np.ndarray]
+
+
+class NetworkDistance(ABC):
+    """
+    A way of comparing networks.
+
+    prepare turns a network into whatever compare needs. It only depends on one network,
+    so when comparing many networks it is only done once per network.
+    """
+    def prepare(self, N: int, edges: np.ndarray) -> Any:
+        return N, edges
+
+    @abstractmethod
+    def compare(self, a: Any, b: Any) -> float:
+        """Return the distance between two prepared networks."""
+        pass
+
+    def __call__(self, N0: int, edges0: np.ndarray, N1: int, edges1: np.ndarray) -> float:
+        return self.compare(self.prepare(N0, edges0), self.prepare(N1, edges1))
+
+
+class EdgeJaccardDistance(NetworkDistance):
+    """
+    1 minus the Jaccard similarity of the edge sets, assuming nodes with the same ID
+    are the same node.
+    """
+    def prepare(self, N: int, edges: np.ndarray) -> np.ndarray:
+        return _edge_keys(edges)
+
+    def compare(self, a: np.ndarray, b: np.ndarray) -> float:
+        shared = len(np.intersect1d(a, b, assume_unique=True))
+        union = len(a) + len(b) - shared
+        return 1 - shared/union if union > 0 else 0.0
+
+
+class EdgeHammingDistance(NetworkDistance):
+    """
+    The number of edges in exactly one of the networks, assuming nodes with the same ID
+    are the same node. Adding the difference in the number of nodes gives an upper bound
+    on the graph edit distance.
+    """
+    def prepare(self, N: int, edges: np.ndarray) -> np.ndarray:
+        return _edge_keys(edges)
+
+    def compare(self, a: np.ndarray, b: np.ndarray) -> float:
+        shared = len(np.intersect1d(a, b, assume_unique=True))
+        return float(len(a) + len(b) - 2*shared)
+
+
+class DegreeSequenceDistance(NetworkDistance):
+    """
+    A lower bound on the graph edit distance from the degree sequences.
+
+    Whatever nodes are matched up, each edge edit changes two degrees by 1, so at least half
+    the total difference between matched degrees must be spent on edge edits. Matching the
+    sorted sequences minimizes that difference. The extra nodes of the bigger network also
+    have to be inserted.
+    """
+    def prepare(self, N: int, edges: np.ndarray) -> np.ndarray:
+        return np.sort(np.bincount(edges.ravel(), minlength=N))[::-1]
+
+    def compare(self, a: np.ndarray, b: np.ndarray) -> float:
+        n_inserted = abs(len(a) - len(b))
+        n = max(len(a), len(b))
+        a = np.pad(a, (0, n-len(a)))
+        b = np.pad(b, (0, n-len(b)))
+        return float(np.ceil(np.sum(np.abs(a - b)) / 2) + n_inserted)
+
+
+class SpectralDistance(NetworkDistance):
+    def __init__(self, k: Optional[int] = None) -> None:
+        """
+        The Euclidean distance between the largest eigenvalues of the adjacency matrices.
+
+        k: The number of eigenvalues to compare. If None, all of them are used, which
+           requires a dense eigensolver.
+        """
+        self._k = k
+
+    def prepare(self, N: int, edges: np.ndarray) -> np.ndarray:
+        us = np.concatenate((edges[:, 0], edges[:, 1]))
+        vs = np.concatenate((edges[:, 1], edges[:, 0]))
+        A = sp.csr_matrix((np.ones(len(us)), (us, vs)), shape=(N, N))
+        if self._k is None or self._k >= N-1:
+            values = np.linalg.eigvalsh(A.toarray())
+        else:
+            values = eigsh(A, k=self._k, which='LA', return_eigenvectors=False)
+        return np.sort(values)[::-1][:self._k]
+
+    def compare(self, a: np.ndarray, b: np.ndarray) -> float:
+        n = max(len(a), len(b))
+        return float(np.linalg.norm(np.pad(a, (0, n-len(a))) - np.pad(b, (0, n-len(b)))))
+
+
+class BipartiteEditDistance(NetworkDistance):
+    """
+    An upper bound on the graph edit distance (with every node and edge insertion or
+    deletion costing 1, as in nx.graph_edit_distance).
+
+    This is the bipartite approximation of Riesen and Bunke. Nodes are matched with the
+    Hungarian algorithm using a cost that only looks at each node's own edges: substituting
+    a node with degree d for one with degree d' costs |d - d'|, and deleting or inserting a
+    node costs 1 plus its degree. The result is the exact cost of the edit path that matching
+    implies, so it is never less than the true distance. The edit path that keeps node
+    IDs is also a valid one, so the cheaper of the two is returned.
+    """
+    def prepare(self, N: int, edges: np.ndarray) -> Tuple[int, np.ndarray, np.ndarray]:
+        return N, edges, np.bincount(edges.ravel(), minlength=N)
+
+    def compare(self, a: Tuple[int, np.ndarray, np.ndarray],
+                b: Tuple[int, np.ndarray, np.ndarray]) -> float:
+        N0, edges0, degrees0 = a
+        N1, edges1, degrees1 = b
+        # Square cost matrix: the top left block is substitution, the top right deletion,
+        # the bottom left insertion and the bottom right matches dummies with each other.
+        costs = np.zeros((N0+N1, N1+N0))
+        costs[:N0, :N1] = np.abs(degrees0[:, None] - degrees1[None, :])
+        costs[:N0, N1:] = np.inf
+        costs[np.arange(N0), N1 + np.arange(N0)] = 1 + degrees0
+        costs[N0:, :N1] = np.inf
+        costs[N0 + np.arange(N1), np.arange(N1)] = 1 + degrees1
+        rows, cols = linear_sum_assignment(costs)
+
+        # node i of the first network becomes node mapping[i] of the second, or -1 if deleted
+        mapping = np.full(N0, -1, dtype=np.int64)
+        substituted = (rows < N0) & (cols < N1)
+        mapping[rows[substituted]] = cols[substituted]
+        n_substituted = int(np.sum(substituted))
+        mapped_edges = mapping[edges0]
+        mapped_edges = mapped_edges[(mapped_edges >= 0).all(axis=1)]
+        shared = len(np.intersect1d(_edge_keys(mapped_edges), _edge_keys(edges1),
+                                    assume_unique=True))
+        node_edits = (N0 - n_substituted) + (N1 - n_substituted)
+        matched_cost = node_edits + len(edges0) + len(edges1) - 2*shared
+        keys0, keys1 = _edge_keys(edges0), _edge_keys(edges1)
+        identity_cost = abs(N0 - N1) + len(keys0) + len(keys1)\
+            - 2*len(np.intersect1d(keys0, keys1, assume_unique=True))
+        return float(min(matched_cost, identity_cost))
+
+
+def _edge_keys(edges: np.ndarray) -> np.ndarray:
+    """Return a sorted array with a unique int for each undirected edge."""
+    edges = np.sort(edges, axis=1).astype(np.int64)
+    return np.unique((edges[:, 0] << 32) | edges[:, 1])
+
+
+def calc_pairwise_distances(nets: Sequence[Union[Network, Graph]],
+                            distance: NetworkDistance,
+                            num_processes: int = 1) -> np.ndarray:
+    """
+    Return a symmetric matrix of the distance between every pair of networks.
+
+    nets: Networks or (N, edges) pairs, for example every instance of a network class.
+    distance: How to compare the networks.
+    num_processes: The number of processes to split the work between.
+    """
+    graphs = [(net.N, net.edge_array) if isinstance(net, Network) else net for net in nets]
+    n = len(graphs)
+    distances = np.zeros((n, n))
+    if num_processes > 1 and n > 2:
+        with Pool(num_processes, initializer=_init_worker, initargs=(distance, None)) as pool:
+            prepared = pool.starmap(distance.prepare, graphs)
+        with Pool(num_processes, initializer=_init_worker,
+                  initargs=(distance, prepared)) as pool:
+            rows = pool.map(_compare_row, range(n-1))
+    else:
+        _init_worker(distance, [distance.prepare(*graph) for graph in graphs])
+        rows = list(map(_compare_row, range(n-1)))
+    for i, row in enumerate(rows):
+        distances[i, i+1:] = row
+    return distances + distances.T
+
+
+_worker_distance: Optional[NetworkDistance] = None
+_worker_prepared: Optional[Sequence[Any]] = None
+
+
+def _init_worker(distance: NetworkDistance, prepared: Optional[Sequence[Any]]) -> None:
+    """Give each process the prepared networks once instead of with every task."""
+    global _worker_distance, _worker_prepared
+    _worker_distance = distance
+    _worker_prepared = prepared
+
+
+def _compare_row(i: int) -> np.ndarray:
+    """Compare network i with every network after it."""
+    return np.array([_worker_distance.compare(_worker_prepared[i], b)  # type: ignore
+                     for b in _worker_prepared[i+1:]])  # type: ignore
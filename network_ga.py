@@ -14,6 +14,7 @@ from tqdm import tqdm
 import krug.ga as ga
 from analysis import all_same, visualize_network
 import encoding_lib as lib
+from communicability import calc_total_communicability
 import partitioning as part
 
 
@@ -176,9 +177,11 @@ class HighBetweenessObjective:
 
 def low_communicability_objective(edges_present: np.ndarray) -> float:
     """Accept a bitset of edges and return the sum of the communicability values."""
-    net = lib.edge_set_to_network(edges_present)
-    communicability = nx.communicability_exp(net.G)
-    return sum(c for inner_values in communicability.values() for c in inner_values.values())
+    E = edges_present.shape[0]
+    N = int(np.sqrt(2*E+.25)+.5)
+    # the bits are in the same order as the upper triangle of the adjacency matrix
+    all_edges = np.stack(np.triu_indices(N, k=1), axis=1)
+    return calc_total_communicability(N, all_edges[edges_present > 0])
 
 
 def configuration_neighbor(degrees: Sequence[int], rand) -> Sequence[int]:
@@ -216,16 +219,11 @@ class NextNetworkGenEdgeList:
         self._N = N
         self._rand = rand
 
-    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> Tuple[np.ndarray, ...]:
+    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> np.ndarray:
         couples = ga.roulette_wheel_cost_selection(rated_pop)
         offspring = (ga.single_point_crossover(*couple) for couple in couples)
         children = tuple(child for pair in offspring for child in pair)
-
-        for i, j in it.product(range(len(children)), range(len(children[0]))):
-            if self._rand.random() < .001:
-                children[i][j] = self._rand.choice(self._vertex_choices)
-
-        return children
+        return lib.categorical_mutation(children, .001, self._vertex_choices, self._rand)
 
 
 class NextNetworkGenEdgeSet:
@@ -233,16 +231,11 @@ class NextNetworkGenEdgeSet:
         self._rand = rand
         self._mutation_prob = mutation_prob
 
-    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> Tuple[np.ndarray, ...]:
+    def __call__(self, rated_pop: Sequence[Tuple[Number, np.ndarray]]) -> np.ndarray:
         couples = ga.roulette_wheel_cost_selection(rated_pop)
         offspring = (ga.single_point_crossover(*couple) for couple in couples)
         children = tuple(child for pair in offspring for child in pair)
-
-        for i, j in it.product(range(len(children)), range(len(children[0]))):
-            if self._rand.random() < self._mutation_prob:
-                children[i][j] = 1 - children[i][j]
-
-        return children
+        return lib.bit_flip_mutation(children, self._mutation_prob, self._rand)
 
 
 class NextGenFixedEdges:
@@ -260,23 +253,23 @@ class NextGenFixedEdges:
         assert all(np.sum(child) == child0_sum for child in children[1:]),\
             'Edge number changed after crossover!'
 
-        n_children = len(children)
         len_child = len(children[0])
-        for i, j in it.product(range(n_children), range(len_child)):
+        # Draw the whole mutation mask at once and only visit the genes that mutate.
+        mutation_mask = self._rng.random((len(children), len_child)) < self._mutation_prob
+        for i, j in zip(*np.nonzero(mutation_mask)):
             # This would allow an edge to mutate and mutate back to the original value,
             # but I'm going with my gut feeling that it isn't worth adding a check to
             # prevent this.
-            if self._rng.random() < self._mutation_prob:
-                child = children[i]
-                old_value = child[j]
-                search_ind = (j-1) % len_child
-                child[j] = 1 - child[j]
-                # swap another value to compensate
-                # it makes sense to start looking close to the old value because
-                # the mutation will stay more local that way.
-                while child[search_ind] == old_value:
-                    search_ind = (search_ind-1) % len_child
-                child[search_ind] = 1 - child[search_ind]
+            child = children[i]
+            old_value = child[j]
+            search_ind = (j-1) % len_child
+            child[j] = 1 - child[j]
+            # swap another value to compensate
+            # it makes sense to start looking close to the old value because
+            # the mutation will stay more local that way.
+            while child[search_ind] == old_value:
+                search_ind = (search_ind-1) % len_child
+            child[search_ind] = 1 - child[search_ind]
 
         child0_sum = np.sum(children[0])
         assert all(np.sum(child) == child0_sum for child in children[1:]),\
@@ -0,0 +1,230 @@
+from typing import Callable, Dict, Optional, Union
+import hashlib
+import os
+import tempfile
+import numpy as np
+import networkx as nx
+from customtypes import Layout
+
+# where LayoutCache saves layouts unless it is given a different directory
+LAYOUT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'networks', '.layout-cache')
+# if this environment variable is set, get_default_layout_cache returns None, so
+# fileio.read_network and the experiments never write layouts to disk
+NO_LAYOUT_CACHE_VAR = 'NO_LAYOUT_CACHE'
+# kamada_kawai_layout needs an N by N distance matrix, so bigger networks use force_layout
+KAMADA_KAWAI_MAX_N = 500
+
+# An engine takes the number of nodes, an (E, 2) array of edges and an RNG and returns an
+# (N, 2) array of positions.
+LayoutEngine = Callable[[int, np.ndarray, np.random.Generator], np.ndarray]
+
+
+class LayoutCache:
+    def __init__(self, directory: str = LAYOUT_CACHE_DIR) -> None:
+        """
+        Stores layouts on disk so that they only have to be computed once per network.
+
+        directory: Where to save the layouts. It is created when the first layout is saved.
+        """
+        self._directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key+'.npy')
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the layout saved under key or None if there isn't one."""
+        try:
+            return np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, layout: np.ndarray) -> None:
+        """
+        Save layout under key. Failing to save is not an error, since the layout can
+        always be computed again.
+        """
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            # write to a temporary file first so that other processes never see half a file
+            fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix='.npy')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, layout)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            pass
+
+
+def get_default_layout_cache() -> Optional[LayoutCache]:
+    """
+    Return the cache that fileio.read_network and the experiments use, or None if the
+    NO_LAYOUT_CACHE environment variable is set.
+    """
+    if os.environ.get(NO_LAYOUT_CACHE_VAR):
+        return None
+    return LayoutCache()
+
+
+def calc_network_fingerprint(N: int, edges: np.ndarray) -> str:
+    """
+    Return a hash of the network that does not depend on the order or direction
+    of the edges.
+    """
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    keys = np.unique((edges[:, 0] << 32) | edges[:, 1])
+    h = hashlib.sha1(np.int64(N).tobytes())
+    h.update(keys.tobytes())
+    return h.hexdigest()
+
+
+def kamada_kawai_layout(N: int, edges: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """nx.kamada_kawai_layout as an (N, 2) array. rng is not used."""
+    G = nx.Graph()
+    G.add_nodes_from(range(N))
+    G.add_edges_from(edges.tolist())
+    return layout_to_array(nx.kamada_kawai_layout(G), N)
+
+
+def force_layout(N: int, edges: np.ndarray, rng: np.random.Generator,
+                 num_iterations: int = 100, grid_size: Optional[int] = None,
+                 max_chunk_size: int = 1_000_000) -> np.ndarray:
+    """
+    Return a Fruchterman-Reingold layout as an (N, 2) array scaled to fit in [-1, 1].
+
+    Instead of every pair of nodes repelling each other, the nodes are binned into a grid
+    and each node is repelled by the center of mass of each cell, leaving itself out of
+    its own cell. This makes each iteration take time proportional to N times the number
+    of cells instead of N². Attraction along the edges is exact.
+
+    num_iterations: The number of iterations to run. The step size shrinks linearly to 0.
+    grid_size: The number of cells along each side of the grid. Defaults to about one
+               cell for every four nodes, up to 32 by 32.
+    max_chunk_size: Roughly the most node-cell pairs to work on at once.
+    """
+    if N <= 1:
+        return np.zeros((N, 2))
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if grid_size is None:
+        grid_size = int(np.clip(np.sqrt(N) / 2, 1, 32))
+    num_cells = grid_size**2
+    k = np.sqrt(1 / N)  # the ideal distance between nodes
+    positions = rng.random((N, 2))
+    temperature = 0.1
+
+    for iteration in range(num_iterations):
+        # repulsion from the grid cells
+        lows = positions.min(axis=0)
+        extent = np.maximum(positions.max(axis=0) - lows, 1e-12)
+        cell_coords = np.minimum((positions - lows) / extent * grid_size, grid_size-1)
+        cells = cell_coords.astype(np.int64) @ np.array([grid_size, 1])
+        masses = np.bincount(cells, minlength=num_cells).astype(float)
+        sums = np.stack([np.bincount(cells, positions[:, d], minlength=num_cells)
+                         for d in range(2)], axis=1)
+        occupied = masses > 0
+        occupied_masses = masses[occupied]
+        centers = sums[occupied] / occupied_masses[:, None]
+        chunk_size = max(1, max_chunk_size // len(occupied_masses))
+        displacement = np.zeros((N, 2))
+        center_norms = np.sum(centers**2, axis=1)
+        for start in range(0, N, chunk_size):
+            end = min(start+chunk_size, N)
+            chunk = positions[start:end]
+            # expanding |x - c|² and sum(w (x - c)) lets the work be done by matrix products
+            distances_sq = np.sum(chunk**2, axis=1)[:, None] + center_norms\
+                - 2*chunk @ centers.T
+            strengths = occupied_masses * k**2 / np.maximum(distances_sq, 1e-6*k**2)
+            displacement[start:end] = chunk*np.sum(strengths, axis=1)[:, None]\
+                - strengths @ centers
+        # a node should only be repelled by the rest of its own cell
+        own_masses = masses[cells]
+        own_centers = sums[cells] / own_masses[:, None]
+        displacement -= _calc_repulsion(positions[:, None, :], own_centers[:, None],
+                                        own_masses[:, None], k)
+        other_masses = own_masses - 1
+        has_others = other_masses > 0
+        other_centers = np.divide(sums[cells] - positions, other_masses[:, None],
+                                  out=np.zeros((N, 2)), where=has_others[:, None])
+        displacement[has_others] += _calc_repulsion(positions[has_others, None, :],
+                                                    other_centers[has_others, None],
+                                                    other_masses[has_others, None], k)
+
+        # attraction along the edges with d²/k, in the direction of delta/d
+        deltas = positions[edges[:, 0]] - positions[edges[:, 1]]
+        pulls = deltas * np.linalg.norm(deltas, axis=1, keepdims=True) / k
+        for d in range(2):
+            displacement[:, d] -= np.bincount(edges[:, 0], pulls[:, d], minlength=N)
+            displacement[:, d] += np.bincount(edges[:, 1], pulls[:, d], minlength=N)
+
+        lengths = np.maximum(np.linalg.norm(displacement, axis=1, keepdims=True), 1e-12)
+        positions += displacement / lengths * np.minimum(lengths, temperature)
+        temperature -= 0.1 / num_iterations
+
+    return rescale_layout(positions)
+
+
+def _calc_repulsion(positions: np.ndarray, centers: np.ndarray, masses: np.ndarray,
+                    k: float) -> np.ndarray:
+    """
+    Return the force pushing each position away from the centers. Each center pushes with
+    k²/d for every unit of its mass.
+
+    positions: (n, 1, 2) array.
+    centers: (n, C, 2) array.
+    masses: (n, C) array.
+    """
+    deltas = positions - centers
+    distances_sq = np.maximum(np.sum(deltas**2, axis=-1), 1e-6*k**2)
+    return np.sum(deltas * (masses * k**2 / distances_sq)[..., None], axis=-2)
+
+
+def rescale_layout(positions: np.ndarray) -> np.ndarray:
+    """Center positions on the origin and scale them so that they fit in [-1, 1]."""
+    positions = positions - positions.mean(axis=0)
+    scale = np.abs(positions).max()
+    return positions / scale if scale > 0 else positions
+
+
+LAYOUT_ENGINES: Dict[str, LayoutEngine] = {
+    'kamada_kawai': kamada_kawai_layout,
+    'force': force_layout,
+}
+
+
+def make_layout(N: int, edges: np.ndarray, algorithm: str = 'auto', seed: int = 0,
+                cache: Optional[LayoutCache] = None) -> np.ndarray:
+    """
+    Return the layout of a network as an (N, 2) array, loading it from cache if it
+    has been computed before.
+
+    algorithm: A key of LAYOUT_ENGINES, or 'auto' to use kamada_kawai for networks with
+               up to KAMADA_KAWAI_MAX_N nodes and force for bigger networks.
+    seed: Seed for the layout engine's RNG.
+    cache: Where to look for and save the layout. If None, the layout is always computed
+           and nothing is written to disk.
+    """
+    if algorithm == 'auto':
+        algorithm = 'kamada_kawai' if N <= KAMADA_KAWAI_MAX_N else 'force'
+    engine = LAYOUT_ENGINES[algorithm]
+    key = f'{algorithm}-{seed}-{calc_network_fingerprint(N, edges)}'
+    if cache is not None:
+        layout = cache.get(key)
+        if layout is not None and layout.shape == (N, 2):
+            return layout
+    layout = engine(N, np.asarray(edges, dtype=np.int64).reshape(-1, 2),
+                    np.random.default_rng(seed))
+    if cache is not None:
+        cache.put(key, layout)
+    return layout
+
+
+def layout_to_array(layout: Union[Layout, np.ndarray], N: Optional[int] = None) -> np.ndarray:
+    """Return layout as an (N, 2) float array. Nodes must be 0 to N-1."""
+    if isinstance(layout, np.ndarray):
+        return layout.astype(float, copy=False)
+    N = len(layout) if N is None else N
+    return np.array([layout[node] for node in range(N)], dtype=float).reshape(N, 2)
+
+
+def array_to_layout(positions: np.ndarray) -> Layout:
+    """Return an (N, 2) array of positions as a dictionary of node to (x, y)."""
+    return dict(enumerate(map(tuple, positions.tolist())))  # type: ignore
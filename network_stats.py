@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components, shortest_path
+
+
+@dataclass
+class NetworkStats:
+    """
+    Summary statistics of an undirected network.
+
+    N: The number of nodes.
+    E: The number of edges.
+    degrees: Element i is the degree of node i.
+    degree_histogram: Element d is the number of nodes with degree d.
+    edge_density: E divided by the number of possible edges.
+    triangles: Element i is the number of triangles node i is part of.
+    clustering: Element i is the clustering coefficient of node i.
+    assortativity: The degree assortativity coefficient.
+    diameter: The diameter of the largest connected component, or the best lower bound
+              found if it could not be pinned down in the number of BFSs allowed.
+    diameter_upper_bound: Equal to diameter when diameter is exact.
+    """
+    N: int
+    E: int
+    degrees: np.ndarray
+    degree_histogram: np.ndarray
+    edge_density: float
+    triangles: np.ndarray
+    clustering: np.ndarray
+    assortativity: float
+    diameter: int
+    diameter_upper_bound: int
+
+    @property
+    def is_diameter_exact(self) -> bool:
+        return self.diameter == self.diameter_upper_bound
+
+    @property
+    def average_clustering(self) -> float:
+        return float(np.mean(self.clustering)) if self.N > 0 else 0.0
+
+
+def calc_network_stats(N: int, edges: np.ndarray, max_block_nnz: int = 10_000_000,
+                       max_bfs: int = 20) -> NetworkStats:
+    """
+    Return the summary statistics of the network with N nodes and the given edges.
+
+    N: The number of nodes.
+    edges: (E, 2) array where each row is an edge. Each edge should appear only once.
+    max_block_nnz: Roughly the most nonzero entries of A·A to hold in memory at once
+                   while counting triangles.
+    max_bfs: The most breadth first searches to use to find the diameter.
+    """
+    A = make_adjacency_matrix(N, edges)
+    degrees = np.diff(A.indptr)
+    E = len(edges)
+    triangles = count_triangles(A, max_block_nnz)
+    possible_triangles = degrees * (degrees - 1) / 2
+    clustering = np.divide(triangles, possible_triangles,
+                           out=np.zeros(N), where=possible_triangles > 0)
+    diameter, diameter_upper_bound = calc_largest_component_diameter(A, max_bfs)
+    return NetworkStats(N=N,
+                        E=E,
+                        degrees=degrees,
+                        degree_histogram=np.bincount(degrees, minlength=1),
+                        edge_density=E / (N*(N-1)/2) if N > 1 else 0.0,
+                        triangles=triangles,
+                        clustering=clustering,
+                        assortativity=calc_degree_assortativity(degrees, edges),
+                        diameter=diameter,
+                        diameter_upper_bound=diameter_upper_bound)
+
+
+def make_adjacency_matrix(N: int, edges: np.ndarray) -> sp.csr_matrix:
+    """Return the symmetric 0/1 CSR adjacency matrix of an undirected network."""
+    us = np.concatenate((edges[:, 0], edges[:, 1]))
+    vs = np.concatenate((edges[:, 1], edges[:, 0]))
+    A = sp.csr_matrix((np.ones(len(us), dtype=np.int64), (us, vs)), shape=(N, N))
+    A.sum_duplicates()
+    A.data[:] = 1
+    return A
+
+
+def count_triangles(A: sp.csr_matrix, max_block_nnz: int = 10_000_000) -> np.ndarray:
+    """
+    Return the number of triangles each node is part of.
+
+    The triangles through node i are half of row i of (A·A)∘A. The product is done in
+    blocks of rows so that hubs don't make it too big to hold in memory.
+    """
+    N = A.shape[0]
+    degrees = np.diff(A.indptr)
+    # row i of A·A has at most the sum of the degrees of i's neighbors entries
+    row_costs = np.asarray(A @ degrees).ravel() + 1
+    block_ends = np.searchsorted(np.cumsum(row_costs),
+                                 np.arange(max_block_nnz, row_costs.sum(), max_block_nnz))
+    block_bounds = np.unique(np.concatenate(([0], block_ends, [N])))
+    triangles = np.zeros(N, dtype=np.int64)
+    for start, end in zip(block_bounds[:-1], block_bounds[1:]):
+        block = A[start:end]
+        triangles[start:end] = np.asarray((block @ A).multiply(block).sum(axis=1)).ravel() // 2
+    return triangles
+
+
+def calc_degree_assortativity(degrees: np.ndarray, edges: np.ndarray) -> float:
+    """
+    Return the Pearson correlation between the degrees at either end of the edges.
+    Each edge is counted in both directions, as in nx.degree_assortativity_coefficient.
+    """
+    xs = degrees[np.concatenate((edges[:, 0], edges[:, 1]))].astype(float)
+    ys = degrees[np.concatenate((edges[:, 1], edges[:, 0]))].astype(float)
+    xs -= np.mean(xs) if len(xs) > 0 else 0
+    ys -= np.mean(ys) if len(ys) > 0 else 0
+    variance = np.dot(xs, xs)
+    if variance == 0:
+        return float('nan')
+    return float(np.dot(xs, ys) / variance)
+
+
+def calc_largest_component_diameter(A: sp.csr_matrix,
+                                    max_bfs: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Return lower and upper bounds on the diameter of the largest connected component.
+    They are equal unless max_bfs ran out first.
+
+    Instead of a BFS from every node, this keeps lower and upper bounds on each node's
+    eccentricity (Takes and Kosters' bounding diameters algorithm) and only runs a BFS
+    from nodes that could still have a larger eccentricity than the best found so far.
+    This usually takes a handful of BFSs on networks with a large diameter, but
+    networks with a small diameter and many nodes with about the same eccentricity
+    can take many more.
+
+    max_bfs: The most BFSs to run. None means no limit.
+    """
+    N = A.shape[0]
+    if N == 0:
+        return 0, 0
+    _, labels = connected_components(A, directed=False)
+    component = np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+    C = A[component][:, component].tocsr()
+    n = len(component)
+    degrees = np.diff(C.indptr)
+    ecc_lower = np.zeros(n, dtype=np.int64)
+    ecc_upper = np.full(n, n, dtype=np.int64)
+    candidates = np.ones(n, dtype=bool)
+    lower, upper = 0, n
+    use_upper = True
+    bfs_count = 0
+    while lower < upper and candidates.any():
+        if max_bfs is not None and bfs_count >= max_bfs:
+            return lower, min(upper, int(np.max(ecc_upper[candidates])))
+        bfs_count += 1
+        # alternate between the candidates most likely to raise lower and lower upper
+        # preferring high degree nodes when there are ties
+        if use_upper:
+            key = ecc_upper * (n+1) + degrees
+            source = np.argmax(np.where(candidates, key, -1))
+        else:
+            key = ecc_lower * (n+1) - degrees
+            source = np.argmin(np.where(candidates, key, np.iinfo(np.int64).max))
+        use_upper = not use_upper
+        distances = shortest_path(C, unweighted=True, indices=source).astype(np.int64)
+        eccentricity = int(distances.max())
+        lower = max(lower, eccentricity)
+        upper = min(upper, 2*eccentricity)
+        ecc_lower = np.maximum(ecc_lower, np.maximum(distances, eccentricity - distances))
+        ecc_upper = np.minimum(ecc_upper, eccentricity + distances)
+        candidates[source] = False
+        # a node can't be an endpoint of a longer path than the longest one found
+        candidates &= ecc_upper > lower
+    return lower, lower
@@ -1,9 +1,12 @@
 from networkgen._social_circles import make_social_circles_network, Agent
 from networkgen._connected_community import make_connected_community_network
-from networkgen._clique_gate import make_complete_clique_gate_network
+from networkgen._clique_gate import (make_complete_clique_gate_network,
+                                    make_clique_gate_network, make_clique_gate_edges)
 from networkgen._agent_based import (make_agent_generated_network,
                                      TimeBasedBehavior,
                                      AgentBehavior)
 from networkgen._lazy_spatial import (MakeLazySpatialNetwork, SpatialConfiguration,
                                       make_random_spatial_configuration)
-from networkgen._affiliation_network import make_affiliation_network
+from networkgen._affiliation_network import (make_affiliation_network,
+                                             make_affiliation_adjacency,
+                                             calc_sparse_clustering_and_edge_density)
@@ -1,16 +1,11 @@
 import sys
-from typing import Sequence
+from typing import Sequence, Tuple
 import numpy as np
-import networkx as nx
-import itertools as it
+import scipy.sparse as sp
 sys.path.append('')
 from network import Network
 
 
-def flatten(sequence):
-    return tuple(it.chain(*sequence))
-
-
 def make_affiliation_network(group_to_membership_percentage: Sequence[float],
                              N: int, rng) -> Network:
     """
@@ -25,12 +20,62 @@ def make_affiliation_network(group_to_membership_percentage: Sequence[float],
     N: The number of agents in the network
     rng: an np.random.default_rng instance
     """
-    agents = tuple(range(N))
-    group_memberships = [rng.choice(agents, size=int(np.round(N*perc)), replace=False)
+    return network_from_adjacency(make_affiliation_adjacency(group_to_membership_percentage,
+                                                             N, rng))
+
+
+def make_affiliation_adjacency(group_to_membership_percentage: Sequence[float],
+                               N: int, rng) -> sp.csr_matrix:
+    """
+    Return the sparse adjacency matrix of the network make_affiliation_network would create.
+    It uses the random numbers in the same way, so both give the same network for the same rng.
+    """
+    group_memberships = [rng.choice(N, size=int(np.round(N*perc)), replace=False)
                          for perc in group_to_membership_percentage]
-    edges = flatten(tuple(it.combinations(membership, 2)) for membership in group_memberships)
-    # If the graph is construct solely from the edge list, some nodes might be left out.
-    # So, construct an empty graph and then add the edges
-    G: nx.Graph = nx.empty_graph(N)
-    G.add_edges_from(edges)
-    return Network(G)
+    agents = np.concatenate([np.zeros(0, dtype=np.int64)] + group_memberships)
+    groups = np.repeat(np.arange(len(group_memberships)),
+                       [len(membership) for membership in group_memberships])
+    B = sp.coo_matrix((np.ones(len(agents), dtype=np.int64), (agents, groups)),
+                      shape=(N, len(group_memberships))).tocsr()
+    return project_incidence(B)
+
+
+def project_incidence(B: sp.spmatrix) -> sp.csr_matrix:
+    """
+    Project a bipartite agent by group incidence matrix onto the agents.
+
+    Two agents are adjacent when they share at least one group. This is B·Bᵀ with
+    the diagonal removed and every remaining entry set to 1.
+    """
+    B = sp.csr_matrix(B, dtype=np.int64)
+    # an agent joining the same group twice only counts once
+    B.data[:] = 1
+    A = (B @ B.T).tocsr()
+    A = (A - sp.diags(A.diagonal(), dtype=A.dtype)).tocsr()
+    A.eliminate_zeros()
+    A.data[:] = 1
+    return A
+
+
+def network_from_adjacency(A: sp.spmatrix) -> Network:
+    """Make a Network from a symmetric sparse adjacency matrix without self loops."""
+    upper = sp.triu(A, k=1).tocoo()
+    return Network.from_edges(A.shape[0], np.stack((upper.row, upper.col), axis=1))
+
+
+def calc_sparse_clustering_and_edge_density(A: sp.spmatrix) -> Tuple[float, float]:
+    """
+    Return the average clustering coefficient (as in nx.average_clustering) and edge
+    density of the network with the symmetric 0/1 sparse adjacency matrix A.
+
+    Triangles through each node are counted as the row sums of (A·A)∘A.
+    """
+    A = sp.csr_matrix(A, dtype=np.float64)
+    N = A.shape[0]
+    degrees = np.asarray(A.sum(axis=1)).ravel()
+    triangles = np.asarray((A @ A).multiply(A).sum(axis=1)).ravel() / 2
+    possible_triangles = degrees * (degrees - 1) / 2
+    clustering = np.divide(triangles, possible_triangles,
+                           out=np.zeros(N), where=possible_triangles > 0)
+    edge_density = A.nnz / (N**2 - N)
+    return float(np.mean(clustering)), edge_density
@@ -1,8 +1,11 @@
 #!/usr/bin/python3
 from network import Network
-from typing import Iterable, List, Callable, Optional, Sequence, Tuple, Union
+from typing import Dict, Iterable, Iterator, List, Callable, Optional, Set, Tuple, Union
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+import itertools as it
 import sys
 from random import choice
 from fileio import read_network
@@ -23,6 +26,16 @@ def make_agent_generated_network(starting_point: Union[int, nx.Graph],
     G = make_initial_network()
     finished = False
     steps_taken = 0
+    # behaviors that know how to step an AgentNetwork avoid rebuilding the graph every step
+    if hasattr(behavior, 'step'):
+        state = AgentNetwork.from_graph(G)
+        while not finished:
+            if steps_taken > max_steps:
+                return None
+            finished = behavior.step(state)  # type: ignore
+            steps_taken += 1
+        return Network.from_edges(state.N, state.edge_array())
+
     while not finished:
         if steps_taken > max_steps:
             return None
@@ -31,6 +44,110 @@ def make_agent_generated_network(starting_point: Union[int, nx.Graph],
     return Network(G)
 
 
+class AgentNetwork:
+    def __init__(self, N: int) -> None:
+        """
+        A network of N agents that can be changed one edge at a time.
+
+        Each agent's neighbors are kept in a set, and the number of common neighbors
+        of the endpoints of every edge is kept up to date as edges are added and removed.
+        Adding or removing (u, v) only changes the counts of edges from u or v to their
+        common neighbors, so each change costs about as much as intersecting two sets.
+        """
+        self.N = N
+        self.neighbors: List[Set[int]] = [set() for _ in range(N)]
+        self._edge_to_common_neighbors: Dict[Tuple[int, int], int] = {}
+
+    @staticmethod
+    def from_graph(G: nx.Graph) -> 'AgentNetwork':
+        """Copy G into a new AgentNetwork. G's nodes must be 0 to N-1."""
+        state = AgentNetwork(len(G))
+        for u, v in G.edges:
+            state.add_edge(u, v)
+        return state
+
+    def add_edge(self, u: int, v: int) -> bool:
+        """Add the edge (u, v). Return False if it is a self loop or already exists."""
+        if u == v or v in self.neighbors[u]:
+            return False
+        common = self.neighbors[u] & self.neighbors[v]
+        # v becomes a common neighbor of u and w, and u becomes one of v and w
+        for w in common:
+            self._edge_to_common_neighbors[_edge_key(u, w)] += 1
+            self._edge_to_common_neighbors[_edge_key(v, w)] += 1
+        self._edge_to_common_neighbors[_edge_key(u, v)] = len(common)
+        self.neighbors[u].add(v)
+        self.neighbors[v].add(u)
+        return True
+
+    def remove_edge(self, u: int, v: int) -> None:
+        self.neighbors[u].discard(v)
+        self.neighbors[v].discard(u)
+        for w in self.neighbors[u] & self.neighbors[v]:
+            self._edge_to_common_neighbors[_edge_key(u, w)] -= 1
+            self._edge_to_common_neighbors[_edge_key(v, w)] -= 1
+        del self._edge_to_common_neighbors[_edge_key(u, v)]
+
+    def common_neighbors(self, u: int, v: int) -> int:
+        """Return the number of common neighbors of u and v. (u, v) must be an edge."""
+        return self._edge_to_common_neighbors[_edge_key(u, v)]
+
+    def degree(self, u: int) -> int:
+        return len(self.neighbors[u])
+
+    def edge_array(self) -> np.ndarray:
+        return np.array(tuple(self._edge_to_common_neighbors.keys()),
+                        dtype=np.int64).reshape(-1, 2)
+
+    def is_connected(self) -> bool:
+        edges = self.edge_array()
+        A = sp.coo_matrix((np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])),
+                          shape=(self.N, self.N))
+        return connected_components(A, directed=False)[0] == 1
+
+    def to_graph(self) -> nx.Graph:
+        G: nx.Graph = nx.empty_graph(self.N)  # type: ignore
+        G.add_edges_from(self._edge_to_common_neighbors.keys())
+        return G
+
+
+def _edge_key(u: int, v: int) -> Tuple[int, int]:
+    return (u, v) if u < v else (v, u)
+
+
+class IndexedPool:
+    def __init__(self) -> None:
+        """A set of ints that supports adding, removing and choosing at random in O(1)."""
+        self._items: List[int] = []
+        self._item_to_index: Dict[int, int] = {}
+
+    def add(self, item: int) -> None:
+        if item not in self._item_to_index:
+            self._item_to_index[item] = len(self._items)
+            self._items.append(item)
+
+    def discard(self, item: int) -> None:
+        index = self._item_to_index.pop(item, None)
+        if index is None:
+            return
+        last = self._items.pop()
+        if index < len(self._items):
+            self._items[index] = last
+            self._item_to_index[last] = index
+
+    def choice(self, rand) -> int:
+        return self._items[rand.integers(len(self._items))]
+
+    def __contains__(self, item: int) -> bool:
+        return item in self._item_to_index
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._items)
+
+
 def assign_colors(G: nx.Graph) -> List[str]:
     components = nx.connected_components(G)
     node_to_color = [(node, COLORS[i]) for i, component in enumerate(components)
@@ -160,66 +277,108 @@ class TimeBasedBehavior:
         self._lower_bound = lower_bound
         self._upper_bound = upper_bound
         self._steps_to_stable = steps_to_stable
-        # agents are ints so, this is probably faster than a dict
-        self._agent_to_previous_neighbors = [set() for _ in range(N)]
+        # the neighbors agents had before the current step, for agents whose neighbors changed
+        self._agent_to_previous_neighbors: Dict[int, Set[int]] = {}
+        self._stable_pool = IndexedPool()
         self._steps_taken = 0
         self._rand = rand
         self.name = f'TimeBasedBehavior(N={N}, lb={lower_bound}, ub={upper_bound}, '\
                     f'sts={steps_to_stable})'
 
-    def _unstable_behavior(self, G: nx.Graph, agent: int, neighbors: Sequence[int]):
+    def _unstable_behavior(self, state: AgentNetwork, agent: int) -> None:
+        neighbors = state.neighbors[agent]
         # add a neighbor if lonely
         if len(neighbors) < self._lower_bound:
             if len(neighbors) == 0:
-                connect_agents(G, agent, choice(tuple(G.nodes)))
+                self._connect(state, agent, self._random_other_agent(state, agent))
             else:
-                neighbor_to_strength = {(neighbor, calc_prop_common_neighbors(G, agent, neighbor))
-                                        for neighbor in neighbors}
-                closest_neighbor = max(neighbor_to_strength, key=lambda x: x[1])[0]
+                closest_neighbor = max(neighbors,
+                                       key=lambda neighbor: state.common_neighbors(agent, neighbor))
                 # TODO: neighbor_choices will likely include agents already adjacent to agent.
                 # These should be filtered out.
-                neighbor_choices = tuple(set(G[closest_neighbor]) - {agent})
-                to_add = choice(neighbor_choices if len(neighbor_choices) > 0 else tuple(G.nodes))
-                connect_agents(G, agent, to_add)
+                neighbor_choices = tuple(state.neighbors[closest_neighbor] - {agent})
+                to_add = neighbor_choices[self._rand.integers(len(neighbor_choices))]\
+                    if len(neighbor_choices) > 0 else self._random_other_agent(state, agent)
+                self._connect(state, agent, to_add)
         # remove a neighbor if overwhelmed
         elif len(neighbors) > self._upper_bound:
-            neighbor_to_strength = {(neighbor, calc_prop_common_neighbors(G, agent, neighbor))
-                                    for neighbor in neighbors}
-            farthest_neighbor = min(neighbor_to_strength, key=lambda x: x[1])[0]
-            G.remove_edge(agent, farthest_neighbor)
-
-    def _stable_behavior(self, G: nx.Graph, agent: int, neighbors: Sequence[int]):
-        if len(neighbors) < self._upper_bound - 1:
-            neighbor_choices = [n for n in G.nodes
-                                if all((self._time_stable[n] > self._steps_to_stable,
-                                        n not in neighbors,
-                                        len(G[n]) < self._upper_bound - 1))]
+            farthest_neighbor = min(neighbors,
+                                    key=lambda neighbor: state.common_neighbors(agent, neighbor))
+            self._disconnect(state, agent, farthest_neighbor)
+
+    def _stable_behavior(self, state: AgentNetwork, agent: int) -> None:
+        neighbors = state.neighbors[agent]
+        if len(neighbors) < self._upper_bound - 1 and len(self._stable_pool) > 0:
+            # Most of the pool is usually valid, so try a few random draws before
+            # falling back to filtering the whole pool.
+            for _ in range(10):
+                candidate = self._stable_pool.choice(self._rand)
+                if candidate != agent and candidate not in neighbors:
+                    self._connect(state, agent, candidate)
+                    return
+            neighbor_choices = [n for n in self._stable_pool
+                                if n != agent and n not in neighbors]
             if len(neighbor_choices) > 0:
-                connect_agents(G, agent, choice(neighbor_choices))
+                self._connect(state, agent,
+                              neighbor_choices[self._rand.integers(len(neighbor_choices))])
+
+    def _random_other_agent(self, state: AgentNetwork, agent: int) -> int:
+        other = self._rand.integers(state.N - 1)
+        return other + 1 if other >= agent else other
+
+    def _connect(self, state: AgentNetwork, u: int, v: int) -> None:
+        self._remember_neighbors(state, u)
+        self._remember_neighbors(state, v)
+        state.add_edge(u, v)
+        self._update_pool(state, u)
+        self._update_pool(state, v)
+
+    def _disconnect(self, state: AgentNetwork, u: int, v: int) -> None:
+        self._remember_neighbors(state, u)
+        self._remember_neighbors(state, v)
+        state.remove_edge(u, v)
+        self._update_pool(state, u)
+        self._update_pool(state, v)
+
+    def _remember_neighbors(self, state: AgentNetwork, agent: int) -> None:
+        """Save the agent's neighbors from before the step the first time they change."""
+        if agent not in self._agent_to_previous_neighbors:
+            self._agent_to_previous_neighbors[agent] = set(state.neighbors[agent])
+
+    def _update_pool(self, state: AgentNetwork, agent: int) -> None:
+        """Keep track of the stable agents that are willing to accept new connections."""
+        if self._time_stable[agent] > self._steps_to_stable\
+                and state.degree(agent) < self._upper_bound - 1:
+            self._stable_pool.add(agent)
+        else:
+            self._stable_pool.discard(agent)
 
-    def __call__(self, G: nx.Graph) -> Tuple[nx.Graph, bool]:
-        H: nx.Graph = nx.Graph(G)
-        agents = np.array(H.nodes)
-        self._rand.shuffle(agents)
-        for agent in agents:
-            neighbors = tuple(H[agent])
+    def step(self, state: AgentNetwork) -> bool:
+        """Let every agent act once in a random order. Return True when finished."""
+        self._agent_to_previous_neighbors = {}
+        for agent in self._rand.permutation(state.N).tolist():
             # choose behavior
             if self._time_stable[agent] < self._steps_to_stable:
-                self._unstable_behavior(H, agent, neighbors)
+                self._unstable_behavior(state, agent)
             else:
-                self._stable_behavior(H, agent, neighbors)
+                self._stable_behavior(state, agent)
 
         # Update satisfaction. Agents are satisifed by having consistant neighbors
-        for agent in agents:
-            neighbors = set(H[agent])
-            if self._agent_to_previous_neighbors[agent] == neighbors:
-                self._time_stable[agent] += 1
-            else:
-                self._time_stable[agent] = 0
-            self._agent_to_previous_neighbors[agent] = neighbors
+        changed = [agent for agent, previous in self._agent_to_previous_neighbors.items()
+                   if state.neighbors[agent] != previous]
+        self._time_stable += 1
+        self._time_stable[changed] = 0
+        for agent in it.chain(changed, np.flatnonzero(self._time_stable
+                                                      == self._steps_to_stable + 1).tolist()):
+            self._update_pool(state, agent)
 
         self._steps_taken += 1
-        return H, (self._time_stable > 0).all() and nx.is_connected(H)  # type: ignore
+        return bool((self._time_stable > 0).all()) and state.is_connected()
+
+    def __call__(self, G: nx.Graph) -> Tuple[nx.Graph, bool]:
+        state = AgentNetwork.from_graph(G)
+        finished = self.step(state)
+        return state.to_graph(), finished
 
 
 def connect_agents(G: nx.Graph, u: int, v: int) -> None:
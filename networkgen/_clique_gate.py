@@ -1,8 +1,10 @@
 from fileio import write_network
 from analyzer import visualize_network
 import networkx as nx
-from typing import List, Tuple
+from typing import Tuple
+import numpy as np
 from customtypes import Communities
+from network import Network
 import sys
 
 
@@ -28,18 +30,6 @@ def cgg_entry_point():
     visualize_network(G, layout, name+' partitioned')
 
 
-def union_components(components: List[nx.Graph]) -> nx.Graph:
-    """
-    :param components: If the node id's are not unique, some nodes will get overwritten
-    :return: the union of components
-    """
-    master_graph = nx.Graph()
-    for comp in components:
-        master_graph.add_nodes_from(comp.nodes())
-        master_graph.add_edges_from(comp.edges())
-    return master_graph
-
-
 def make_complete_clique_gate_network(num_big_components: int,
                                       big_component_size: int,
                                       gate_size: int) -> Tuple[nx.Graph, Communities]:
@@ -48,39 +38,71 @@ def make_complete_clique_gate_network(num_big_components: int,
     that connect them are smaller cliques (gates). Half the nodes in the gate have an edge into
     one clique and the other half are connected to the other clique.
     """
-    # this splits up the list of valid ids into sublists the same size as gate_size
-    gate_node_ids = [range(start, start+gate_size)
-                     for start in range(0, sum(range(num_big_components))*gate_size, gate_size)]
-    gates = [nx.complete_graph(node_ids) for node_ids in gate_node_ids]
-    # start numbering the nodes in the big componenets at the first int not used by the gates
-    component_node_ids = (range(start, start+big_component_size)
-                          for start in range(len(gate_node_ids)*gate_size,
-                                             len(gate_node_ids)*gate_size
-                                             + num_big_components*big_component_size,
-                                             big_component_size))
-    big_comps = [nx.complete_graph(node_ids) for node_ids in component_node_ids]
-
-    # put the disparate components into the same network
-    master_graph = union_components(gates + big_comps)  # type: ignore
-
-    # insert gates in between components
-    current_gate_ind = 0
-    for comp_ind, src_comp in enumerate(big_comps[:-1]):
-        for dest_comp in big_comps[comp_ind+1:]:
-            gate_nodes = list(gates[current_gate_ind].nodes())  # type: ignore
-            current_gate_ind += 1
-            # Add edges to src_comp.
-            # The loop assumes that there are fewer or equal nodes in half
-            # the gate than in each component
-            src_nodes = list(src_comp.nodes())  # type: ignore
-            for i, node in enumerate(gate_nodes[:len(gate_nodes)//2]):
-                master_graph.add_edge(node, src_nodes[i])
-            # add edges to dest_cold_read_network_fileomp
-            dest_nodes = list(dest_comp.nodes())  # type: ignore
-            for i, node in enumerate(gate_nodes[len(gate_nodes)//2:]):
-                master_graph.add_edge(node, dest_nodes[i])
-
-    node_to_community_id = {node: comm_id
-                            for comm_id, sub_graph in enumerate(gates+big_comps)
-                            for node in sub_graph}
+    edges, communities = make_clique_gate_edges(num_big_components, big_component_size,
+                                                gate_size)
+    master_graph: nx.Graph = nx.empty_graph(len(communities))  # type: ignore
+    master_graph.add_edges_from(edges.tolist())
+    node_to_community_id = dict(enumerate(communities.tolist()))
     return master_graph, node_to_community_id
+
+
+def make_clique_gate_network(num_big_components: int,
+                             big_component_size: int,
+                             gate_size: int) -> Network:
+    """Return the clique-gate network from make_complete_clique_gate_network as a Network."""
+    edges, communities = make_clique_gate_edges(num_big_components, big_component_size,
+                                                gate_size)
+    return Network.from_edges(len(communities), edges, communities=communities)
+
+
+def make_clique_gate_edges(num_big_components: int,
+                           big_component_size: int,
+                           gate_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return an (E, 2) array of the edges of a clique-gate network and an array of the
+    community of each node.
+
+    The gates come first: gate i has the IDs [i*gate_size, (i+1)*gate_size) and is
+    community i. The big components follow and are numbered after the gates. Gates
+    connect the big components in the order of itertools.combinations. The first half
+    of a gate's nodes each have an edge to a different node of the first component and
+    the second half do the same with the second component, so neither half of a gate can
+    be bigger than a component.
+    """
+    if min(num_big_components, big_component_size, gate_size) < 0:
+        raise ValueError('The number and sizes of the components and gates must be non-negative.')
+    if num_big_components > 1 and gate_size - gate_size//2 > big_component_size:
+        raise ValueError(f'Half of a gate has {gate_size - gate_size//2} nodes, which is more '
+                         f'than the {big_component_size} nodes in each big component.')
+    num_gates = num_big_components * (num_big_components - 1) // 2
+    N = num_gates*gate_size + num_big_components*big_component_size
+    # large families of cliques have a lot of edges, so use the smallest int that works
+    dtype = np.int32 if N < 2**31 else np.int64
+    gate_starts = np.arange(num_gates, dtype=dtype) * gate_size
+    component_starts = num_gates*gate_size\
+        + np.arange(num_big_components, dtype=dtype)*big_component_size
+
+    # every clique is a copy of the same block of edges shifted to start at its first node
+    gate_edges = _make_clique_edges(gate_starts, gate_size)
+    component_edges = _make_clique_edges(component_starts, big_component_size)
+
+    src_comps, dest_comps = np.triu_indices(num_big_components, k=1)
+    half = gate_size // 2
+    src_offsets = np.arange(half, dtype=dtype)
+    dest_offsets = np.arange(gate_size - half, dtype=dtype)
+    src_edges = np.stack(((gate_starts[:, None] + src_offsets).ravel(),
+                          (component_starts[src_comps, None] + src_offsets).ravel()), axis=1)
+    dest_edges = np.stack(((gate_starts[:, None] + half + dest_offsets).ravel(),
+                           (component_starts[dest_comps, None] + dest_offsets).ravel()), axis=1)
+
+    communities = np.concatenate((np.repeat(np.arange(num_gates), gate_size),
+                                  np.repeat(np.arange(num_gates, num_gates+num_big_components),
+                                            big_component_size)))
+    edges = np.concatenate((gate_edges, component_edges, src_edges, dest_edges))
+    return edges, communities
+
+
+def _make_clique_edges(starts: np.ndarray, size: int) -> np.ndarray:
+    """Return the edges of the cliques of the given size that start at each of starts."""
+    block = np.stack(np.triu_indices(size, k=1), axis=1).astype(starts.dtype)
+    return (starts[:, None, None] + block[None, :, :]).reshape(-1, 2)
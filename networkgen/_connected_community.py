@@ -1,5 +1,7 @@
-from customtypes import Communities, Layout
+from customtypes import Layout
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
 from fileio import write_network
 from analysis import visualize_network
 from typing import Optional
@@ -44,59 +46,65 @@ def make_connected_community_network(inner_degrees: np.ndarray,
     The number of vertices in each community is determined by the length of inner_degrees.
     Similarly, the number of communities is determined by the length of outer_degrees.
 
+    Each community is a configuration network. The communities are placed along the
+    diagonal of the adjacency matrix by offsetting their edge arrays, so no dense
+    matrix is ever built. Self loops and duplicate edges are removed.
+
     inner_degrees: the inner degree of each of the vertices in the communities.
     outer_degrees: How many outgoing edges each of the communities has.
-    return: A network and dictionary of node to community or None on time out.
+    return: A network with its communities or None on time out.
     """
-    node_to_community = {}
     num_communities = len(outer_degrees)
     community_size = len(inner_degrees)
     N = community_size * num_communities
+    node_to_community = np.repeat(np.arange(num_communities), community_size)
     for _ in range(max_tries):
-        M = np.zeros((N, N), dtype=np.uint8)
-        node_to_community: Communities = {}
-
-        for community_id in range(num_communities):
-            c_offset = community_id * community_size
-            comm_M = make_configuration_network(inner_degrees, rng)
-            for n1 in range(community_size):
-                for n2 in range(community_size):
-                    M[n1 + c_offset, n2 + c_offset] = comm_M[n1, n2]
-                    node_to_community[n1+c_offset] = community_id
-                    node_to_community[n2+c_offset] = community_id
-
-        outer_m = make_configuration_network(outer_degrees, rng)
-        for c1 in range(num_communities):
-            for c2 in range(c1, num_communities):
-                if outer_m[c1, c2] > 0:
-                    for _ in range(int(outer_m[c1, c2])):
-                        n1 = c1 * community_size + rng.integers(community_size)
-                        n2 = c2 * community_size + rng.integers(community_size)
-                        M[n1, n2] = 1
-                        M[n2, n1] = 1
-
-        G = nx.Graph(M)
-        if allow_disconnected or nx.is_connected(G):
-            G.remove_edges_from(nx.selfloop_edges(G))
-            return Network(G, communities=node_to_community)
+        inner_edges = [make_configuration_edges(inner_degrees, rng) + community_id*community_size
+                       for community_id in range(num_communities)]
+
+        # each edge between communities goes between random members of those communities
+        community_edges = make_configuration_edges(outer_degrees, rng)
+        outer_edges = community_edges * community_size\
+            + rng.integers(community_size, size=community_edges.shape)
+
+        edges = np.concatenate(inner_edges + [outer_edges])
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        A = sp.coo_matrix((np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])),
+                          shape=(N, N))
+        if allow_disconnected or connected_components(A, directed=False)[0] == 1:
+            return Network.from_edges(N, edges, communities=node_to_community)
 
     return None
 
 
 def make_configuration_network(degree_distribution: np.ndarray, rand) -> np.ndarray:
-    """Create a random network with the provided degree distribution."""
-    degree_distribution = np.copy(degree_distribution)
+    """
+    Create a random network with the provided degree distribution.
 
-    N = degree_distribution.shape[0]
+    return: An adjacency matrix where each entry is the number of edges between the two
+            nodes. Self loops add 2 to the diagonal.
+    """
+    N = len(degree_distribution)
+    edges = make_configuration_edges(degree_distribution, rand)
     M = np.zeros((N, N), dtype=np.uint8)
+    np.add.at(M, (edges[:, 0], edges[:, 1]), 1)
+    np.add.at(M, (edges[:, 1], edges[:, 0]), 1)
+    return M
 
-    while np.sum(degree_distribution > 0):
-        a = rand.choice(np.where(degree_distribution > 0)[0])
-        degree_distribution[a] -= 1
-        b = rand.choice(np.where(degree_distribution > 0)[0])
-        degree_distribution[b] -= 1
 
-        M[a, b] += 1
-        M[b, a] += 1
+def make_configuration_edges(degree_distribution: np.ndarray, rand) -> np.ndarray:
+    """
+    Create the edges of a random network with the provided degree distribution.
 
-    return M
+    Every node gets one stub per degree. The stubs are shuffled once and consecutive
+    pairs become edges.
+
+    return: (E, 2) array of edges. It may contain self loops and duplicate edges.
+    """
+    degree_distribution = np.asarray(degree_distribution)
+    if np.sum(degree_distribution) % 2 != 0:
+        raise ValueError('The sum of degrees must be even.')
+    stubs = np.repeat(np.arange(len(degree_distribution)), degree_distribution)
+    rand.shuffle(stubs)
+    return stubs.reshape(-1, 2)
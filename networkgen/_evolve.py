@@ -1,7 +1,8 @@
 import sys
 sys.path.append('')
 from typing import Sequence, Tuple
-from networkgen import make_affiliation_network
+from networkgen import (make_affiliation_network, make_affiliation_adjacency,
+                        calc_sparse_clustering_and_edge_density)
 import krug.ga as ga
 import encoding_lib as lib
 from tqdm import tqdm
@@ -9,7 +10,6 @@ import matplotlib.pyplot as plt
 from network import Network
 import numpy as np
 from scipy.stats import entropy
-import networkx as nx
 import itertools as it
 from multiprocessing import Pool
 
@@ -24,12 +24,17 @@ def evolve_affiliation_network(N: int, target_edge_density: float,
 
     # objects and such for optimization
     rng = np.random.default_rng(501)
-    objective = AffiliationObjective(N, target_edge_density, target_clustering_coefficient,
-                                     n_trials, rng)
+    affiliation_objective = AffiliationObjective(N, target_edge_density,
+                                                 target_clustering_coefficient, n_trials, rng)
+    # Every genotype is measured on the same seeds, so a genotype that survives
+    # into the next generation doesn't need any new trials.
+    objective = lib.CachedNoisyObjective(affiliation_objective.sample,
+                                         affiliation_objective.combine,
+                                         rng.integers(2**32, size=n_trials),
+                                         num_processes=4)
     next_gen = NextGenGroupMemberships(rng, .01)
-    optimizer = ga.GAOptimizer(objective, next_gen,
-                               new_membership_population(n_groups, pop_size, rng),
-                               False, 4)
+    optimizer = lib.PopulationGAOptimizer(objective, next_gen,
+                                          new_membership_population(n_groups, pop_size, rng))
 
     # optimization loop
     pbar = tqdm(range(n_steps))
@@ -45,7 +50,8 @@ def evolve_affiliation_network(N: int, target_edge_density: float,
         diversities[step] = lib.calc_float_pop_diversity(cost_to_encoding)
         pbar.set_description(f'Cost: {local_best[0]:.3f} Diversity: {diversities[step]:.3f}')
         # pbar.set_description(f'Cost: {local_best[0]:.3f}')
-    print(f'Total cache hits: {optimizer.num_cache_hits}')
+    objective.close()
+    print(objective.cache)
 
     # show cost and diversity over time
     print(global_best[1])
@@ -69,7 +75,6 @@ class AffiliationObjective:
         Networks with N nodes and compare those to the provided targets.
         """
         self._N = N
-        self._max_E = (N**2 - N) // 2  # max possible edges
         self._target_edge_density = target_edge_density
         self._target_clustering_coefficient = target_clustering_coefficient
         self._n_trials = n_trials
@@ -86,17 +91,34 @@ class AffiliationObjective:
         edge_densities = np.zeros(self._n_trials)
         clustering_coeffs = np.zeros(self._n_trials)
         for trial in range(self._n_trials):
-            net: Network = make_affiliation_network(group_to_membership_percentage,  # type: ignore
-                                                    self._N, self._rng)
-            edge_densities[trial] = net.E / self._max_E
-            clustering_coeffs[trial] = nx.average_clustering(net.G)
+            A = make_affiliation_adjacency(group_to_membership_percentage, self._N, self._rng)
+            clustering_coeffs[trial], edge_densities[trial] = \
+                calc_sparse_clustering_and_edge_density(A)
 
+        return (self._cost(edge_densities, clustering_coeffs),
+                edge_densities, clustering_coeffs)
+
+    def sample(self, group_to_membership_percentage: np.ndarray,
+               seed: int) -> Tuple[float, float]:
+        """
+        Return the edge density and clustering coefficient of a single Network
+        made using seed. The same encoding and seed always give the same result.
+        """
+        A = make_affiliation_adjacency(group_to_membership_percentage, self._N,
+                                       np.random.default_rng(seed))
+        clustering, edge_density = calc_sparse_clustering_and_edge_density(A)
+        return edge_density, clustering
+
+    def combine(self, samples: Sequence[Tuple[float, float]]) -> float:
+        """Turn the results of sample into a cost."""
+        edge_densities, clustering_coeffs = np.array(samples).T
+        return self._cost(edge_densities, clustering_coeffs)
+
+    def _cost(self, edge_densities: np.ndarray, clustering_coeffs: np.ndarray) -> float:
         avg_edge_density = np.average(edge_densities)
         avg_cc = np.average(clustering_coeffs)
-
-        return ((np.abs(avg_edge_density - self._target_edge_density)
-                + np.abs(avg_cc - self._target_clustering_coefficient)),
-                edge_densities, clustering_coeffs)
+        return (np.abs(avg_edge_density - self._target_edge_density)
+                + np.abs(avg_cc - self._target_clustering_coefficient))
 
 
 class NextGenGroupMemberships:
@@ -110,15 +132,12 @@ class NextGenGroupMemberships:
         couples = ga.roulette_wheel_rank_selection(rated_pop, self._rng)
         children = tuple(it.chain(*(ga.single_point_crossover(*couple)
                                     for couple in couples)))
-        do_mutation = self._rng.integers(0, 2, len(children)*len(children[0]))
         # mutation
-        for i, j in it.product(range(len(children)), range(len(children[0]))):
-            if do_mutation[i*len(children)+j] < 0:
-                children[i][j] += self._mutation_amount * self._rng.choice((-1, 1))
+        children = lib.step_mutation(children, self._mutation_prob,
+                                     self._mutation_amount, self._rng)
 
         # make sure there are no out of bounds values
-        for child in children:
-            np.clip(child, 0, 1, child)
+        np.clip(children, 0, 1, children)
         return children
 
 
@@ -3,7 +3,8 @@ sys.path.append('')
 from customtypes import Layout
 from network import Network
 import numpy as np
-from typing import Dict, Tuple
+from scipy.spatial import cKDTree
+from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
 
 
@@ -22,35 +23,71 @@ class SpatialConfiguration:
     def N(self) -> int:
         return len(self.agent_location_to_id)
 
+    @property
+    def locations(self) -> np.ndarray:
+        """An (N, 2) array where row i is the location of agent i."""
+        locations = np.zeros((self.N, 2))
+        for location, agent_id in self.agent_location_to_id.items():
+            locations[agent_id] = location
+        return locations
+
 
 class MakeLazySpatialNetwork:
-    def __init__(self, config: SpatialConfiguration) -> None:
-        """Can be called with different reaches to make the corresponding spatial network."""
-        self._dm, self._layout = self._init_dist_matrix(config)
+    def __init__(self, config: SpatialConfiguration, max_reach: Optional[float] = None) -> None:
+        """
+        Can be called with different reaches to make the corresponding spatial network.
+
+        Agents are connected when they are closer than the reach. The pairs of agents within
+        some reach are found with a KD-tree and sorted by distance, so the network for any
+        smaller reach is just a prefix of that list. When a larger reach is requested, the
+        list is rebuilt for at least double the previous reach.
+
+        max_reach: If the largest reach that will be used is known, pass it here so the
+                   pairs only need to be found once.
+        """
+        self._locations = config.locations
+        self._tree = cKDTree(self._locations)
         self._N = config.N
-        self._radius_to_network: Dict[int, Network] = {}
+        self._layout = self._init_layout(config)
+        self._pair_reach = 0.0
+        self._pairs = np.zeros((0, 2), dtype=np.int64)
+        self._pair_distances = np.zeros(0)
+        if max_reach is not None:
+            self._find_pairs(max_reach)
+        self._radius_to_network: Dict[float, Network] = {}
 
-    def __call__(self, agent_reach: int) -> Network:
+    def __call__(self, agent_reach: float) -> Network:
         if agent_reach not in self._radius_to_network:
             self._radius_to_network[agent_reach] = self._make_network_with_reach(agent_reach)
         return self._radius_to_network[agent_reach]
 
     @staticmethod
-    def _init_dist_matrix(config: SpatialConfiguration)\
-            -> Tuple[np.ndarray, Layout]:
+    def _init_layout(config: SpatialConfiguration) -> Layout:
         grid_shape = config.grid.shape
-        distance_matrix = np.zeros(config.grid.shape)
-        for (i, j), agent_id in config.agent_location_to_id.items():
-            for (x, y), other_id in config.agent_location_to_id.items():
-                distance_matrix[agent_id, other_id] = _distance(i, j, x, y)
-
         layout = {id_: (2*x/grid_shape[0]-1, 2*y/grid_shape[1]-1)
                   for (x, y), id_ in config.agent_location_to_id.items()}
-        return distance_matrix, layout
+        return layout
 
-    def _make_network_with_reach(self, agent_reach: int) -> Network:
-        M = np.where(self._dm < agent_reach, 1, 0)
-        return Network(M, layout=self._layout)
+    def _find_pairs(self, reach: float) -> None:
+        """Find every pair of agents within reach of each other and sort them by distance."""
+        pairs = self._tree.query_pairs(reach, output_type='ndarray')
+        distances = np.linalg.norm(self._locations[pairs[:, 0]] - self._locations[pairs[:, 1]],
+                                   axis=1)
+        order = np.argsort(distances, kind='stable')
+        self._pairs = pairs[order]
+        self._pair_distances = distances[order]
+        self._pair_reach = reach
+
+    def edges_with_reach(self, agent_reach: float) -> np.ndarray:
+        """Return an (E, 2) array of the pairs of agents closer than agent_reach."""
+        if agent_reach > self._pair_reach:
+            self._find_pairs(max(agent_reach, 2*self._pair_reach))
+        n_edges = np.searchsorted(self._pair_distances, agent_reach, side='left')
+        return self._pairs[:n_edges]
+
+    def _make_network_with_reach(self, agent_reach: float) -> Network:
+        return Network.from_edges(self._N, self.edges_with_reach(agent_reach),
+                                  layout=self._layout)
 
 
 def make_random_spatial_configuration(grid_shape: Tuple[int, int], N: int, rng)\
@@ -58,19 +95,12 @@ def make_random_spatial_configuration(grid_shape: Tuple[int, int], N: int, rng)\
     """
     Randomly populate an AgentGrid with N agents and the given shape using the
     provided RandomGenerator.
+
+    All the locations are drawn at once without replacement, so no two agents share a cell.
     """
     grid = np.zeros(grid_shape, dtype=np.uint8)
-    loc_to_id = {}
-    current_id = 0
-    for _ in range(N):
-        coord = tuple(rng.integers(N, size=2))
-        while grid[coord] > 0:
-            coord = tuple(rng.integers(N, size=2))
-        grid[coord] = 1
-        loc_to_id[coord] = current_id
-        current_id += 1
+    flat_locations = rng.choice(grid.size, N, replace=False)
+    grid.flat[flat_locations] = 1
+    xs, ys = np.unravel_index(flat_locations, grid_shape)
+    loc_to_id = {(x, y): agent_id for agent_id, (x, y) in enumerate(zip(xs.tolist(), ys.tolist()))}
     return SpatialConfiguration(grid, loc_to_id)
-
-
-def _distance(x0: int, y0: int, x1: int, y1: int) -> float:
-    return np.sqrt((x0-x1)**2 + (y0-y1)**2)
@@ -1,15 +1,15 @@
 import sys
 sys.path.append('')
 from matplotlib import pyplot as plt
-from collections import defaultdict
-from typing import Tuple
+from typing import List, Tuple
 from sympy.core.function import diff
 from sympy.core.symbol import Symbol
 import numpy as np
+import scipy.sparse as sp
 from network import Network
+from networkgen._affiliation_network import network_from_adjacency, project_incidence
 import fileio as fio
 import networkx as nx
-import itertools as it
 from sympy import Expr
 from tqdm import tqdm
 import time
@@ -30,42 +30,61 @@ def make_affiliation_network(f_coeffs: np.ndarray, g_coeffs: np.ndarray,
     while np.sum(agent_stubs) != np.sum(group_stubs) and timeout > 0:
         stub_count_to_replace = pre_calculed_indices[timeout-1]
         if stub_count_to_replace < N:
-            agent_stubs[stub_count_to_replace] = rng.choice(len(f_coeffs), 1, p=f_coeffs)
+            agent_stubs[stub_count_to_replace] = rng.choice(len(f_coeffs), p=f_coeffs)
         else:
-            group_stubs[stub_count_to_replace-N] = rng.choice(len(g_coeffs), 1, p=g_coeffs)
+            group_stubs[stub_count_to_replace-N] = rng.choice(len(g_coeffs), p=g_coeffs)
         timeout -= 1
 
-    group_membership = defaultdict(lambda: set())
-    # Assign agents to groups
-    # This assumes that agents can be assigned to the same group multiple times, but only
-    # one edge will appear
-    agents_with_stubs = np.nonzero(agent_stubs)[0]
-    groups_with_stubs = np.nonzero(group_stubs)[0]
-    while len(agents_with_stubs) > 0 and len(groups_with_stubs) > 0:
-        agent = rng.choice(agents_with_stubs)
-        group = rng.choice(groups_with_stubs)
-        group_membership[group].add(agent)
-        agent_stubs[agent] -= 1
-        group_stubs[group] -= 1
-        agents_with_stubs = np.nonzero(agent_stubs)[0]
-        groups_with_stubs = np.nonzero(group_stubs)[0]
-
-    # for agent_id, n_stubs in enumerate(agent_stubs):
-    #     if len(np.nonzero(group_stubs)[0]) == 0:
-    #         break
-    #     for _ in range(n_stubs):
-    #         possible_groups = np.nonzero(group_stubs)[0]
-    #         if len(possible_groups) == 0:
-    #             break
-    #         group = rng.choice(possible_groups)
-    #         group_membership[group].add(agent_id)
-    #         group_stubs[group] -= 1
-
-    edges = it.chain.from_iterable(it.combinations(agents, 2)
-                                   for agents in group_membership.values())
-    G: nx.Graph = nx.empty_graph(N)
-    G.add_edges_from(edges)
-    return Network(G)
+    # Assign agents to groups. This assumes that agents can be assigned to the same group
+    # multiple times, but only one edge will appear
+    agents, groups = match_stubs(agent_stubs, group_stubs, rng)
+    B = sp.coo_matrix((np.ones(len(agents), dtype=np.int64), (agents, groups)),
+                      shape=(N, M))
+    return network_from_adjacency(project_incidence(B))
+
+
+def match_stubs(agent_stubs: np.ndarray, group_stubs: np.ndarray,
+                rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pair up agent stubs with group stubs until one side runs out. Each membership goes
+    to an agent chosen uniformly from the agents that have stubs left and a group chosen
+    uniformly from the groups that have stubs left, so an agent with many stubs is not
+    picked more often than one with a single stub.
+
+    The agents and groups with stubs left are kept in arrays where a finished one is
+    swapped with the last active one, so each pick takes O(1) time instead of searching
+    for the nonzero counts again.
+
+    return: The agent and the group of each membership.
+    """
+    n_memberships = min(np.sum(agent_stubs), np.sum(group_stubs))
+    agents = np.empty(n_memberships, dtype=np.int64)
+    groups = np.empty(n_memberships, dtype=np.int64)
+    agent_uniforms = rng.random(n_memberships)
+    group_uniforms = rng.random(n_memberships)
+    active_agents, agent_counts = _active_stubs(agent_stubs)
+    active_groups, group_counts = _active_stubs(group_stubs)
+    n_agents, n_groups = len(active_agents), len(active_groups)
+    for i in range(n_memberships):
+        a = int(agent_uniforms[i]*n_agents)
+        g = int(group_uniforms[i]*n_groups)
+        agents[i] = active_agents[a]
+        groups[i] = active_groups[g]
+        agent_counts[a] -= 1
+        if agent_counts[a] == 0:
+            n_agents -= 1
+            active_agents[a], agent_counts[a] = active_agents[n_agents], agent_counts[n_agents]
+        group_counts[g] -= 1
+        if group_counts[g] == 0:
+            n_groups -= 1
+            active_groups[g], group_counts[g] = active_groups[n_groups], group_counts[n_groups]
+    return agents, groups
+
+
+def _active_stubs(stubs: np.ndarray) -> Tuple[List[int], List[int]]:
+    """Return the indices with stubs and how many stubs each has as lists."""
+    active = np.flatnonzero(stubs)
+    return active.tolist(), stubs[active].tolist()
 
 
 def coeffs_to_expr(coeffs: np.ndarray, var: Symbol) -> Expr:
@@ -6,12 +6,12 @@ from dataclasses import dataclass
 from customtypes import Number, NodeColors
 import time
 from analysis import visualize_network
-from scipy.sparse import dok_matrix
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
 import networkx as nx
 from partitioning import fluidc_partition
-from tqdm import tqdm
-import itertools as it
 RAND = np.random.default_rng()
 
 
@@ -63,54 +63,36 @@ def make_social_circles_network(agent_type_to_quantity: Dict[Agent, int],
                                 max_tries: int = 5,
                                 rand=RAND)\
         -> Optional[Tuple[Network, NodeColors]]:
-    """Return a social circles network or None on timeout."""
+    """
+    Return a social circles network or None on timeout.
+
+    Agents are placed on distinct random cells of a grid that wraps around at the edges.
+    Two agents are connected when they are within the smaller of their reaches. Agents
+    get IDs in order of decreasing reach, and the colors are in ID order.
+    """
+    # place the agents with the largest reach first
+    agents = sorted(agent_type_to_quantity.items(),
+                    key=lambda agent_quantity: agent_quantity[0].reach,
+                    reverse=True)
+    num_nodes = sum(agent_type_to_quantity.values())
+    reaches = np.concatenate([np.full(quantity, agent.reach, dtype=float)
+                              for agent, quantity in agents])
+    colors = [agent.color for agent, quantity in agents for _ in range(quantity)]
     for attempt in range(max_tries):
-        agents = sorted(agent_type_to_quantity.items(),
-                        key=lambda agent_quantity: agent_quantity[0].reach,
-                        reverse=True)
-        try:
-            grid = np.zeros(grid_size, dtype='uint8')
-        except MemoryError:
-            print('Warning: Not enough memory. Switching to dok_matrix.', file=sys.stderr)
-            grid = dok_matrix(grid_size, dtype='uint8')
-        num_nodes = sum(agent_type_to_quantity.values())
-        M = np.zeros((num_nodes, num_nodes), dtype='uint8')
-        # place the agents with the largest reach first
-        loc_to_id = {}
-        current_id = 0
-        for agent, quantity in agents:
-            new_agents = []
-            if verbose:
-                print(f'Placing agents with reach {agent.reach}.')
-                range_quantity = tqdm(range(quantity))
-            else:
-                range_quantity = range(quantity)
-            for _ in range_quantity:
-                x, y = choose_empty_spot(grid, rand)
-                grid[x, y] = agent.reach
-                new_agents.append((x, y))
-                loc_to_id[(x, y)] = current_id
-                current_id += 1
-            if verbose:
-                new_agents = tqdm(new_agents)
-                print('Connecting agents.')
-            for x, y in new_agents:
-                neighbors = search_for_neighbors(grid, x, y)
-                for i, j in neighbors:
-                    M[loc_to_id[(x, y)], loc_to_id[(i, j)]] = 1
-                    M[loc_to_id[(i, j)], loc_to_id[(x, y)]] = 1
-
-        colors = []
-        for agent, quantity in agent_type_to_quantity.items():
-            colors += [agent.color]*quantity
+        locations = choose_empty_spots(grid_size, num_nodes, rand)
+        if verbose:
+            print('Connecting agents.')
+        edges = find_social_circles_edges(locations, reaches, grid_size)
+
         layout = {id_: (2*x/grid_size[0]-1, 2*y/grid_size[1]-1)
-                  for (x, y), id_ in loc_to_id.items()}
-        G = nx.Graph(M)
+                  for id_, (x, y) in enumerate(locations.tolist())}
+        A = sp.coo_matrix((np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])),
+                          shape=(num_nodes, num_nodes))
         # return the generated network if it is connected or if we don't care
-        if (not none_on_disconnected) or nx.is_connected(G):
+        if (not none_on_disconnected) or connected_components(A, directed=False)[0] == 1:
             if verbose:
                 print(f'Success after {attempt+1} tries.')
-            return Network(G, layout=layout), colors
+            return Network.from_edges(num_nodes, edges, layout=layout), colors
         elif verbose:
             print(f'Finished {attempt+1} tries.')
 
@@ -118,37 +100,35 @@ def make_social_circles_network(agent_type_to_quantity: Dict[Agent, int],
     return None
 
 
-def choose_empty_spot(grid, rand) -> Tuple[int, int]:
-    x, y = rand.integers(grid.shape[0]), rand.integers(grid.shape[1])
-    while grid[x, y] > 0:
-        x, y = rand.integers(grid.shape[0]), rand.integers(grid.shape[1])
-    return x, y
-
-
-def search_for_neighbors(grid, x, y):
-    reach = grid[x, y]
-    # The connections on the grid need to wrap around,
-    # so we mod the values by the grid  dims
-    min_x = (x-reach) % grid.shape[0]
-    max_x = (x+reach) % grid.shape[0]
-    min_y = (y-reach) % grid.shape[1]
-    max_y = (y+reach) % grid.shape[1]
-    # Because the values got modded, the mins might actually be higher than the maxes,
-    # so we reassign the values here to make sure that the values are properly labeled
-    min_x, max_x = sorted((min_x, max_x))
-    min_y, max_y = sorted((min_y, max_y))
-
-    neighbors = {(i, j)
-                 for (i, j) in it.product(range(min_x, max_x),
-                                          range(min_y, max_y))
-                 if all((grid[i, j] > 0,
-                         distance(x, y, i, j) <= reach,
-                         (x, y) != (i, j)))}
-    return neighbors
-
-
-def distance(x0, y0, x1, y1) -> float:
-    return np.sqrt((x0-x1)**2 + (y0-y1)**2)
+def choose_empty_spots(grid_size: Tuple[int, int], num_spots: int, rand) -> np.ndarray:
+    """
+    Return a (num_spots, 2) array of distinct grid cells.
+
+    The cells are sampled without replacement, so the time this takes depends on
+    num_spots rather than the area of the grid.
+    """
+    flat_spots = rand.choice(grid_size[0]*grid_size[1], num_spots, replace=False)
+    return np.stack(np.unravel_index(flat_spots, grid_size), axis=1)
+
+
+def find_social_circles_edges(locations: np.ndarray, reaches: np.ndarray,
+                              grid_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Return an (E, 2) array of the pairs of agents within the smaller of their reaches.
+
+    Distances wrap around the edges of the grid. The agents must be sorted by decreasing
+    reach. Agents with the same reach are handled in one batch: the agents placed so far
+    are put in a periodic KD-tree, and only pairs involving an agent from the newest
+    batch are kept because the other pairs were found with a larger reach.
+    """
+    reach_values, batch_starts = np.unique(-reaches, return_index=True)
+    batch_ends = np.append(batch_starts[1:], len(reaches))
+    all_edges = []
+    for reach, start, end in zip(-reach_values, batch_starts, batch_ends):
+        tree = cKDTree(locations[:end], boxsize=grid_size)
+        pairs = tree.query_pairs(reach, output_type='ndarray')
+        all_edges.append(pairs[np.max(pairs, axis=1) >= start])
+    return np.concatenate(all_edges).reshape(-1, 2)
 
 
 if __name__ == '__main__':
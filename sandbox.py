@@ -9,7 +9,7 @@ import networkx as nx
 # from mpl_toolkits import mplot3d
 from matplotlib import pyplot as plt
 import socialgood as sg
-import analyzer
+import analysis
 from network import Network
 from scipy.stats import wasserstein_distance
 import behavior
@@ -97,7 +97,7 @@ def social_good_giant_component_barabasi_albert():
         g = nx.barabasi_albert_graph(100, i)
         social_good = sg.rate_social_good(g)
         social_goods.append(social_good)
-        giant_comp_size = analyzer.get_giant_component_size(g, 0.9, 10)
+        giant_comp_size = analysis.get_giant_component_size(g, 0.9, 10)
         giant_comp_sizes.append(giant_comp_size / 100)
     plt.xlabel('Number of Edges')
     plt.ylabel('Social Good')
@@ -121,7 +121,7 @@ def social_good_giant_component_watts_strogatz():
             g = nx.watts_strogatz_graph(num_nodes, k, p)
             social_good = sg.rate_social_good(g)
             social_goods.append((k, p, social_good))
-            giant_comp_size = analyzer.get_giant_component_size(g, 0.95, 100)
+            giant_comp_size = analysis.get_giant_component_size(g, 0.95, 100)
             giant_comp_sizes.append((k, p, giant_comp_size / num_nodes))
 
     plt.figure()
@@ -169,7 +169,7 @@ def social_good_giant_component_connected_community():
                 g, _ = cc.make_connected_community_network(inner_degrees, outer_degrees, RAND)
                 social_good = sg.rate_social_good(Network(g))
                 social_goods.append((i, j, social_good))
-                giant_comp_size = analyzer.get_giant_component_size(g, 0.75, 10)
+                giant_comp_size = analysis.get_giant_component_size(g, 0.75, 10)
                 giant_comp_sizes.append((i, j, giant_comp_size / num_nodes))
 
     plt.figure()
@@ -211,6 +211,17 @@ def pressure_decay_test():
              behavior.PressureDecayBehavior(net, 3), 200, layout, RNG)
 
 
+def make_survival_trial(net: Network, update_connections) -> Callable[[], float]:
+    """Return a function that simulates one outbreak on net and returns the survival rate."""
+    def run_trial() -> float:
+        return simulate(net.M, sir0=make_starting_sir(net.N, 1, rng=RNG),
+                        disease=Disease(4, 0.3),
+                        update_connections=update_connections,
+                        max_steps=200,
+                        rng=RNG).survival_rate
+    return run_trial
+
+
 def behavior_comparison():
     networks = (
         ('Caveman-50-10', fio.read_network('networks/cavemen-50-10.txt')),
@@ -218,11 +229,12 @@ def behavior_comparison():
         ('CGG-500', fio.read_network('networks/cgg-500.txt'))
     )
 
-    num_sims = 50
+    # Trials are run until the survival rate is known to +/- target_half_width
+    target_half_width = .01
+    max_sims = 1000
     num_behaviors = 3
-    distributions = []
     averages = np.zeros((len(networks), num_behaviors))
-    loop = tqdm(total=len(networks) * num_behaviors * num_sims)
+    loop = tqdm(total=len(networks) * num_behaviors)
     for i, (n_name, net) in enumerate(networks):
 
         behaviors = (
@@ -247,24 +259,23 @@ def behavior_comparison():
         )
 
         for j, (b_name, behavior) in enumerate(behaviors):
-            s_scores = []
-            for _ in range(num_sims):
-                loop.set_description(f'{n_name}, {b_name}')
-                end_sir = simulate(net.M, sir0=make_starting_sir(net.N, 1, rng=RNG),
-                                   disease=Disease(4, 0.3),
-                                   update_connections=behavior,
-                                   max_steps=200,
-                                   rng=RNG)[-1]
-                s_scores.append(np.sum(end_sir[0, :] > 0)/net.N)
-                loop.update()
-            # plt.title(f'{n_name}, {b_name}, Avg: {sum(s_scores)/len(s_scores)}')
-            # plt.hist(s_scores)
+            loop.set_description(f'{n_name}, {b_name}')
+            result = run_adaptive_trials(make_survival_trial(net, behavior),
+                                         target_half_width, max_trials=max_sims)
+            loop.update()
+            print(f'{n_name}, {b_name}: {result.estimate:.3f} +/- {result.ci_half_width:.3f} '
+                  f'({result.n_trials} sims)')
+            # plt.title(f'{n_name}, {b_name}, Avg: {result.estimate}')
+            # plt.hist(result.samples)
             # plt.figure()
-            averages[i, j] = sum(s_scores)/len(s_scores)
-            distributions.append(s_scores)
-    print(wasserstein_distance(distributions[1], distributions[2]))
-    print(wasserstein_distance(distributions[4], distributions[5]))
-    print(wasserstein_distance(distributions[7], distributions[8]))
+            averages[i, j] = result.estimate
+        # compare the two pressure behaviors until their difference is known precisely
+        comparison = run_adaptive_comparison(make_survival_trial(net, behaviors[1][1]),
+                                             make_survival_trial(net, behaviors[2][1]),
+                                             target_half_width, RNG, max_trials=max_sims)
+        print(f'{n_name}, {behaviors[1][0]} vs {behaviors[2][0]}: '
+              f'{comparison.estimate:.3f} +/- {comparison.ci_half_width:.3f} '
+              f'({comparison.n_trials} sims each)')
     # plt.show()
     np.set_printoptions(precision=3, suppress=True)
     print(averages)
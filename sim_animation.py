@@ -0,0 +1,187 @@
+from typing import List, Optional, Sequence, Tuple, Union
+from multiprocessing import Pool
+import os
+import subprocess
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+from customtypes import Layout
+from network_layout import layout_to_array
+
+STATE_TO_COLOR = ('blue', 'green', 'grey')
+
+
+class NetworkAnimator:
+    def __init__(self, layout: Union[Layout, np.ndarray], edges: np.ndarray,
+                 state_to_color: Sequence[str] = STATE_TO_COLOR,
+                 node_size: float = 50,
+                 figsize: Tuple[float, float] = (8, 8),
+                 dpi: int = 100,
+                 fig: Optional[Figure] = None) -> None:
+        """
+        Draws SIR states on a network without redrawing the network every frame.
+
+        The edges are drawn once and saved as a background. Each frame restores the
+        background and only draws the nodes and the title on top of it. The background is
+        redrawn only when the visible edges change.
+
+        layout: The position of each node as a layout or an (N, 2) array. Nodes must be
+                0 to N-1.
+        edges: (E, 2) array of every edge that can be visible.
+        state_to_color: The color of the nodes in each state.
+        fig: The figure to draw on. If None, a figure that is never shown is made and
+             render can be used. If a figure is provided, it is drawn normally instead.
+        """
+        self._blit = fig is None
+        if fig is None:
+            fig = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(fig)
+        self.fig = fig
+        self._ax = fig.add_subplot()
+        self._ax.set_axis_off()
+        self._positions = layout_to_array(layout)
+        # All the edges are one line broken up by NaNs and all the nodes in a state are one
+        # line of markers. Agg draws these much faster than a collection of separate paths.
+        segments = self._positions[edges]
+        self._edge_xs = np.stack((segments[:, 0, 0], segments[:, 1, 0],
+                                  np.full(len(edges), np.nan)), axis=1)
+        self._edge_ys = np.stack((segments[:, 0, 1], segments[:, 1, 1],
+                                  np.full(len(edges), np.nan)), axis=1)
+        self._edges, = self._ax.plot(self._edge_xs.ravel(), self._edge_ys.ravel(),
+                                     color='black', linewidth=.5, alpha=.5, zorder=1)
+        self._state_to_nodes = [self._ax.plot([], [], linestyle='none', marker='o',
+                                              markersize=np.sqrt(node_size), color=color,
+                                              markeredgewidth=0, zorder=2,
+                                              animated=self._blit)[0]
+                                for color in state_to_color]
+        self._title = self._ax.set_title('', animated=self._blit)
+        self._ax.update_datalim(self._positions)
+        self._ax.autoscale_view()
+        self._edge_mask: Optional[np.ndarray] = None
+        self._background = None
+
+    def draw(self, sir: np.ndarray, step: int,
+             edge_mask: Optional[np.ndarray] = None) -> None:
+        """
+        Update the figure to show sir.
+
+        sir: An SIR array with shape (3, N) as used by sim_dynamic.simulate.
+        step: The step number to show in the title.
+        edge_mask: Which of the edges are visible. If None, all of them are.
+        """
+        is_in_state = sir > 0
+        node_states = np.argmax(is_in_state, axis=0)
+        for state, nodes in enumerate(self._state_to_nodes):
+            in_state = node_states == state
+            nodes.set_data(self._positions[in_state, 0], self._positions[in_state, 1])
+        if not _masks_equal(edge_mask, self._edge_mask):
+            self._edge_mask = None if edge_mask is None else np.copy(edge_mask)
+            xs = self._edge_xs if edge_mask is None else self._edge_xs[edge_mask]
+            ys = self._edge_ys if edge_mask is None else self._edge_ys[edge_mask]
+            self._edges.set_data(xs.ravel(), ys.ravel())
+            self._background = None
+        counts = np.sum(is_in_state, axis=1)
+        self._title.set_text(f'Step: {step}, S: {counts[0]},'
+                             f'I: {counts[1]}, R: {counts[2]}')
+
+    def render(self) -> np.ndarray:
+        """Return the current frame as an (H, W, 4) RGBA image."""
+        canvas = self.fig.canvas
+        if not self._blit:
+            canvas.draw()
+        else:
+            # animated artists are left out of a full draw, so the background is just edges
+            if self._background is None:
+                canvas.draw()
+                self._background = canvas.copy_from_bbox(self.fig.bbox)  # type: ignore
+            else:
+                canvas.restore_region(self._background)  # type: ignore
+            for artist in self._state_to_nodes + [self._title]:
+                self._ax.draw_artist(artist)
+        return np.asarray(canvas.buffer_rgba())  # type: ignore
+
+
+def _masks_equal(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return np.array_equal(a, b)
+
+
+def save_sir_animation(layout: Union[Layout, np.ndarray], edges: np.ndarray,
+                       sirs: Sequence[np.ndarray], output_name: str, fps: int = 10,
+                       edge_masks: Optional[Sequence[np.ndarray]] = None,
+                       num_processes: int = 1, dpi: int = 100) -> None:
+    """
+    Save an animation of sirs without showing anything on screen.
+
+    output_name: If it ends in .gif, a GIF is written with Pillow. If it has another
+                 extension, such as .mp4, the frames are piped to ffmpeg. If it has no
+                 extension, it is treated as a directory and each frame is saved in it
+                 as a PNG.
+    fps: Frames per second of the GIF or video.
+    edge_masks: For each frame, which of the edges are present.
+    num_processes: The number of processes to render frames with.
+    """
+    extension = os.path.splitext(output_name)[1].lower()
+    if extension == '':
+        os.makedirs(output_name, exist_ok=True)
+    chunks = [chunk.tolist()
+              for chunk in np.array_split(np.arange(len(sirs)), max(1, num_processes))
+              if len(chunk) > 0]
+    # each process gets a contiguous run of frames so that it can reuse its background
+    tasks = [(layout, edges, [sirs[step] for step in chunk],
+              None if edge_masks is None else [edge_masks[step] for step in chunk],
+              chunk, dpi, output_name if extension == '' else None, extension == '.gif')
+             for chunk in chunks]
+    if num_processes > 1 and len(tasks) > 1:
+        with Pool(num_processes) as pool:
+            frames = [frame for chunk_frames in pool.map(_render_frames_wrapper, tasks)
+                      for frame in chunk_frames]
+    else:
+        frames = [frame for task in tasks for frame in _render_frames_wrapper(task)]
+
+    if extension == '.gif':
+        frames[0].save(output_name, save_all=True, append_images=frames[1:],
+                       duration=1000/fps, loop=0)
+    elif extension != '':
+        _encode_video(frames, output_name, fps)
+
+
+def _render_frames_wrapper(args) -> List:
+    """
+    Render a run of frames. Frames are saved as PNGs if a directory is given. Otherwise
+    they are returned as palette images for a GIF or RGB arrays for a video.
+    """
+    layout, edges, sirs, edge_masks, steps, dpi, directory, for_gif = args
+    animator = NetworkAnimator(layout, edges, dpi=dpi)
+    frames = []
+    for i, (step, sir) in enumerate(zip(steps, sirs)):
+        animator.draw(sir, step, None if edge_masks is None else edge_masks[i])
+        rgb = animator.render()[:, :, :3]
+        if directory is not None:
+            Image.fromarray(rgb).save(os.path.join(directory, f'frame-{step:05}.png'),
+                                      compress_level=1)
+        elif for_gif:
+            frames.append(Image.fromarray(rgb).quantize(colors=64,
+                                                        method=Image.Quantize.FASTOCTREE))
+        else:
+            frames.append(np.copy(rgb))
+    return frames
+
+
+def _encode_video(frames: Sequence[np.ndarray], output_name: str, fps: int) -> None:
+    """Pipe raw RGB frames to ffmpeg."""
+    height, width = frames[0].shape[:2]
+    command = [matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+               '-r', str(fps), '-i', '-',
+               # most players need even dimensions for yuv420p
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', output_name]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+        for frame in frames:
+            process.stdin.write(np.ascontiguousarray(frame).tobytes())  # type: ignore
+        process.stdin.close()  # type: ignore
+        if process.wait() != 0:
+            raise RuntimeError(f'ffmpeg failed to write {output_name}')
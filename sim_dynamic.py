@@ -4,9 +4,11 @@ import matplotlib.pyplot as plt
 import networkx as nx
 from networkx.algorithms.distance_measures import diameter
 import numpy as np
+from scipy.stats import norm, wasserstein_distance
 from customtypes import Layout
 from network import Network
 from socialgood import get_distance_matrix
+from sim_animation import NetworkAnimator
 import behavior
 
 
@@ -47,7 +49,7 @@ def simulate(M: np.ndarray,
     N = M.shape[0]
     vis_func = Visualize(layout) if layout is not None else None
     if vis_func is not None:
-        vis_func(nx.Graph(D), sirs[0], 0)
+        vis_func(D, sirs[0], 0)
 
     # Needed data
     num_edges_removed = []
@@ -87,7 +89,7 @@ def simulate(M: np.ndarray,
         sir, states_changed = next_sir(sirs[step - 1], D, disease, rng)
         sirs.append(sir)
         if vis_func is not None:
-            vis_func(nx.Graph(D), sirs[step], step)
+            vis_func(D, sirs[step], step)
 
         # If there aren't any infectious agents, the disease is gone
         # and the simulation is done.
@@ -242,19 +244,16 @@ class Visualize:
         layout: Layout to use. This will not be automatically computed.
         """
         self._layout = layout
-        self._state_to_color = {0: 'blue', 1: 'green', 2: 'grey'}
-
-    def __call__(self, G: nx.Graph, sir: np.ndarray, step) -> None:
-        node_colors = np.empty(len(G), dtype=np.object_)
-        for state in range(sir.shape[0]):
-            for node in range(sir.shape[1]):
-                if sir[state, node] > 0:
-                    node_colors[node] = self._state_to_color[state]
-        plt.clf()
-        nx.draw_networkx(G, pos=self._layout, with_labels=False,
-                         node_color=node_colors, node_size=50)
-        plt.title(f'Step: {step}, S: {np.sum(sir[0, :] > 0)},'
-                  f'I: {np.sum(sir[1, :] > 0)}, R: {np.sum(sir[2, :] > 0)}')
+        self._animator: Optional[NetworkAnimator] = None
+        self._edges = np.zeros((0, 2), dtype=np.int64)
+
+    def __call__(self, D: np.ndarray, sir: np.ndarray, step) -> None:
+        # the network is drawn once using the edges present at the start
+        if self._animator is None:
+            self._edges = np.argwhere(np.triu(D, k=1) > 0)
+            plt.clf()
+            self._animator = NetworkAnimator(self._layout, self._edges, fig=plt.gcf())
+        self._animator.draw(sir, step, D[self._edges[:, 0], self._edges[:, 1]] > 0)
         # plt.show()
         plt.pause(.001)  # type: ignore
 
@@ -274,3 +273,149 @@ def make_starting_sir(N: int, to_infect: Union[int, Tuple[int, ...]], rng) -> np
     sir0[1, to_infect] = 1
     sir0[0, to_infect] = 0
     return sir0
+
+
+@dataclass
+class AdaptiveTrialsResult:
+    """
+    The outcome of running trials until an estimate was precise enough.
+
+    samples: The value returned by each trial that was run.
+    estimate: The final value of the statistic being estimated.
+    ci_half_width: Half the width of the confidence interval around estimate.
+    converged: True iff ci_half_width reached the target before max_trials ran out.
+    """
+    samples: np.ndarray
+    estimate: float
+    ci_half_width: float
+    converged: bool
+
+    @property
+    def n_trials(self) -> int:
+        return len(self.samples)
+
+
+def run_adaptive_trials(run_trial: Callable[[], float],
+                        target_half_width: float,
+                        confidence: float = .95,
+                        min_trials: int = 30,
+                        max_trials: int = 1000,
+                        batch_size: int = 10) -> AdaptiveTrialsResult:
+    """
+    Run trials until the confidence interval around their mean is narrow enough.
+
+    Trials are run in batches of batch_size. After each batch (once at least min_trials
+    have been run), the half width of the normal approximation confidence interval is
+    computed. Trials stop as soon as it is no larger than target_half_width or max_trials
+    have been run.
+
+    run_trial: Run one trial and return its value (e.g. the survival rate of a simulation).
+    target_half_width: The desired precision of the mean. For survival rates .01 means +/- 1%.
+    confidence: The confidence level of the interval.
+    min_trials: At least 2, since the interval needs a sample standard deviation.
+    """
+    _check_trial_bounds(min_trials, max_trials)
+    z = norm.ppf(.5 + confidence/2)
+    samples: List[float] = []
+    half_width = np.inf
+    while len(samples) < max_trials:
+        n_to_run = min(max(batch_size, min_trials - len(samples)), max_trials - len(samples))
+        samples.extend(run_trial() for _ in range(n_to_run))
+        half_width = _calc_half_width(np.array(samples), z)
+        if half_width <= target_half_width:
+            break
+
+    return AdaptiveTrialsResult(np.array(samples), float(np.mean(samples)),
+                                half_width, half_width <= target_half_width)
+
+
+@dataclass
+class AdaptiveComparisonResult:
+    """
+    The outcome of running trials of two configurations until a statistic comparing
+    them was precise enough.
+
+    estimate: The statistic on all the samples of a and b.
+    ci_half_width: Half the width of the bootstrap confidence interval around estimate.
+    converged: True iff ci_half_width reached the target before max_trials ran out.
+    bootstrap_estimates: The statistic on each bootstrap resample from the last batch.
+    a, b: The samples of each configuration, their means and the normal approximation
+          confidence intervals of the means.
+    """
+    estimate: float
+    ci_half_width: float
+    converged: bool
+    bootstrap_estimates: np.ndarray
+    a: AdaptiveTrialsResult
+    b: AdaptiveTrialsResult
+
+    @property
+    def n_trials(self) -> int:
+        """The number of trials run of each configuration."""
+        return self.a.n_trials
+
+
+def run_adaptive_comparison(run_trial_a: Callable[[], float],
+                            run_trial_b: Callable[[], float],
+                            target_half_width: float,
+                            rng,
+                            statistic: Callable[[np.ndarray, np.ndarray], float]
+                            = wasserstein_distance,
+                            confidence: float = .95,
+                            min_trials: int = 30,
+                            max_trials: int = 1000,
+                            batch_size: int = 10,
+                            n_bootstrap: int = 200) -> AdaptiveComparisonResult:
+    """
+    Run trials of two configurations until a distance between their distributions is precise.
+
+    The confidence interval of statistic is estimated by bootstrapping both sets of samples
+    after each batch. The same number of trials is run of each configuration.
+
+    statistic: Compare the two sets of samples. Defaults to the Wasserstein distance.
+    min_trials: At least 2, since the intervals need a sample standard deviation.
+    """
+    _check_trial_bounds(min_trials, max_trials)
+    z = norm.ppf(.5 + confidence/2)
+    alpha = 1 - confidence
+    samples_a: List[float] = []
+    samples_b: List[float] = []
+    bootstrapped = np.zeros(0)
+    half_width = np.inf
+    while len(samples_a) < max_trials:
+        n_to_run = min(max(batch_size, min_trials - len(samples_a)),
+                       max_trials - len(samples_a))
+        samples_a.extend(run_trial_a() for _ in range(n_to_run))
+        samples_b.extend(run_trial_b() for _ in range(n_to_run))
+        a, b = np.array(samples_a), np.array(samples_b)
+        inds_a = rng.integers(len(a), size=(n_bootstrap, len(a)))
+        inds_b = rng.integers(len(b), size=(n_bootstrap, len(b)))
+        bootstrapped = np.array([statistic(a[ia], b[ib]) for ia, ib in zip(inds_a, inds_b)])
+        low, high = np.quantile(bootstrapped, (alpha/2, 1 - alpha/2))
+        half_width = float((high - low) / 2)
+        if half_width <= target_half_width:
+            break
+
+    a, b = np.array(samples_a), np.array(samples_b)
+    converged = half_width <= target_half_width
+    a_half_width = _calc_half_width(a, z)
+    b_half_width = _calc_half_width(b, z)
+    return AdaptiveComparisonResult(
+        float(statistic(a, b)), half_width, converged, bootstrapped,
+        AdaptiveTrialsResult(a, float(np.mean(a)), a_half_width,
+                             a_half_width <= target_half_width),
+        AdaptiveTrialsResult(b, float(np.mean(b)), b_half_width,
+                             b_half_width <= target_half_width))
+
+
+def _check_trial_bounds(min_trials: int, max_trials: int) -> None:
+    if min_trials < 2:
+        raise ValueError(f'min_trials must be at least 2, not {min_trials}.')
+    if max_trials < min_trials:
+        raise ValueError(f'max_trials ({max_trials}) must be at least '
+                         f'min_trials ({min_trials}).')
+
+
+def _calc_half_width(samples: np.ndarray, z: float) -> float:
+    """Half the width of the normal approximation confidence interval of the mean."""
+    return float(z * np.std(samples, ddof=1) / np.sqrt(len(samples)))
@@ -1,9 +1,13 @@
 import sys
 sys.path.append('')
 from unittest import TestCase
-from networkgen import make_affiliation_network
+import fileio as fio
+from networkgen import (make_affiliation_network, make_affiliation_adjacency,
+                        calc_sparse_clustering_and_edge_density)
+from networkgen._affiliation_network import project_incidence
 import itertools as it
 import numpy as np
+import scipy.sparse as sp
 import networkx as nx
 
 
@@ -56,3 +60,30 @@ class TestAssociationNetwork(TestCase):
 
         expected_components = self.N - int(membership_perc*self.N) + 1
         self.assertEqual(expected_components, nx.number_connected_components(net.G))
+
+    def test_matches_group_combinations(self):
+        """Test that the sparse projection connects the same pairs as combining each group."""
+        group_to_membership = [.1, .3, .05, .2]
+        N = 200
+        net = make_affiliation_network(group_to_membership, N, np.random.default_rng(39))
+        rng = np.random.default_rng(39)
+        expected_edges = set()
+        for perc in group_to_membership:
+            members = rng.choice(N, size=int(np.round(N*perc)), replace=False)
+            expected_edges.update(it.combinations(sorted(members.tolist()), 2))
+        self.assertEqual({tuple(sorted(edge)) for edge in net.G.edges}, expected_edges)
+        A = make_affiliation_adjacency(group_to_membership, N, np.random.default_rng(39))
+        self.assertTrue((A.toarray() == net.M).all())
+
+    def test_repeated_membership(self):
+        """An agent in the same group twice is not connected to itself."""
+        B = sp.coo_matrix(([1, 1, 1], ([0, 0, 1], [0, 0, 0])), shape=(3, 1))
+        self.assertTrue((project_incidence(B).toarray()
+                         == np.array([[0, 1, 0], [1, 0, 0], [0, 0, 0]])).all())
+
+    def test_sparse_clustering(self):
+        G = nx.gnm_random_graph(60, 300, seed=39)
+        A = sp.csr_matrix(nx.to_numpy_array(G))
+        clustering, density = calc_sparse_clustering_and_edge_density(A)
+        self.assertAlmostEqual(clustering, nx.average_clustering(G))
+        self.assertAlmostEqual(density, nx.density(G))
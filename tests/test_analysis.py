@@ -0,0 +1,153 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio as fio
+import analysis
+import numpy as np
+import networkx as nx
+
+
+class TestMetaCommunityNetwork(TestCase):
+    def setUp(self) -> None:
+        self.G = nx.connected_caveman_graph(5, 6)
+        self.edges = np.array(self.G.edges)
+        self.node_to_community = np.repeat(np.arange(5), 6)
+
+    def test_edge_counts(self):
+        expected = np.zeros((5, 5), dtype=np.int64)
+        for u, v in self.edges:
+            a, b = self.node_to_community[u], self.node_to_community[v]
+            expected[a, b] += 1
+            if a != b:
+                expected[b, a] += 1
+        counts = analysis.calc_community_edge_counts(self.node_to_community, self.edges)
+        self.assertTrue((counts.toarray() == expected).all())
+
+    def test_centroids(self):
+        layout = np.random.default_rng(35).random((len(self.G), 2))
+        centroids = analysis.calc_community_centroids(self.node_to_community, layout)
+        for community in range(5):
+            self.assertTrue(np.allclose(centroids[community],
+                                        layout[self.node_to_community == community].mean(axis=0)))
+
+    def test_meta_community_network(self):
+        """Test that crossings in either direction are counted on the same meta edge."""
+        edges_removed = tuple((u, v) for u, v in self.G.edges
+                              if self.node_to_community[u] != self.node_to_community[v])
+        # the same pair of communities crossed in both directions
+        edges_removed += ((0, 29), (29, 1), (0, 28))
+        partitioned = nx.Graph(self.G)
+        partitioned.remove_edges_from(edges_removed)
+        meta_G, node_size, edge_width = analysis.make_meta_community_network(edges_removed,
+                                                                             partitioned)
+        communities = nx.get_node_attributes(meta_G, 'communities')
+        self.assertEqual({frozenset(comm) for comm in communities.values()},
+                         {frozenset(comm) for comm in nx.connected_components(partitioned)})
+        node_to_meta = {node: meta for meta, comm in communities.items() for node in comm}
+        expected_weights = {}
+        for u, v in edges_removed:
+            key = frozenset((node_to_meta[u], node_to_meta[v]))
+            expected_weights[key] = expected_weights.get(key, 0) + 1
+        weights = {frozenset((a, b)): w for a, b, w in meta_G.edges.data('weight')}
+        self.assertEqual(weights, expected_weights)
+        total = sum(expected_weights.values())
+        self.assertTrue(np.allclose(edge_width, [w / total * 20
+                                                 for _, _, w in meta_G.edges.data('weight')]))
+        sizes = np.array([len(communities[meta]) for meta in meta_G])
+        self.assertTrue(np.allclose(node_size, sizes / len(self.G) * 1000))
+
+        layout = {node: np.array([node, -node], dtype=float) for node in self.G}
+        meta_layout = analysis.make_meta_community_layout(meta_G, layout)
+        for meta, comm in communities.items():
+            self.assertTrue(np.allclose(meta_layout[meta],
+                                        np.average([layout[node] for node in comm], axis=0)))
+
+
+class TestPercolation(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(42)
+        self.G = nx.gnm_random_graph(50, 80, seed=42)
+        self.edges = np.array(self.G.edges)
+
+    def test_percolate(self):
+        order = self.rng.permutation(len(self.edges))
+        curve = analysis.percolate(50, self.edges[order])
+        H = nx.empty_graph(50)
+        for m in range(len(self.edges)+1):
+            if m > 0:
+                H.add_edge(*self.edges[order[m-1]])
+            self.assertEqual(curve[m], len(max(nx.connected_components(H), key=len)))
+
+    def test_processes(self):
+        serial = analysis.calc_percolation_curve(50, self.edges, 4, seed=42)
+        parallel = analysis.calc_percolation_curve(50, self.edges, 4, num_processes=2, seed=42)
+        self.assertTrue(np.allclose(serial, parallel))
+
+    def test_giant_component_sizes(self):
+        curve = analysis.calc_percolation_curve(50, self.edges, 3, seed=42)
+        self.assertTrue(np.allclose(analysis.calc_giant_component_sizes(curve, (0, 1)),
+                                    (1, curve[-1])))
+
+    def test_matches_removing_edges(self):
+        """Test against removing each edge with probability p many times."""
+        p = .4
+        sizes = []
+        for _ in range(3000):
+            H = nx.Graph(self.G)
+            H.remove_edges_from([edge for edge in self.G.edges if self.rng.random() < p])
+            sizes.append(len(max(nx.connected_components(H), key=len)))
+        expected = np.mean(sizes)
+        self.assertAlmostEqual(analysis.get_giant_component_size(self.G, p, 300), expected,
+                               delta=.03*expected)
+
+
+class TestRandomWalkCentrality(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(44)
+        # a lollipop makes some edges much more central than others
+        self.G = nx.lollipop_graph(5, 4)
+        self.edges = np.array(self.G.edges)
+
+    def test_matches_walking_one_path_at_a_time(self):
+        num_paths = 4000
+        arc_to_crossings = {}
+        total = 0
+        nodes = tuple(self.G)
+        for _ in range(num_paths):
+            current, target = self.rng.choice(nodes, 2)
+            while current != target:
+                following = self.rng.choice(tuple(self.G[current]))
+                arc_to_crossings[(current, following)] =\
+                    arc_to_crossings.get((current, following), 0) + 1
+                total += 1
+                current = following
+        expected = np.array([arc_to_crossings.get((u, v), 0) + arc_to_crossings.get((v, u), 0)
+                             for u, v in self.edges.tolist()]) / total
+        centrality = analysis.calc_random_walk_centrality(len(self.G), self.edges, num_paths,
+                                                          batch_size=512, seed=44)
+        self.assertTrue(np.allclose(centrality, expected, atol=.01), f'{centrality} {expected}')
+
+    def test_arc_directions(self):
+        edges = np.array([(0, 1), (1, 2)])
+        crossings = analysis.calc_random_walk_arc_crossings(3, edges, 200, seed=44)
+        self.assertEqual(len(crossings), 4)
+        self.assertTrue((crossings > 0).all())
+        self.assertTrue(np.allclose(analysis.calc_random_walk_centrality(3, edges, 200, seed=44),
+                                    (crossings[:2] + crossings[2:]) / np.sum(crossings)))
+        # the dictionary version keys each direction separately
+        arc_to_centrality = analysis.random_walk_centrality(nx.path_graph(3), 200)
+        self.assertTrue(set(arc_to_centrality) <= {(0, 1), (1, 0), (1, 2), (2, 1)})
+        self.assertAlmostEqual(sum(arc_to_centrality.values()), 1)
+
+    def test_disconnected(self):
+        """Walks stay in their start's component, so they always end."""
+        edges = np.array([(0, 1), (1, 2), (3, 4)])
+        centrality = analysis.calc_random_walk_centrality(6, edges, 300, seed=44)
+        self.assertAlmostEqual(np.sum(centrality), 1)
+
+    def test_processes(self):
+        centrality = analysis.calc_random_walk_centrality(len(self.G), self.edges, 3000,
+                                                          batch_size=500, num_processes=2,
+                                                          seed=44)
+        expected = analysis.calc_random_walk_centrality(len(self.G), self.edges, 3000, seed=44)
+        self.assertTrue(np.allclose(centrality, expected, atol=.01))
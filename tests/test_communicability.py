@@ -0,0 +1,33 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio as fio
+from communicability import (calc_communicability_scores, calc_network_communicabilities,
+                             calc_total_communicability)
+from network import Network
+import numpy as np
+import networkx as nx
+
+
+class TestCommunicability(TestCase):
+    def test_matches_networkx(self):
+        G = nx.gnm_random_graph(30, 70, seed=45)
+        communicability = nx.communicability_exp(G)
+        expected = np.array([sum(communicability[u].values()) for u in range(30)])
+        scores = calc_communicability_scores(30, np.array(G.edges))
+        self.assertTrue(np.allclose(scores, expected))
+        self.assertAlmostEqual(calc_total_communicability(30, np.array(G.edges)),
+                               np.sum(expected))
+
+    def test_isolated_nodes(self):
+        # an isolated node only communicates with itself, and exp(0) = 1
+        scores = calc_communicability_scores(3, np.array([(0, 1)]))
+        self.assertTrue(np.allclose(scores, (np.e, np.e, 1)))
+        self.assertEqual(len(calc_communicability_scores(0, np.zeros((0, 2), dtype=int))), 0)
+
+    def test_networks(self):
+        nets = [Network(nx.gnm_random_graph(20, 40, seed=seed)) for seed in range(5)]
+        expected = [calc_total_communicability(net.N, net.edge_array) for net in nets]
+        for num_processes in (1, 2):
+            self.assertTrue(np.allclose(calc_network_communicabilities(nets, num_processes),
+                                        expected))
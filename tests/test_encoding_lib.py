@@ -0,0 +1,194 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio as fio
+import encoding_lib as lib
+import itertools as it
+import numpy as np
+import networkx as nx
+from analysis import make_csr
+
+
+class TestPopulationDiversity(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(66)
+
+    def test_edge_set_diversity(self):
+        """Test that the vectorised diversity matches comparing every pair."""
+        population = self.rng.integers(0, 3, (30, 50))
+        rated_population = [(0, genotype) for genotype in population]
+        n_same = sum(np.sum(a == b) for a, b in it.combinations(population, 2))
+        expected = 1 - n_same / (len(population)*(len(population)-1)//2 * population.shape[1])
+        self.assertAlmostEqual(lib.calc_edge_set_population_diversity(rated_population),
+                               expected)
+
+    def test_streaming_edge_set_diversity(self):
+        population = self.rng.integers(0, 2, (41, 70))
+        rated_population = [(0, genotype) for genotype in population]
+        chunks = np.array_split(population, 4)
+        self.assertAlmostEqual(lib.calc_streaming_edge_set_diversity(chunks),
+                               lib.calc_edge_set_population_diversity(rated_population))
+
+    def test_generic_diversity(self):
+        population = self.rng.integers(0, 2, (20, 4))
+        rated_population = [(0, genotype) for genotype in population]
+        expected = len(set(genotype.tobytes() for genotype in population)) / len(population)
+        self.assertEqual(lib.calc_generic_population_diversity(rated_population), expected)
+
+    def test_float_diversity(self):
+        population = self.rng.random((20, 10))
+        # make some duplicates so that not every pair is different
+        population[10:15] = population[:5]
+        rated_population = [(0, genotype) for genotype in population]
+        n_same = sum(np.allclose(a, b) for a, b in it.combinations(population, 2))
+        expected = 1 - n_same / (len(population)*(len(population)-1)//2)
+        self.assertAlmostEqual(lib.calc_float_pop_diversity(rated_population, 30), expected)
+
+
+class TestMutations(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(28)
+        self.children = [self.rng.integers(0, 2, 400) for _ in range(50)]
+
+    def test_bit_flip_mutation(self):
+        mutated = lib.bit_flip_mutation(self.children, .1, self.rng)
+        self.assertEqual(mutated.shape, (50, 400))
+        self.assertTrue(np.isin(mutated, (0, 1)).all())
+        # about 10% of the 20,000 genes should flip, as with flipping one gene at a time
+        self.assertAlmostEqual(np.mean(mutated != np.array(self.children)), .1, delta=.01)
+        self.assertTrue((lib.bit_flip_mutation(self.children, 1, self.rng)
+                         == 1 - np.array(self.children)).all())
+        self.assertTrue((lib.bit_flip_mutation(self.children, 0, self.rng)
+                         == np.array(self.children)).all())
+
+    def test_categorical_mutation(self):
+        choices = (0, 1, 2, 3)
+        mutated = lib.categorical_mutation(self.children, .2, choices, self.rng)
+        self.assertTrue(np.isin(mutated, choices).all())
+        # a resampled gene keeps its value a quarter of the time
+        self.assertAlmostEqual(np.mean(mutated != np.array(self.children)), .15, delta=.015)
+
+    def test_neighbor_mutation(self):
+        G = nx.gnm_random_graph(400, 1200, seed=28)
+        G.add_edges_from((u, (u+1) % 400) for u in range(400))
+        edges = np.array(G.edges)
+        indptr, indices = make_csr(400, edges)
+        children = [np.array([self.rng.choice(tuple(G[u])) for u in range(400)])
+                    for _ in range(20)]
+        mutated = lib.neighbor_mutation(children, .5, indptr, indices, self.rng)
+        for child in mutated:
+            self.assertTrue(all(G.has_edge(u, v) for u, v in enumerate(child)))
+        # every neighbor of a node with several neighbors should be picked at some point
+        counts = np.bincount(lib.neighbor_mutation([children[0]]*2000, 1, indptr, indices,
+                                                   self.rng)[:, 0], minlength=400)
+        self.assertEqual(set(np.flatnonzero(counts)), set(G[0]))
+
+    def test_step_mutation(self):
+        children = [np.zeros(400, dtype=np.int64) for _ in range(50)]
+        mutated = lib.step_mutation(children, .3, 2, self.rng)
+        self.assertTrue(np.isin(mutated, (-2, 0, 2)).all())
+        self.assertAlmostEqual(np.mean(mutated != 0), .3, delta=.02)
+        self.assertAlmostEqual(np.mean(mutated[mutated != 0] > 0), .5, delta=.03)
+
+    def test_gaussian_mutation(self):
+        children = [np.zeros(400) for _ in range(50)]
+        mutated = lib.gaussian_mutation(children, .5, 3, self.rng)
+        changed = mutated[mutated != 0]
+        self.assertAlmostEqual(len(changed) / mutated.size, .5, delta=.02)
+        self.assertAlmostEqual(np.std(changed), 3, delta=.1)
+
+
+class CountingObjective:
+    def __init__(self) -> None:
+        self.n_rated = 0
+
+    def __call__(self, encoding):
+        self.n_rated += 1
+        return float(np.sum(encoding * np.arange(len(encoding))))
+
+
+class TestFitnessCache(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(29)
+
+    def test_lru_eviction(self):
+        cache = lib.FitnessCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        # b is now the least recently used
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertAlmostEqual(cache.hit_rate, .75)
+
+    def test_genotype_key(self):
+        genotype = np.array([1, 0, 2])
+        self.assertEqual(lib.genotype_key(genotype), lib.genotype_key(genotype.copy()))
+        self.assertNotEqual(lib.genotype_key(genotype), lib.genotype_key(genotype.astype(float)))
+        self.assertEqual(lib.genotype_key(np.array([[1, 0, 2]])[0, ::1]),
+                         lib.genotype_key(genotype))
+
+    def test_cached_objective(self):
+        """Test that the costs match the objective and each genotype is only rated once."""
+        unique = self.rng.integers(0, 2, (10, 12))
+        population = unique[self.rng.integers(0, 10, 40)]
+        counter = CountingObjective()
+        objective = lib.CachedObjective(counter)
+        expected = np.array([counter(encoding) for encoding in population])
+        counter.n_rated = 0
+        self.assertTrue((objective.rate_population(population) == expected).all())
+        n_unique = len(np.unique(population, axis=0))
+        self.assertEqual(counter.n_rated, n_unique)
+        self.assertTrue((np.array([objective(e) for e in population]) == expected).all())
+        self.assertEqual(counter.n_rated, n_unique)
+
+    def test_cached_noisy_objective(self):
+        def sample(encoding, seed):
+            return np.random.default_rng(seed).random() + np.sum(encoding)
+
+        population = np.unique(self.rng.integers(0, 2, (6, 5)), axis=0)
+        objective = lib.CachedNoisyObjective(sample, np.mean, (1, 2, 3))
+        expected = [np.mean([sample(e, seed) for seed in (1, 2, 3)]) for e in population]
+        self.assertTrue(np.allclose(objective.rate_population(population), expected))
+        # changing the seeds only needs the new seed's measurements
+        objective.seeds = (2, 3, 4)
+        n_misses = objective.cache.misses
+        objective.rate_population(population)
+        self.assertEqual(objective.cache.misses - n_misses, len(population))
+
+    def test_optimizer_cache(self):
+        population = self.rng.integers(0, 2, (30, 4))
+        counter = CountingObjective()
+        expected = [counter(encoding) for encoding in population]
+        counter.n_rated = 0
+        cache = lib.FitnessCache()
+        optimizer = lib.PopulationGAOptimizer(counter, lambda rated: [e for _, e in rated],
+                                              population, cache=cache)
+        for _ in range(3):
+            self.assertEqual([cost for cost, _ in optimizer.step()], expected)
+        self.assertEqual(counter.n_rated, len(np.unique(population, axis=0)))
+
+    def test_duplicates_count_once(self):
+        """Each distinct genotype in a population is one lookup, however often it repeats."""
+        population = np.array([[0, 1], [0, 1], [0, 1], [1, 1]])
+        objective = lib.CachedObjective(CountingObjective())
+        objective.rate_population(population)
+        self.assertEqual((objective.cache.hits, objective.cache.misses), (0, 2))
+        objective.rate_population(population)
+        self.assertEqual((objective.cache.hits, objective.cache.misses), (2, 2))
+        self.assertAlmostEqual(objective.cache.hit_rate, .5)
+
+        cache = lib.FitnessCache()
+        optimizer = lib.PopulationGAOptimizer(CountingObjective(), lambda rated: population,
+                                              population, cache=cache)
+        optimizer.step()
+        optimizer.step()
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+        noisy = lib.CachedNoisyObjective(lambda encoding, seed: seed, np.mean, (1, 2))
+        noisy.rate_population(population)
+        self.assertEqual((noisy.cache.hits, noisy.cache.misses), (0, 4))
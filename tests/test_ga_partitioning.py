@@ -0,0 +1,96 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio as fio
+from ga_partitioning import ChakrabortySatoObjective, LabelObjective, PartitioningObjective
+import encoding_lib as lib
+import partitioning
+import numpy as np
+import networkx as nx
+
+
+class TestBatchConnectedComponents(TestCase):
+    def test_matches_networkx(self):
+        rng = np.random.default_rng(27)
+        N, pop_size = 30, 8
+        G = nx.gnm_random_graph(N, 40, seed=27)
+        edges = np.array(G.edges)
+        keep = rng.random((pop_size, len(edges))) < .6
+        genotype_ids, edge_inds = np.nonzero(keep)
+        labels, n_comps = partitioning.batch_connected_components(N, pop_size, genotype_ids,
+                                                                  edges[edge_inds, 0],
+                                                                  edges[edge_inds, 1])
+        for i in range(pop_size):
+            H = nx.Graph()
+            H.add_nodes_from(range(N))
+            H.add_edges_from(edges[keep[i]].tolist())
+            expected = {frozenset(comp) for comp in nx.connected_components(H)}
+            actual = {frozenset(np.flatnonzero(labels[i] == label).tolist())
+                      for label in np.unique(labels[i])}
+            self.assertEqual(n_comps[i], len(expected))
+            self.assertEqual(actual, expected)
+
+
+class TestObjectives(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(27)
+        # without the edge weights, which the objectives ignore
+        self.G = nx.Graph()
+        self.G.add_nodes_from(range(34))
+        self.G.add_edges_from(nx.karate_club_graph().edges)
+        self.N = len(self.G)
+
+    def components(self, edges):
+        H = nx.Graph()
+        H.add_nodes_from(range(self.N))
+        H.add_edges_from(edges)
+        return tuple(nx.connected_components(H))
+
+    def test_partitioning_objective(self):
+        """Test that the batched costs match building a graph for each encoding."""
+        edges = tuple(self.G.edges)
+        objective = PartitioningObjective(self.G)
+        # mostly ones, so that some encodings actually break the network up
+        population = (self.rng.random((20, len(edges))) < .8).astype(np.int64)
+        population[0] = 0
+        for encoding, cost in zip(population, objective.rate_population(population)):
+            comps = self.components(edge for edge, rm in zip(edges, encoding) if rm == 0)
+            if len(comps) == 1:
+                expected = len(encoding) - np.sum(encoding)
+            else:
+                expected = -len(comps)*len(edges)*2 + np.sum(encoding)\
+                    - len(min(comps, key=len))
+            self.assertEqual(cost, expected)
+            self.assertEqual(objective(encoding), expected)
+
+    def test_chakraborty_sato_objective(self):
+        """Test that the cost is the negative modularity of the encoding's clusters."""
+        objective = ChakrabortySatoObjective(self.G)
+        population = np.array([[self.rng.choice(tuple(self.G[node])) for node in range(self.N)]
+                               for _ in range(10)])
+        for encoding, cost in zip(population, objective.rate_population(population)):
+            clusters = self.components(enumerate(encoding.tolist()))
+            self.assertAlmostEqual(cost, -nx.community.modularity(self.G, clusters))
+
+    def test_label_objective(self):
+        n_comms = 3
+        objective = LabelObjective(self.G, n_comms)
+        population = self.rng.integers(0, 4, (15, self.N))
+        for encoding, cost in zip(population, objective.rate_population(population)):
+            labels = partitioning.propagate_labels(self.G, encoding)
+            comps = self.components((u, v) for u, v in self.G.edges if labels[u] == labels[v])
+            lengths = [len(comp) for comp in comps]
+            expected = n_comms*2*abs(len(comps) - n_comms) + max(lengths) - min(lengths)
+            self.assertEqual(cost, expected)
+
+    def test_optimizer_processes(self):
+        """Test that rating in a process pool gives the same costs as rating serially."""
+        objective = LabelObjective(self.G, 3)
+        population = self.rng.integers(0, 3, (9, self.N))
+        costs = []
+        for num_processes in (1, 2):
+            optimizer = lib.PopulationGAOptimizer(objective, lambda rated: rated,
+                                                  population, num_processes)
+            costs.append([cost for cost, _ in optimizer.step()])
+            optimizer.close()
+        self.assertEqual(costs[0], costs[1])
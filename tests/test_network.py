@@ -0,0 +1,147 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio as fio
+from network import Network
+import network_layout
+from network_layout import LayoutCache, force_layout, make_layout
+import os
+from unittest.mock import patch
+import tempfile
+import networkx as nx
+import scipy.sparse as sp
+import numpy as np
+
+
+class TestNetworkCommunities(TestCase):
+    def setUp(self) -> None:
+        # 4 cliques of 5 nodes connected in a ring
+        self.G = nx.connected_caveman_graph(4, 5)
+        self.node_to_community = {node: node // 5 for node in self.G}
+
+    def test_dict_and_array_communities_agree(self):
+        from_dict = Network(self.G, communities=self.node_to_community)
+        from_array = Network(self.G, communities=np.arange(len(self.G)) // 5)
+        self.assertEqual(from_dict.communities, from_array.communities)
+        self.assertEqual(set(from_dict.intercommunity_edges),
+                         set(from_array.intercommunity_edges))
+
+    def test_intercommunity_edges(self):
+        net = Network(self.G, communities=self.node_to_community)
+        expected = {(u, v) for u, v in self.G.edges
+                    if self.node_to_community[u] != self.node_to_community[v]}
+        self.assertEqual(set(net.intercommunity_edges), expected)
+        self.assertEqual(len(net.intercommunity_edge_array), len(expected))
+
+    def test_community_sizes_and_edge_counts(self):
+        net = Network(self.G, communities=self.node_to_community)
+        self.assertTrue((net.community_sizes == 5).all())
+        counts = net.community_edge_counts.toarray()
+        self.assertTrue((counts == counts.T).all())
+        # the diagonal plus the upper triangle accounts for every edge exactly once
+        self.assertEqual(np.sum(np.triu(counts)), net.E)
+        for u, v in net.intercommunity_edges:
+            self.assertGreater(counts[u // 5, v // 5], 0)
+
+    def test_communities_from_intercommunity_edges(self):
+        intercommunity_edges = [(u, v) for u, v in self.G.edges
+                                if self.node_to_community[u] != self.node_to_community[v]]
+        net = Network(self.G, intercommunity_edges=intercommunity_edges)
+        self.assertTrue((net.community_array == np.arange(len(self.G)) // 5).all())
+
+
+class TestNetworkLayout(TestCase):
+    def test_cache_ignores_edge_order(self):
+        G = nx.connected_caveman_graph(4, 5)
+        edges = np.array(G.edges)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = LayoutCache(directory)
+            layout = make_layout(len(G), edges, 'force', cache=cache)
+            reordered = make_layout(len(G), edges[::-1, ::-1], 'force', cache=cache)
+            self.assertTrue(np.array_equal(layout, reordered))
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_no_cache_by_default(self):
+        G = nx.connected_caveman_graph(4, 5)
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                Network(G).layout
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(os.listdir(directory), [])
+        with tempfile.TemporaryDirectory() as directory:
+            Network(G, layout_cache=LayoutCache(directory)).layout
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_read_network_caches_layout(self):
+        """Networks saved without a layout get one from the default cache unless opted out."""
+        G = nx.connected_caveman_graph(4, 5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'net.txt')
+            nx.write_gml(G, path)
+            cache_dir = os.path.join(directory, 'cache')
+            with patch.object(fio, 'get_default_layout_cache', lambda: LayoutCache(cache_dir)):
+                fio.read_network(path, cache_layout=False).layout
+                self.assertFalse(os.path.exists(cache_dir))
+                layout = fio.read_network(path).layout_array
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                self.assertTrue(np.array_equal(fio.read_network(path).layout_array, layout))
+        with patch.dict(os.environ, {network_layout.NO_LAYOUT_CACHE_VAR: '1'}):
+            self.assertIsNone(network_layout.get_default_layout_cache())
+        with patch.dict(os.environ):
+            os.environ.pop(network_layout.NO_LAYOUT_CACHE_VAR, None)
+            self.assertIsInstance(network_layout.get_default_layout_cache(), LayoutCache)
+
+    def test_force_layout_keeps_neighbors_close(self):
+        G = nx.connected_caveman_graph(10, 10)
+        edges = np.array(G.edges)
+        positions = force_layout(len(G), edges, np.random.default_rng(0))
+        self.assertEqual(positions.shape, (len(G), 2))
+        self.assertAlmostEqual(np.abs(positions).max(), 1)
+        edge_lengths = np.linalg.norm(positions[edges[:, 0]] - positions[edges[:, 1]], axis=1)
+        pairs = np.random.default_rng(1).integers(len(G), size=(1000, 2))
+        pair_lengths = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+        self.assertLess(np.mean(edge_lengths), np.mean(pair_lengths) / 4)
+
+    def test_array_and_dict_layouts_agree(self):
+        G = nx.connected_caveman_graph(4, 5)
+        layout = nx.circular_layout(G)
+        from_dict = Network(G, layout=layout)
+        from_array = Network(G, layout=np.array([layout[node] for node in G]))
+        self.assertTrue(np.allclose(from_dict.layout_array, from_array.layout_array))
+        self.assertEqual(set(from_array.layout), set(G.nodes))
+
+
+class TestNetworkViews(TestCase):
+    def setUp(self) -> None:
+        self.G = nx.connected_caveman_graph(4, 5)
+        self.edges = np.array(self.G.edges)
+
+    def test_views_agree(self):
+        expected_M = nx.to_numpy_array(self.G)
+        expected_dm = nx.floyd_warshall_numpy(self.G)
+        nets = (Network(self.G), Network(expected_M),
+                Network(sp.csr_matrix(expected_M)),
+                Network.from_edges(len(self.G), self.edges[::-1, ::-1]))
+        for net in nets:
+            self.assertEqual((net.N, net.E), (len(self.G), len(self.edges)))
+            self.assertTrue(np.array_equal(net.M, expected_M))
+            self.assertTrue(np.array_equal(net.A.toarray(), expected_M))
+            self.assertTrue(np.array_equal(net.dm, expected_dm))
+            self.assertTrue(np.array_equal(np.array(list(net.edges)), net.edge_array))
+            self.assertEqual(len(net.R.edge_list()), net.E)
+
+    def test_from_edges_keeps_weights(self):
+        weights = np.arange(1, len(self.edges)+1, dtype=float)
+        net = Network.from_edges(len(self.G), self.edges, weights)
+        self.assertTrue(np.array_equal(nx.to_numpy_array(net.G), net.M))
+        self.assertEqual(net.M[self.edges[3, 0], self.edges[3, 1]], weights[3])
+
+    def test_core_is_read_only(self):
+        net = Network.from_edges(len(self.G), self.edges)
+        with self.assertRaises(ValueError):
+            net.edge_array[0, 0] = 1
+        with self.assertRaises(ValueError):
+            net.A.data[0] = 2
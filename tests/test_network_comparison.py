@@ -0,0 +1,74 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio  # noqa: F401 (network has to be imported after fileio)
+import network_comparison as nc
+from network import Network
+import networkx as nx
+import numpy as np
+
+
+class TestNetworkDistances(TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.graphs = [nx.gnm_random_graph(int(rng.integers(4, 7)), int(rng.integers(3, 8)),
+                                           seed=int(rng.integers(1000)))
+                       for _ in range(6)]
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            nc.NetworkDistance()  # type: ignore
+
+    def test_edit_distance_bounds(self):
+        lower = nc.DegreeSequenceDistance()
+        upper = nc.BipartiteEditDistance()
+        for G0 in self.graphs[:4]:
+            for G1 in self.graphs[:4]:
+                args = (len(G0), np.array(G0.edges).reshape(-1, 2),
+                        len(G1), np.array(G1.edges).reshape(-1, 2))
+                exact = nx.graph_edit_distance(G0, G1)
+                self.assertLessEqual(lower(*args), exact)
+                self.assertGreaterEqual(upper(*args), exact)
+
+    def test_different_node_counts(self):
+        """The nodes that only one network has must be inserted."""
+        empty = np.zeros((0, 2), dtype=np.int64)
+        self.assertEqual(nc.DegreeSequenceDistance()(5, empty, 3, empty), 2)
+        self.assertEqual(nc.DegreeSequenceDistance()(3, empty, 5, empty), 2)
+        G0, G1 = nx.path_graph(3), nx.path_graph(5)
+        args = (3, np.array(G0.edges), 5, np.array(G1.edges))
+        exact = nx.graph_edit_distance(G0, G1)
+        # two nodes and two edges have to be added
+        self.assertEqual(exact, 4)
+        self.assertEqual(nc.DegreeSequenceDistance()(*args), exact)
+        self.assertGreaterEqual(nc.BipartiteEditDistance()(*args), exact)
+
+    def test_edge_set_distances(self):
+        G0, G1 = self.graphs[0], self.graphs[1]
+        edges0 = {tuple(sorted(edge)) for edge in G0.edges}
+        edges1 = {tuple(sorted(edge)) for edge in G1.edges}
+        args = (len(G0), np.array(G0.edges), len(G1), np.array(G1.edges)[:, ::-1])
+        self.assertAlmostEqual(nc.EdgeJaccardDistance()(*args),
+                               1 - len(edges0 & edges1) / len(edges0 | edges1))
+        self.assertEqual(nc.EdgeHammingDistance()(*args), len(edges0 ^ edges1))
+
+    def test_spectral_distance(self):
+        G0, G1 = nx.cycle_graph(30), nx.path_graph(30)
+        values0 = np.sort(np.linalg.eigvalsh(nx.to_numpy_array(G0)))[::-1]
+        values1 = np.sort(np.linalg.eigvalsh(nx.to_numpy_array(G1)))[::-1]
+        args = (30, np.array(G0.edges), 30, np.array(G1.edges))
+        self.assertAlmostEqual(nc.SpectralDistance()(*args),
+                               np.linalg.norm(values0 - values1))
+        self.assertAlmostEqual(nc.SpectralDistance(5)(*args),
+                               np.linalg.norm(values0[:5] - values1[:5]))
+
+    def test_pairwise_distances(self):
+        nets = [Network(G) for G in self.graphs]
+        distance = nc.BipartiteEditDistance()
+        distances = nc.calc_pairwise_distances(nets, distance)
+        self.assertTrue(np.array_equal(distances, distances.T))
+        self.assertTrue((np.diag(distances) == 0).all())
+        self.assertEqual(distances[1, 4], distance(nets[1].N, nets[1].edge_array,
+                                                   nets[4].N, nets[4].edge_array))
+        self.assertTrue(np.array_equal(nc.calc_pairwise_distances(nets, distance, 2),
+                                       distances))
@@ -0,0 +1,30 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+from network_stats import calc_network_stats
+import networkx as nx
+import numpy as np
+
+
+class TestNetworkStats(TestCase):
+    def test_matches_networkx(self):
+        for seed in range(3):
+            G = nx.powerlaw_cluster_graph(200, 3, .3, seed=seed)
+            stats = calc_network_stats(len(G), np.array(G.edges), max_block_nnz=100,
+                                       max_bfs=None)
+            node_to_triangles = nx.triangles(G)
+            self.assertEqual(stats.triangles.tolist(),
+                             [node_to_triangles[node] for node in range(len(G))])
+            self.assertAlmostEqual(stats.average_clustering, nx.average_clustering(G))
+            self.assertAlmostEqual(stats.assortativity, nx.degree_assortativity_coefficient(G))
+            self.assertAlmostEqual(stats.edge_density, nx.density(G))
+            self.assertEqual(stats.degree_histogram.tolist(), nx.degree_histogram(G))
+            self.assertTrue(stats.is_diameter_exact)
+            self.assertEqual(stats.diameter, nx.diameter(G))
+
+    def test_diameter_of_largest_component(self):
+        # a path of 6 nodes and a separate triangle
+        G = nx.disjoint_union(nx.path_graph(6), nx.complete_graph(3))
+        stats = calc_network_stats(len(G), np.array(G.edges))
+        self.assertEqual(stats.diameter, 5)
+        self.assertEqual(stats.triangles.tolist(), [0]*6 + [1]*3)
@@ -0,0 +1,297 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio as fio
+from networkgen import (make_connected_community_network, MakeLazySpatialNetwork,
+                        make_social_circles_network, Agent,
+                        make_random_spatial_configuration, make_agent_generated_network,
+                        TimeBasedBehavior, make_complete_clique_gate_network,
+                        make_clique_gate_network, make_clique_gate_edges)
+from networkgen._agent_based import AgentNetwork, IndexedPool
+from networkgen._social_circles import choose_empty_spots, find_social_circles_edges
+from networkgen._connected_community import (make_configuration_edges,
+                                             make_configuration_network)
+import numpy as np
+import networkx as nx
+from analysis import calc_prop_common_neighbors
+
+
+class TestConfigurationModel(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(36)
+        self.degrees = self.rng.integers(1, 8, 60)
+        if np.sum(self.degrees) % 2 == 1:
+            self.degrees[0] += 1
+
+    def test_degrees(self):
+        edges = make_configuration_edges(self.degrees, self.rng)
+        self.assertTrue((np.bincount(edges.ravel(), minlength=60) == self.degrees).all())
+        M = make_configuration_network(self.degrees, self.rng)
+        # self loops add 2 to the diagonal
+        self.assertTrue((np.sum(M, axis=1) == self.degrees).all())
+        with self.assertRaises(ValueError):
+            make_configuration_edges(np.array([1, 2]), self.rng)
+
+    def test_matches_networkx(self):
+        """Test that self loops and duplicates are as common as in nx.configuration_model."""
+        def count_bad(edges):
+            sorted_edges = np.sort(edges, axis=1)
+            n_loops = np.sum(sorted_edges[:, 0] == sorted_edges[:, 1])
+            return n_loops, len(edges) - len(np.unique(sorted_edges, axis=0))
+
+        n_trials = 500
+        ours = np.mean([count_bad(make_configuration_edges(self.degrees, self.rng))
+                        for _ in range(n_trials)], axis=0)
+        theirs = np.mean([count_bad(np.array(list(nx.configuration_model(self.degrees,
+                                                                         seed=trial).edges())))
+                          for trial in range(n_trials)], axis=0)
+        self.assertTrue(np.allclose(ours, theirs, atol=.3), f'{ours} {theirs}')
+
+    def test_connected_community_network(self):
+        inner_degrees = np.array([3, 3, 4, 4, 2, 2])
+        outer_degrees = np.array([2, 3, 3, 2])
+        net = make_connected_community_network(inner_degrees, outer_degrees, self.rng,
+                                               allow_disconnected=False)
+        self.assertIsNotNone(net)
+        self.assertEqual(len(net.G), 24)
+        self.assertTrue(nx.is_connected(net.G))
+        self.assertEqual(nx.number_of_selfloops(net.G), 0)
+        self.assertTrue(np.isin(net.M, (0, 1)).all())
+        communities = np.array([net.communities[node] for node in range(24)])
+        self.assertTrue((communities == np.repeat(np.arange(4), 6)).all())
+        # edges between communities come from the outer degrees
+        n_between = sum(communities[u] != communities[v] for u, v in net.G.edges)
+        self.assertLessEqual(n_between, np.sum(outer_degrees) // 2)
+
+
+class TestLazySpatialNetwork(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(37)
+        self.config = make_random_spatial_configuration((30, 30), 150, self.rng)
+
+    def test_configuration(self):
+        self.assertEqual(np.sum(self.config.grid), 150)
+        locations = self.config.locations
+        self.assertEqual(len(np.unique(locations, axis=0)), 150)
+        self.assertTrue((self.config.grid[locations[:, 0].astype(int),
+                                          locations[:, 1].astype(int)] == 1).all())
+
+    def test_matches_distance_matrix(self):
+        """
+        Test that the edges are the pairs strictly closer than the reach, as with the
+        old distance matrix, for reaches that grow and shrink. Integer reaches land
+        exactly on grid distances.
+        """
+        locations = self.config.locations
+        distances = np.linalg.norm(locations[:, None] - locations[None, :], axis=-1)
+        make_network = MakeLazySpatialNetwork(self.config)
+        for reach in (2, 1.5, 5, 3, 5, 8.2):
+            expected = {(u, v) for u, v in zip(*np.nonzero(distances < reach)) if u < v}
+            edges = make_network.edges_with_reach(reach)
+            self.assertEqual({tuple(sorted(edge)) for edge in edges.tolist()}, expected)
+            net = make_network(reach)
+            self.assertEqual(net.G.number_of_edges(), len(expected))
+        self.assertIs(make_network(3), make_network(3))
+        # knowing the largest reach up front gives the same networks
+        self.assertEqual(set(map(tuple, MakeLazySpatialNetwork(self.config, 8.2)
+                                 .edges_with_reach(5).tolist())),
+                         set(map(tuple, make_network.edges_with_reach(5).tolist())))
+
+
+class TestSocialCircles(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(38)
+        self.grid_size = (40, 30)
+
+    def test_edges_match_brute_force(self):
+        """Test that agents are connected within the smaller reach, wrapping around the grid."""
+        locations = choose_empty_spots(self.grid_size, 120, self.rng)
+        reaches = np.repeat([6., 4., 2.5], 40)
+        deltas = np.abs(locations[:, None] - locations[None, :])
+        deltas = np.minimum(deltas, np.array(self.grid_size) - deltas)
+        distances = np.linalg.norm(deltas, axis=-1)
+        within = distances <= np.minimum(reaches[:, None], reaches[None, :])
+        expected = {(u, v) for u, v in zip(*np.nonzero(within)) if u < v}
+        edges = find_social_circles_edges(locations, reaches, self.grid_size)
+        self.assertEqual(len(edges), len(expected))
+        self.assertEqual({tuple(sorted(edge)) for edge in edges.tolist()}, expected)
+
+    def test_choose_empty_spots(self):
+        spots = choose_empty_spots(self.grid_size, 500, self.rng)
+        self.assertEqual(len(np.unique(spots, axis=0)), 500)
+        self.assertTrue(((spots >= 0) & (spots < self.grid_size)).all())
+
+    def test_network(self):
+        agents = {Agent('green', 3): 30, Agent('blue', 5): 10}
+        net, colors = make_social_circles_network(agents, self.grid_size, rand=self.rng)
+        self.assertEqual(len(net.G), 40)
+        # agents are numbered by decreasing reach
+        self.assertEqual(colors, ['blue']*10 + ['green']*30)
+
+
+class NetworkxTimeBasedBehavior:
+    """The old TimeBasedBehavior, which copied the NetworkX graph every step."""
+    def __init__(self, N, lower_bound, upper_bound, steps_to_stable, rand):
+        self._time_stable = np.zeros(N, np.uint64)
+        self._lower_bound = lower_bound
+        self._upper_bound = upper_bound
+        self._steps_to_stable = steps_to_stable
+        self._agent_to_previous_neighbors = [set() for _ in range(N)]
+        self._rand = rand
+
+    def _choice(self, choices):
+        return choices[self._rand.integers(len(choices))]
+
+    def _unstable_behavior(self, G, agent, neighbors):
+        if len(neighbors) < self._lower_bound:
+            if len(neighbors) == 0:
+                G.add_edge(agent, self._choice(tuple(set(G) - {agent})))
+            else:
+                closest_neighbor = max(neighbors, key=lambda neighbor:
+                                       calc_prop_common_neighbors(G, agent, neighbor))
+                neighbor_choices = tuple(set(G[closest_neighbor]) - {agent})
+                G.add_edge(agent, self._choice(neighbor_choices if len(neighbor_choices) > 0
+                                               else tuple(set(G) - {agent})))
+        elif len(neighbors) > self._upper_bound:
+            G.remove_edge(agent, min(neighbors, key=lambda neighbor:
+                                     calc_prop_common_neighbors(G, agent, neighbor)))
+
+    def _stable_behavior(self, G, agent, neighbors):
+        if len(neighbors) < self._upper_bound - 1:
+            neighbor_choices = [n for n in G.nodes
+                                if self._time_stable[n] > self._steps_to_stable
+                                and n not in neighbors and n != agent
+                                and len(G[n]) < self._upper_bound - 1]
+            if len(neighbor_choices) > 0:
+                G.add_edge(agent, self._choice(neighbor_choices))
+
+    def __call__(self, G):
+        H = nx.Graph(G)
+        agents = self._rand.permutation(len(H))
+        for agent in agents:
+            neighbors = tuple(H[agent])
+            if self._time_stable[agent] < self._steps_to_stable:
+                self._unstable_behavior(H, agent, neighbors)
+            else:
+                self._stable_behavior(H, agent, neighbors)
+        for agent in agents:
+            neighbors = set(H[agent])
+            if self._agent_to_previous_neighbors[agent] == neighbors:
+                self._time_stable[agent] += 1
+            else:
+                self._time_stable[agent] = 0
+            self._agent_to_previous_neighbors[agent] = neighbors
+        return H, (self._time_stable > 0).all() and nx.is_connected(H)
+
+
+class TestAgentBased(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(40)
+
+    def test_agent_network(self):
+        """Test that the common neighbor counts stay correct as edges come and go."""
+        N = 25
+        state = AgentNetwork(N)
+        G = nx.empty_graph(N)
+        for _ in range(600):
+            u, v = self.rng.integers(N, size=2).tolist()
+            if G.has_edge(u, v):
+                state.remove_edge(u, v)
+                G.remove_edge(u, v)
+            else:
+                self.assertEqual(state.add_edge(u, v), u != v)
+                if u != v:
+                    G.add_edge(u, v)
+        for u, v in G.edges:
+            self.assertEqual(state.common_neighbors(u, v), len(tuple(nx.common_neighbors(G, u, v))))
+        self.assertEqual({tuple(sorted(edge)) for edge in state.edge_array().tolist()},
+                         {tuple(sorted(edge)) for edge in G.edges})
+        self.assertEqual(state.is_connected(), nx.is_connected(G))
+
+    def test_indexed_pool(self):
+        pool = IndexedPool()
+        expected = set()
+        for item in self.rng.integers(20, size=200).tolist():
+            if item in expected:
+                pool.discard(item)
+                expected.discard(item)
+            else:
+                pool.add(item)
+                expected.add(item)
+            self.assertEqual(set(pool), expected)
+            self.assertEqual(len(pool), len(expected))
+            if len(expected) > 0:
+                self.assertIn(pool.choice(self.rng), expected)
+
+    def test_matches_networkx_behavior(self):
+        """Test that the generated networks look like the ones the old behavior made."""
+        def stats(make_behavior):
+            degrees, clusterings = [], []
+            for _ in range(20):
+                net = make_agent_generated_network(40, make_behavior(40, 2, 6, 5, self.rng))
+                self.assertIsNotNone(net)
+                self.assertTrue(nx.is_connected(net.G))
+                degrees.append(np.mean([d for _, d in net.G.degree]))
+                clusterings.append(nx.average_clustering(net.G))
+            return np.mean(degrees), np.mean(clusterings)
+
+        degree, clustering = stats(TimeBasedBehavior)
+        expected_degree, expected_clustering = stats(NetworkxTimeBasedBehavior)
+        self.assertAlmostEqual(degree, expected_degree, delta=.15)
+        self.assertAlmostEqual(clustering, expected_clustering, delta=.04)
+
+
+def make_clique_gate_networkx(num_big_components, big_component_size, gate_size):
+    """The old clique-gate builder, which unioned NetworkX complete graphs."""
+    num_gates = num_big_components * (num_big_components - 1) // 2
+    gates = [nx.complete_graph(range(start, start+gate_size))
+             for start in range(0, num_gates*gate_size, gate_size)]
+    big_comps = [nx.complete_graph(range(start, start+big_component_size))
+                 for start in range(num_gates*gate_size,
+                                    num_gates*gate_size + num_big_components*big_component_size,
+                                    big_component_size)]
+    G = nx.compose_all(gates + big_comps)
+    gate_ind = 0
+    for comp_ind, src_comp in enumerate(big_comps[:-1]):
+        for dest_comp in big_comps[comp_ind+1:]:
+            gate_nodes = list(gates[gate_ind])
+            gate_ind += 1
+            half = len(gate_nodes) // 2
+            G.add_edges_from(zip(gate_nodes[:half], src_comp))
+            G.add_edges_from(zip(gate_nodes[half:], dest_comp))
+    node_to_community = {node: comm_id for comm_id, sub_graph in enumerate(gates+big_comps)
+                         for node in sub_graph}
+    return G, node_to_community
+
+
+class TestCliqueGate(TestCase):
+    def test_matches_networkx(self):
+        for params in ((2, 5, 4), (4, 6, 3), (5, 8, 6), (3, 4, 1)):
+            expected_G, expected_communities = make_clique_gate_networkx(*params)
+            G, node_to_community = make_complete_clique_gate_network(*params)
+            self.assertEqual(set(G), set(expected_G))
+            self.assertEqual({frozenset(edge) for edge in G.edges},
+                             {frozenset(edge) for edge in expected_G.edges})
+            self.assertEqual(node_to_community, expected_communities)
+
+            net = make_clique_gate_network(*params)
+            self.assertEqual({frozenset(edge) for edge in net.G.edges},
+                             {frozenset(edge) for edge in expected_G.edges})
+            self.assertEqual(net.N, len(expected_G))
+
+            edges, _ = make_clique_gate_edges(*params)
+            # no edge is made twice
+            self.assertEqual(len(edges), expected_G.number_of_edges())
+
+    def test_gate_bigger_than_components(self):
+        with self.assertRaises(ValueError):
+            make_clique_gate_edges(2, 2, 6)
+        with self.assertRaises(ValueError):
+            make_clique_gate_edges(3, 1, 3)
+        with self.assertRaises(ValueError):
+            make_clique_gate_edges(2, -1, 0)
+        # half of the gate exactly fills a component, and a lone component needs no gates
+        edges, communities = make_clique_gate_edges(2, 2, 4)
+        self.assertLess(np.max(edges), len(communities))
+        edges, communities = make_clique_gate_edges(1, 3, 10)
+        self.assertEqual(len(communities), 3)
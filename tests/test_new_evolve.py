@@ -0,0 +1,64 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio as fio
+from networkgen._new_evolve import match_stubs
+import numpy as np
+
+
+def match_stubs_loop(agent_stubs, group_stubs, rng):
+    """The original matching, which searched for the agents and groups with stubs each time."""
+    agent_stubs, group_stubs = agent_stubs.copy(), group_stubs.copy()
+    agents, groups = [], []
+    agents_with_stubs = np.nonzero(agent_stubs)[0]
+    groups_with_stubs = np.nonzero(group_stubs)[0]
+    while len(agents_with_stubs) > 0 and len(groups_with_stubs) > 0:
+        agent = rng.choice(agents_with_stubs)
+        group = rng.choice(groups_with_stubs)
+        agents.append(agent)
+        groups.append(group)
+        agent_stubs[agent] -= 1
+        group_stubs[group] -= 1
+        agents_with_stubs = np.nonzero(agent_stubs)[0]
+        groups_with_stubs = np.nonzero(group_stubs)[0]
+    return np.array(agents), np.array(groups)
+
+
+class TestMatchStubs(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(39)
+
+    def test_respects_stubs(self):
+        agent_stubs = self.rng.integers(0, 5, 50)
+        group_stubs = self.rng.integers(0, 8, 20)
+        agents, groups = match_stubs(agent_stubs, group_stubs, self.rng)
+        self.assertEqual(len(agents), min(np.sum(agent_stubs), np.sum(group_stubs)))
+        self.assertTrue((np.bincount(agents, minlength=50) <= agent_stubs).all())
+        self.assertTrue((np.bincount(groups, minlength=20) <= group_stubs).all())
+
+    def test_matches_loop(self):
+        """
+        Test that the memberships each agent and group gets and the number of repeated
+        memberships have the same distribution as the original loop. There are more
+        agent stubs than group stubs, so which agents are left over depends on agents
+        being picked uniformly rather than in proportion to their stubs.
+        """
+        agent_stubs = np.array([6, 1, 1, 1, 0, 3, 2])
+        group_stubs = np.array([4, 3, 2, 0])
+        n_trials = 3000
+
+        def stats(match):
+            agent_counts = np.zeros(len(agent_stubs))
+            group_counts = np.zeros(len(group_stubs))
+            n_repeats = 0
+            for _ in range(n_trials):
+                agents, groups = match(agent_stubs, group_stubs, self.rng)
+                agent_counts += np.bincount(agents, minlength=len(agent_stubs))
+                group_counts += np.bincount(groups, minlength=len(group_stubs))
+                n_repeats += len(agents) - len(set(zip(agents.tolist(), groups.tolist())))
+            return agent_counts/n_trials, group_counts/n_trials, n_repeats/n_trials
+
+        vectorised = stats(match_stubs)
+        loop = stats(match_stubs_loop)
+        for expected, actual in zip(loop, vectorised):
+            self.assertTrue(np.allclose(expected, actual, atol=.1), f'{expected} {actual}')
@@ -0,0 +1,240 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+from unittest.mock import patch
+import partitioning
+from analysis import (calc_edge_betweenness, calc_fiedler_vector, calc_laplacian_eigenpairs,
+                      calc_prop_common_neighbors, make_csr)
+import networkx as nx
+import numpy as np
+import warnings
+
+
+def is_connected_partition(G: nx.Graph, node_to_community: np.ndarray) -> bool:
+    return all(nx.is_connected(G.subgraph(np.flatnonzero(node_to_community == community)))
+               for community in np.unique(node_to_community))
+
+
+class TestSpectralPartition(TestCase):
+    def test_constant_fiedler_vector(self):
+        """A Fiedler vector that can't be split by sign or median must not loop forever."""
+        G = nx.path_graph(20)
+        edges = np.array(G.edges)
+
+        def constant_fiedler_vector(N, edges, rng, tol, max_iter):
+            return np.ones(N)
+
+        with patch.object(partitioning, 'calc_fiedler_vector', constant_fiedler_vector):
+            node_to_community = partitioning.partition_spectral(
+                len(G), edges, 4, np.random.default_rng(0), refine_steps=0)
+        self.assertEqual(len(np.unique(node_to_community)), 4)
+        self.assertTrue(is_connected_partition(G, node_to_community))
+
+
+class TestFluidPartition(TestCase):
+    def test_fluid_communities(self):
+        G = nx.connected_caveman_graph(6, 10)
+        indptr, indices = make_csr(len(G), np.array(G.edges))
+        node_to_community = partitioning.fluid_communities(indptr, indices, 6,
+                                                           np.random.default_rng(0))
+        self.assertTrue((node_to_community > -1).all())
+        self.assertEqual(set(node_to_community.tolist()), set(range(6)))
+
+    def test_matches_asyn_fluidc(self):
+        """Give the same kind of communities as asyn_fluidc, but always the right number."""
+        G = nx.connected_caveman_graph(6, 10)
+        expected_sizes = np.zeros(10)
+        sizes = np.zeros(10)
+        for seed in range(10):
+            expected = nx.algorithms.community.asyn_fluidc(G, 6, seed=seed)
+            expected_sizes[seed] = np.std([len(community) for community in expected])
+            H = nx.Graph(G)
+            H.remove_edges_from(partitioning.fluidc_partition(G, 6, seed=seed))
+            components = tuple(nx.connected_components(H))
+            self.assertEqual(len(components), 6)
+            sizes[seed] = np.std([len(component) for component in components])
+        # how evenly the network is split should be about the same
+        self.assertLessEqual(np.mean(sizes), np.mean(expected_sizes) + 2)
+
+    def test_gives_up(self):
+        """Running out of attempts is an error rather than too few communities."""
+        G = nx.connected_caveman_graph(3, 5)
+        edges = np.array(G.edges)
+        rng = np.random.default_rng(0)
+        node_to_community = partitioning.partition_fluid(len(G), edges, 3, rng)
+        self.assertEqual(np.max(node_to_community), 2)
+        with patch.object(partitioning, 'fluid_communities',
+                          lambda indptr, indices, num_communities, rng: np.zeros(len(G), int)):
+            with self.assertRaises(RuntimeError):
+                partitioning.partition_fluid(len(G), edges, 3, rng, max_attempts=2)
+
+    def test_components(self):
+        """Each component gets its share of the communities, in parallel or not."""
+        G = nx.disjoint_union(nx.connected_caveman_graph(4, 8), nx.connected_caveman_graph(2, 8))
+        for num_processes in (1, 2):
+            H = nx.Graph(G)
+            H.remove_edges_from(partitioning.fluidc_partition(G, 6, num_processes))
+            self.assertEqual(nx.number_connected_components(H), 6)
+
+
+def propagate_labels_loop(G: nx.Graph, node_to_label: np.ndarray, max_steps: int = 1000):
+    """Label propagation one node at a time, with ties going to the smallest label."""
+    for step in range(max_steps):
+        new_labels = np.zeros(len(G), dtype=node_to_label.dtype)
+        for node in G:
+            voters = [node_to_label[neighbor] for neighbor in G[node]] + [node_to_label[node]]
+            values, counts = np.unique(voters, return_counts=True)
+            new_labels[node] = values[np.argmax(counts)]
+        if (new_labels == node_to_label).all():
+            break
+        node_to_label = new_labels
+    return node_to_label
+
+
+class TestLabelPropagation(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(31)
+        G = nx.connected_caveman_graph(5, 8)
+        self.G = nx.relabel_nodes(G, dict(enumerate(self.rng.permutation(len(G)))))
+        self.indptr, self.indices = make_csr(len(self.G), np.array(self.G.edges))
+
+    def test_matches_loop(self):
+        for _ in range(5):
+            labels = self.rng.integers(0, 6, len(self.G))
+            self.assertTrue((partitioning.propagate_labels_csr(self.indptr, self.indices, labels)
+                             == propagate_labels_loop(self.G, labels)).all())
+
+    def test_batch(self):
+        """Test that labelings in a batch are the same as labelings propagated alone."""
+        batch = self.rng.integers(0, 6, (7, len(self.G)))
+        propagated = partitioning.propagate_labels_csr(self.indptr, self.indices, batch)
+        for labels, expected in zip(batch, propagated):
+            self.assertTrue((partitioning.propagate_labels_csr(self.indptr, self.indices, labels)
+                             == expected).all())
+
+    def test_sparse_counts(self):
+        """Test that counting only the labels that appear gives the same result."""
+        batch = self.rng.integers(0, 1000, (4, len(self.G)))
+        dense = partitioning.propagate_labels_csr(self.indptr, self.indices, batch)
+        with patch.object(partitioning, '_MAX_DENSE_LABEL_COUNTS', 0):
+            sparse = partitioning.propagate_labels_csr(self.indptr, self.indices, batch)
+        self.assertTrue((dense == sparse).all())
+
+    def test_label_partition(self):
+        labels = self.rng.integers(0, 3, len(self.G))
+        propagated = propagate_labels_loop(self.G, labels)
+        expected = {(u, v) for u, v in self.G.edges if propagated[u] != propagated[v]}
+        actual = partitioning.label_partition(self.G, labels)
+        self.assertEqual({tuple(sorted(edge)) for edge in actual},
+                         {tuple(sorted(edge)) for edge in expected})
+
+
+def communities_from_removed_edges(G: nx.Graph, edges_to_remove) -> set:
+    H = nx.Graph(G)
+    H.remove_edges_from(edges_to_remove)
+    return {frozenset(comp) for comp in nx.connected_components(H)}
+
+
+def networkx_girvan_newman(G: nx.Graph, num_communities: int, most_valuable_edge=None) -> set:
+    """The communities found by networkx's Girvan-Newman, as the old partitioners did."""
+    for communities in nx.community.girvan_newman(G, most_valuable_edge):
+        if len(communities) == num_communities:
+            return {frozenset(comm) for comm in communities}
+    raise ValueError('num_communities was skipped')
+
+
+class TestEdgeRemovalPartition(TestCase):
+    def setUp(self) -> None:
+        # a random graph so that betweenness ties are unlikely
+        self.G = nx.gnm_random_graph(40, 90, seed=33)
+        self.G.remove_nodes_from([node for node, degree in self.G.degree if degree == 0])
+
+    def test_edge_betweenness(self):
+        edges = np.array(self.G.edges)
+        N = max(self.G) + 1
+        expected = nx.edge_betweenness_centrality(self.G, normalized=False)
+        for max_block_size in (2**22, 1):
+            betweenness = calc_edge_betweenness(N, edges, max_block_size=max_block_size)
+            self.assertTrue(np.allclose(betweenness, [expected[edge] for edge in self.G.edges]))
+        # using every node as a source is exact
+        self.assertTrue(np.allclose(calc_edge_betweenness(N, edges, np.arange(N)),
+                                    calc_edge_betweenness(N, edges)))
+
+    def test_girvan_newman(self):
+        for num_communities in (2, 4, 7):
+            edges_to_remove = partitioning.girvan_newman_partition(self.G, num_communities)
+            self.assertEqual(communities_from_removed_edges(self.G, edges_to_remove),
+                             networkx_girvan_newman(self.G, num_communities))
+
+    def test_common_neighbors(self):
+        def weakest_edge(H):
+            return min(H.edges, key=lambda edge: calc_prop_common_neighbors(H, *edge))
+
+        for num_communities in (2, 4, 7):
+            edges_to_remove = partitioning.common_neighbor_partition(self.G, num_communities)
+            self.assertEqual(communities_from_removed_edges(self.G, edges_to_remove),
+                             networkx_girvan_newman(self.G, num_communities, weakest_edge))
+
+    def test_already_partitioned(self):
+        G = nx.disjoint_union(nx.complete_graph(4), nx.complete_graph(5))
+        self.assertEqual(partitioning.girvan_newman_partition(G, 2), ())
+        self.assertEqual(partitioning.common_neighbor_partition(G, 2), ())
+
+
+class TestSpectralBisection(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(46)
+        # big enough that LOBPCG is used instead of the dense solver
+        self.G = nx.stochastic_block_model([150, 150], [[.1, .004], [.004, .1]], seed=46)
+        self.edges = np.array(self.G.edges)
+
+    def test_lobpcg_eigenpairs(self):
+        values, vectors = calc_laplacian_eigenpairs(300, self.edges, 3, self.rng, tol=1e-8)
+        expected = np.linalg.eigvalsh(nx.laplacian_matrix(self.G).toarray().astype(float))
+        self.assertTrue(np.allclose(values, expected[1:4], atol=1e-4))
+        fiedler = calc_fiedler_vector(300, self.edges, self.rng, tol=1e-8)
+        expected_fiedler = nx.fiedler_vector(self.G, normalized=False, seed=46)
+        cosine = fiedler @ expected_fiedler / np.linalg.norm(fiedler)\
+            / np.linalg.norm(expected_fiedler)
+        self.assertGreater(abs(cosine), .99)
+
+    def test_warns_once_when_unconverged(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            calc_laplacian_eigenpairs(300, self.edges, 3, self.rng, tol=1e-8, max_iter=2)
+        self.assertEqual(len(caught), 1)
+        self.assertIn('did not converge', str(caught[0].message))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            calc_laplacian_eigenpairs(300, self.edges, 3, self.rng)
+        self.assertEqual(caught, [])
+
+    def test_recovers_blocks(self):
+        node_to_community = partitioning.partition_spectral(300, self.edges, 2, self.rng)
+        blocks = np.repeat((0, 1), 150)
+        agreement = np.mean(node_to_community == blocks)
+        self.assertGreater(max(agreement, 1-agreement), .95)
+
+    def test_caveman(self):
+        G = nx.connected_caveman_graph(6, 10)
+        edges_to_remove = partitioning.spectral_partition(G, 6)
+        H = nx.Graph(G)
+        H.remove_edges_from(edges_to_remove)
+        self.assertEqual({frozenset(comp) for comp in nx.connected_components(H)},
+                         {frozenset(range(start, start+10)) for start in range(0, 60, 10)})
+
+    def test_connected_communities(self):
+        G = nx.random_geometric_graph(250, .12, seed=46)
+        G = G.subgraph(max(nx.connected_components(G), key=len))
+        G = nx.convert_node_labels_to_integers(G)
+        edges = np.array(G.edges)
+        for num_communities in (3, 8, 20):
+            node_to_community = partitioning.partition_spectral(len(G), edges, num_communities,
+                                                                self.rng, refine_steps=0)
+            self.assertEqual(len(np.unique(node_to_community)), num_communities)
+            self.assertEqual(np.max(node_to_community), num_communities - 1)
+            self.assertTrue(is_connected_partition(G, node_to_community))
+
+    def test_already_partitioned(self):
+        G = nx.disjoint_union(nx.complete_graph(4), nx.complete_graph(5))
+        self.assertEqual(partitioning.spectral_partition(G, 2), ())
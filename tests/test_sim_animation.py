@@ -0,0 +1,63 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import os
+import tempfile
+import fileio as fio
+from sim_animation import NetworkAnimator, save_sir_animation
+from PIL import Image
+import numpy as np
+import networkx as nx
+
+
+def make_sir(rng, N: int) -> np.ndarray:
+    sir = np.zeros((3, N), dtype=np.int64)
+    sir[rng.integers(3, size=N), np.arange(N)] = 1
+    return sir
+
+
+class TestSIRAnimation(TestCase):
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(48)
+        G = nx.connected_caveman_graph(4, 5)
+        self.N = len(G)
+        self.edges = np.array(G.edges)
+        self.layout = self.rng.random((self.N, 2))
+        self.sirs = [make_sir(self.rng, self.N) for _ in range(6)]
+        self.edge_masks = [self.rng.random(len(self.edges)) < .7 for _ in range(6)]
+        # the edges only change once, so most frames reuse the background
+        for step in range(1, 6):
+            if step != 3:
+                self.edge_masks[step] = self.edge_masks[step-1]
+
+    def test_reused_background(self):
+        """Test that blitting onto a saved background matches drawing the frame from scratch."""
+        animator = NetworkAnimator(self.layout, self.edges, dpi=40)
+        for step, (sir, mask) in enumerate(zip(self.sirs, self.edge_masks)):
+            animator.draw(sir, step, mask)
+            frame = np.copy(animator.render())
+            fresh = NetworkAnimator(self.layout, self.edges, dpi=40)
+            fresh.draw(sir, step, mask)
+            self.assertTrue((frame == fresh.render()).all(), f'Frame {step} differs')
+
+    def test_frame_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            frames = []
+            for num_processes in (1, 2):
+                output = os.path.join(directory, f'frames-{num_processes}')
+                save_sir_animation(self.layout, self.edges, self.sirs, output,
+                                   edge_masks=self.edge_masks, num_processes=num_processes,
+                                   dpi=40)
+                names = sorted(os.listdir(output))
+                self.assertEqual(names, [f'frame-{step:05}.png' for step in range(6)])
+                frames.append([np.asarray(Image.open(os.path.join(output, name)))
+                               for name in names])
+            for serial, parallel in zip(*frames):
+                self.assertTrue((serial == parallel).all())
+
+    def test_gif(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'sir.gif')
+            save_sir_animation(self.layout, self.edges, self.sirs, output, dpi=40)
+            with Image.open(output) as gif:
+                self.assertEqual(gif.n_frames, 6)
@@ -0,0 +1,68 @@
+import sys
+sys.path.append('')
+from unittest import TestCase
+import fileio  # noqa: F401 (sim_dynamic has to be imported after fileio)
+from sim_dynamic import run_adaptive_comparison, run_adaptive_trials
+import numpy as np
+
+
+class TestAdaptiveTrials(TestCase):
+    def test_stops_when_precise(self):
+        rng = np.random.default_rng(0)
+        result = run_adaptive_trials(lambda: rng.normal(1, .1), .01,
+                                     min_trials=10, max_trials=10_000, batch_size=10)
+        self.assertTrue(result.converged)
+        self.assertLessEqual(result.ci_half_width, .01)
+        self.assertEqual(result.n_trials % 10, 0)
+        # 1.96 * .1 / sqrt(n) <= .01 needs about 384 trials
+        self.assertTrue(300 <= result.n_trials <= 500)
+        self.assertAlmostEqual(result.estimate, np.mean(result.samples))
+
+    def test_max_trials(self):
+        rng = np.random.default_rng(1)
+        result = run_adaptive_trials(lambda: rng.random(), 1e-6, min_trials=5,
+                                     max_trials=23, batch_size=10)
+        self.assertFalse(result.converged)
+        self.assertEqual(result.n_trials, 23)
+
+    def test_constant_trials(self):
+        result = run_adaptive_trials(lambda: 0.5, .01, min_trials=2, max_trials=100)
+        self.assertTrue(result.converged)
+        self.assertEqual(result.n_trials, 10)
+        self.assertEqual(result.ci_half_width, 0)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            run_adaptive_trials(lambda: 0.0, .01, min_trials=1)
+        with self.assertRaises(ValueError):
+            run_adaptive_trials(lambda: 0.0, .01, min_trials=30, max_trials=0)
+
+
+class TestAdaptiveComparison(TestCase):
+    def test_counts_trials_not_bootstraps(self):
+        rng = np.random.default_rng(2)
+        result = run_adaptive_comparison(lambda: rng.normal(0, 1), lambda: rng.normal(1, 1),
+                                         .05, rng, min_trials=20, max_trials=60,
+                                         batch_size=20, n_bootstrap=50)
+        self.assertEqual(result.n_trials, 60)
+        self.assertEqual(result.a.n_trials, result.b.n_trials)
+        self.assertEqual(len(result.bootstrap_estimates), 50)
+        self.assertFalse(result.converged)
+        # the Wasserstein distance between N(0, 1) and N(1, 1) is 1
+        self.assertAlmostEqual(result.estimate, 1, delta=.4)
+        self.assertTrue(np.isfinite(result.a.ci_half_width))
+
+    def test_identical_configurations(self):
+        rng = np.random.default_rng(3)
+        result = run_adaptive_comparison(lambda: 1.0, lambda: 1.0, .01, rng,
+                                         min_trials=2, max_trials=10)
+        self.assertTrue(result.converged)
+        self.assertEqual(result.estimate, 0)
+        self.assertEqual(result.n_trials, 10)
+
+    def test_invalid_bounds(self):
+        rng = np.random.default_rng(4)
+        with self.assertRaises(ValueError):
+            run_adaptive_comparison(lambda: 0.0, lambda: 0.0, .01, rng, max_trials=0)
+        with self.assertRaises(ValueError):
+            run_adaptive_comparison(lambda: 0.0, lambda: 0.0, .01, rng, min_trials=1)